@@ -0,0 +1,63 @@
+"""Benchmark annotate_many() throughput (records/second) by process count.
+
+Usage:
+    python3 -m benchmarks.annotate_many [record count] [max processes]
+
+Annotates copies of the plasmids in data/cloning and data/gibson, rotated so
+that no two records are identical.
+"""
+
+import os
+import sys
+import time
+from typing import List
+
+from Bio import SeqIO
+from Bio.SeqRecord import SeqRecord
+
+from synbio.features import annotate_many, FEATURE_DATABASE
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "data")
+
+
+def records(count: int) -> List[SeqRecord]:
+    """Create a list of distinct plasmids to annotate."""
+
+    plasmids: List[SeqRecord] = []
+    for subdir, fmt in [("cloning", "genbank"), ("gibson", "fasta")]:
+        directory = os.path.join(DATA_DIR, subdir)
+        for filename in sorted(os.listdir(directory)):
+            plasmids.append(SeqIO.read(os.path.join(directory, filename), fmt))
+
+    rotated: List[SeqRecord] = []
+    for i in range(count):
+        plasmid = plasmids[i % len(plasmids)]
+        shift = (i * 97) % len(plasmid)
+        seq = plasmid.seq[shift:] + plasmid.seq[:shift]
+        rotated.append(SeqRecord(seq, id=f"{plasmid.id}_{i}"))
+    return rotated
+
+
+def main(count: int = 64, max_processes: int = os.cpu_count() or 1):
+    """Print records/second for 1 up to max_processes processes."""
+
+    FEATURE_DATABASE.preload()
+    print(f"feature database loaded in {FEATURE_DATABASE.load_time:.3f}s")
+
+    to_annotate = records(count)
+    print(f"{'processes':>10} {'seconds':>10} {'records/s':>10}")
+
+    processes = 1
+    while processes <= max_processes:
+        start = time.perf_counter()
+        annotated = list(annotate_many(to_annotate, processes=processes))
+        elapsed = time.perf_counter() - start
+        assert len(annotated) == len(to_annotate)
+
+        print(f"{processes:>10} {elapsed:>10.2f} {len(annotated) / elapsed:>10.2f}")
+        processes *= 2
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,65 @@
+"""Benchmark cloning many small record sets, by parts per bin.
+
+Usage:
+    python3 -m benchmarks.clone [max parts per bin]
+
+Clones a CombinatorialBins design of MoClo parts, a bin each of promoters
+(AB), RBSs (BC), CDSs (CD), terminators (DE) and backbones (AE), with
+`clone_many_combinatorial`, which clones each of its record sets on its
+own. Each record set is small, with five parts and a few plasmids, so this
+measures the per-record-set costs of cloning: digestion, the overhang
+graph and the search for re-ligations among the record set's sequences.
+"""
+
+import os
+import sys
+import time
+
+from Bio.Restriction import BsaI, BpiI
+from Bio.SeqIO import parse
+
+from synbio.assembly.clone import CATALYZE_CACHE, clone_many_combinatorial
+from synbio.designs import CombinatorialBins
+
+PARTS_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "data", "goldengate"
+)
+BINS = ["_AB.gb", "_BC.gb", "_CD.gb", "_DE.gb", "_AE.gb"]
+
+
+def design(parts: int) -> CombinatorialBins:
+    """Create a design with up to this many parts in each bin."""
+
+    names = sorted(os.listdir(PARTS_DIR))
+    bins = CombinatorialBins()
+    for suffix in BINS:
+        files = [os.path.join(PARTS_DIR, n) for n in names if n.endswith(suffix)]
+        bins.append([next(parse(f, "genbank")) for f in files[:parts]])
+    return bins
+
+
+def main(max_parts: int = 4):
+    """Print seconds per record set and plasmids cloned for each design size."""
+
+    print(
+        f"{'parts/bin':>9} {'record sets':>12} {'plasmids':>9} "
+        f"{'seconds':>8} {'ms/set':>7}"
+    )
+    for parts in range(1, max_parts + 1):
+        bins = design(parts)
+        CATALYZE_CACHE.clear()
+
+        start = time.perf_counter()
+        cloned = clone_many_combinatorial(bins, [BsaI, BpiI], linear=False)
+        elapsed = time.perf_counter() - start
+
+        record_sets = bins.combination_count()
+        plasmids = sum(len(p) for p, _ in cloned)
+        print(
+            f"{parts:>9} {record_sets:>12} {plasmids:>9} {elapsed:>8.2f} "
+            f"{1000 * elapsed / record_sets:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,184 @@
+"""Benchmark in-process greedy clustering against cd-hit-est, by process count.
+
+Usage:
+    python3 -m benchmarks.cluster [families] [max processes]
+
+Samples features from the bundled DNA database and adds variants of each
+(SNPs, small indels and reverse complements) to make a FASTA of known
+families. The sample is clustered with `synbio.features.greedy` over 1 up to
+max processes and, if it's installed, with cd-hit-est using the thresholds in
+synbio.features.config. Agreement is the share of pairs of sequences that
+two clusterings agree on being in the same cluster or not (the Rand index),
+and pairwise recall is the share of same-family pairs in the same cluster.
+"""
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from Bio import SeqIO
+
+from synbio.features.config import (
+    DNA_DB,
+    DNA_IDENTITY_THRESHOLD,
+    DNA_LENGTH_DISTANCE_CUTOFF,
+    DNA_WORD_SIZE,
+)
+from synbio.features.greedy import COMPLEMENT, cluster_fasta
+
+VARIANTS = 6  # per family
+
+
+def mutate(seq: str, rng: random.Random) -> str:
+    """Make a variant of a sequence at ~98% identity."""
+
+    bases = list(seq)
+    for _ in range(max(1, len(seq) // 100)):
+        i = rng.randrange(len(bases))
+        edit = rng.random()
+        if edit < 0.7:
+            bases[i] = rng.choice("ACGT")
+        elif edit < 0.85:
+            del bases[i]
+        else:
+            bases.insert(i, rng.choice("ACGT"))
+    variant = "".join(bases)
+    if rng.random() < 0.3:
+        variant = variant.translate(COMPLEMENT)[::-1]
+    return variant
+
+
+def sample(path: str, families: int, seed: int = 0) -> Dict[str, str]:
+    """Write a FASTA of sampled features and their variants, return id to family."""
+
+    rng = random.Random(seed)
+    features = [
+        str(r.seq).upper()
+        for r in SeqIO.parse(DNA_DB, "fasta")
+        if len(r.seq) >= 50 and set(str(r.seq).upper()) <= set("ACGT")
+    ]
+    id_to_family: Dict[str, str] = {}
+    with open(path, "w") as fasta:
+        for family, seq in enumerate(rng.sample(features, families)):
+            for variant in range(VARIANTS):
+                record_id = f"f{family}.{variant}"
+                fasta.write(
+                    f">{record_id}\n{seq if not variant else mutate(seq, rng)}\n"
+                )
+                id_to_family[record_id] = str(family)
+    return id_to_family
+
+
+def read_clstr(path: str) -> Dict[str, str]:
+    """Map each sequence ID in a .clstr file to its cluster."""
+
+    clusters: Dict[str, str] = {}
+    cluster = ""
+    with open(path) as clstr:
+        for line in clstr:
+            if line.startswith(">Cluster"):
+                cluster = line.split()[1]
+            elif ">" in line:
+                clusters[line[line.index(">") + 1 : line.index("...")]] = cluster
+    return clusters
+
+
+def agreement(a: Dict[str, str], b: Dict[str, str]) -> float:
+    """The share of pairs that two clusterings agree on (the Rand index)."""
+
+    ids = sorted(a)
+    agree = total = 0
+    for i, first in enumerate(ids):
+        for second in ids[i + 1 :]:
+            agree += (a[first] == a[second]) == (b[first] == b[second])
+            total += 1
+    return agree / total
+
+
+def recall(clusters: Dict[str, str], families: Dict[str, str]) -> float:
+    """The share of pairs in the same family that are in the same cluster."""
+
+    members: Dict[str, List[str]] = {}
+    for record_id, family in families.items():
+        members.setdefault(family, []).append(record_id)
+    found = total = 0
+    for ids in members.values():
+        for i, first in enumerate(ids):
+            for second in ids[i + 1 :]:
+                found += clusters[first] == clusters[second]
+                total += 1
+    return found / total
+
+
+def main(families: int = 300, max_processes: int = os.cpu_count() or 1):
+    """Print seconds, cluster counts and agreement for each clustering."""
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fasta = os.path.join(tmp, "dna.fa")
+        id_to_family = sample(fasta, families)
+        print(
+            f"{os.cpu_count()} CPUs, {len(id_to_family)} sequences, {families} families"
+        )
+        print(
+            f"{'clustering':>12} {'seconds':>8} {'clusters':>9} "
+            f"{'recall':>7} {'vs cd-hit':>10}"
+        )
+
+        runs = []
+        if shutil.which("cd-hit-est"):
+            runs.append(("cd-hit-est", 0))
+        processes = 1
+        while processes <= max_processes:
+            runs.append(
+                (f"{processes} process{'es' if processes > 1 else ''}", processes)
+            )
+            processes *= 2
+
+        cd_hit = None
+        for name, processes in runs:
+            out = os.path.join(tmp, name.replace(" ", "-"))
+            start = time.perf_counter()
+            if processes:
+                cluster_fasta(
+                    fasta,
+                    out,
+                    DNA_IDENTITY_THRESHOLD,
+                    DNA_WORD_SIZE,
+                    DNA_LENGTH_DISTANCE_CUTOFF,
+                    best=True,
+                    processes=processes,
+                )
+            else:
+                subprocess.run(
+                    [
+                        "cd-hit-est",
+                        "-i", fasta,
+                        "-o", out,
+                        "-c", str(DNA_IDENTITY_THRESHOLD),
+                        "-n", str(DNA_WORD_SIZE),
+                        "-s", str(DNA_LENGTH_DISTANCE_CUTOFF),
+                        "-d", "0",
+                        "-g", "1",
+                    ],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                )  # fmt: skip
+            elapsed = time.perf_counter() - start
+
+            clusters = read_clstr(out + ".clstr")
+            if cd_hit is None and not processes:
+                cd_hit = clusters
+            versus = f"{agreement(clusters, cd_hit):.4f}" if cd_hit else "-"
+            print(
+                f"{name:>12} {elapsed:>8.2f} {len(set(clusters.values())):>9} "
+                f"{recall(clusters, id_to_family):>7.3f} {versus:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
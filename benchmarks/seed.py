@@ -0,0 +1,102 @@
+"""Benchmark building the DNA and protein kmer indexes, by process count.
+
+Usage:
+    python3 -m benchmarks.seed [max processes]
+
+Compares the legacy pickled kmer maps (a dict from kmer to a list of tuples,
+built in a Python loop) with `KmerIndex.build` sharded over 1 up to max
+processes. Each build runs in a new process so its peak RSS is its own.
+Reported RSS is that of the building process and, separately, the largest of
+its worker processes.
+"""
+
+from collections import defaultdict
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from Bio.SeqRecord import SeqRecord
+
+from synbio.features.config import DNA_DB, DNA_WORD_SIZE, PROTEIN_DB, PROTEIN_WORD_SIZE
+from synbio.features.index import DNA_ALPHABET, PROTEIN_ALPHABET, KmerIndex
+from synbio.features.seed import _id_map
+
+DATABASES = [
+    (DNA_DB, DNA_WORD_SIZE, DNA_ALPHABET),
+    (PROTEIN_DB, PROTEIN_WORD_SIZE, PROTEIN_ALPHABET),
+]
+
+
+def kmer_map(
+    id_map: Dict[str, SeqRecord], word_size: int
+) -> Dict[str, List[Tuple[str, int]]]:
+    """Build a legacy kmer map, as seed() did before the KmerIndex."""
+
+    kmers: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    for fid, feature in id_map.items():
+        seq = str(feature.seq)
+        for i in range(len(seq) - word_size + 1):
+            kmers[seq[i : i + word_size]].append((fid, i))
+    return kmers
+
+
+def build(processes: Optional[int], results: multiprocessing.Queue):
+    """Build both indexes, legacy kmer maps if processes is None, and report."""
+
+    id_maps = [
+        (_id_map(db, word_size), word_size, alph) for db, word_size, alph in DATABASES
+    ]
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    for id_map, word_size, alphabet in id_maps:
+        if processes is None:
+            kmer_map(id_map, word_size)
+        else:
+            KmerIndex.build(id_map, word_size, alphabet, processes)
+    elapsed = time.perf_counter() - start
+
+    results.put(
+        (
+            elapsed,
+            start_rss,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+    )
+
+
+def main(max_processes: int = os.cpu_count() or 1):
+    """Print seconds and peak RSS (MB) for each way of building the indexes."""
+
+    print(f"{os.cpu_count()} CPUs")
+    print(
+        f"{'build':>12} {'seconds':>8} {'start MB':>9} {'peak MB':>8} {'worker MB':>10}"
+    )
+
+    context = multiprocessing.get_context("spawn")
+    runs: List[Optional[int]] = [None]
+    processes = 1
+    while processes <= max_processes:
+        runs.append(processes)
+        processes *= 2
+
+    for run in runs:
+        results = context.Queue()
+        process = context.Process(target=build, args=(run, results))
+        process.start()
+        elapsed, start_rss, peak_rss, worker_rss = results.get()
+        process.join()
+
+        name = "kmer map" if run is None else f"{run} process{'es' if run > 1 else ''}"
+        print(
+            f"{name:>12} {elapsed:>8.2f} {start_rss / 1024:>9.0f} "
+            f"{peak_rss / 1024:>8.0f} {worker_rss / 1024:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
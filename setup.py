@@ -23,12 +23,7 @@ setup(
     data_files=[
         (
             "data",
-            [
-                "data/features/dna.id.pickle",
-                "data/features/dna.kmermap.pickle",
-                "data/features/protein.id.pickle",
-                "data/features/protein.kmermap.pickle",
-            ],
+            ["data/features/dna.id.pickle", "data/features/protein.id.pickle"],
         )
     ],
     test_suite="tests.suite",
@@ -1,6 +1,8 @@
 """Assembly methods for piecing together SeqRecords."""
 
+from .cache import DigestCache
 from .clone import clone
+from .clone import clone_bins
 from .clone import clone_combinatorial
 from .clone import clone_many_combinatorial
 from .clone import goldengate
@@ -0,0 +1,90 @@
+"""Memoize restriction digests by record.
+
+Combinatorial designs put the same backbone and parts in many record sets,
+so the same records are digested with the same enzymes again and again.
+A DigestCache keeps the fragments and overhangs of each digest, keyed on a
+fingerprint of the record (its sequence, ids and feature locations), the
+enzymes and whether the record is linear. A change to the record's
+sequence, id or features misses the cache, as does a different enzyme or
+topology.
+"""
+
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+from Bio.Restriction.Restriction import RestrictionType
+from Bio.SeqRecord import SeqRecord
+
+from ..cache import PickleCache
+
+Digest = List[Tuple[str, SeqRecord, str]]
+"""The (left overhang, fragment, right overhang) of each fragment in a digest."""
+
+
+class DigestCache(PickleCache):
+    """A bounded, LRU cache of digested fragments with an optional SQLite tier.
+
+    Fragments are stored pickled, so those returned on a hit are new
+    SeqRecords that can be changed without changing the cache. If a path is
+    given, or set later, digests are also kept in a SQLite database there so
+    later runs over the same parts skip digestion entirely.
+
+    Keyword Args:
+        size: The most digests to keep in memory
+        path: The path to a SQLite database to also keep digests in
+
+    Attributes:
+        hits: The number of lookups with a cached digest
+        misses: The number of lookups without a cached digest
+    """
+
+    table = "digests"
+    column = "fragments"
+
+    @staticmethod
+    def key(record: SeqRecord, enzymes: Iterable[RestrictionType], linear: bool) -> str:
+        """Create the cache key of a record's digest.
+
+        The fragments carry the record's id and features as well as slices of
+        its sequence, so the key is a hash of the sequence, ids and each
+        feature's type, location and number of qualifiers. Pickling the whole
+        record instead costs more than a cached digest saves.
+
+        Args:
+            record: The record to digest
+            enzymes: The enzymes the record is digested with
+            linear: Whether the record is linear
+
+        Returns:
+            A hex digest of the record, enzymes and topology
+        """
+
+        names = ",".join(sorted(str(e) for e in enzymes))
+        sha = hashlib.sha1(str(record.seq).encode())
+        sha.update(f"|{record.id}|{record.name}|{record.description}".encode())
+        for f in record.features:
+            sha.update(f"|{f.type}|{f.location}|{len(f.qualifiers)}".encode())
+        sha.update(f"|{names}|{linear}".encode())
+        return sha.hexdigest()
+
+    def get(self, key: str) -> Optional[Digest]:
+        """Get the cached digest for a key.
+
+        Args:
+            key: The cache key, from `DigestCache.key()`
+
+        Returns:
+            A copy of the cached fragments, None if there aren't any
+        """
+
+        return super().get(key)
+
+    def put(self, key: str, digest: Digest):
+        """Cache the fragments of a digest.
+
+        Args:
+            key: The cache key, from `DigestCache.key()`
+            digest: The (left overhang, fragment, right overhang) of each fragment
+        """
+
+        super().put(key, digest)
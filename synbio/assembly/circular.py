@@ -0,0 +1,189 @@
+"""Find whether sequences are within any of a set of circular sequences."""
+
+from typing import Dict, List, Set
+
+from Bio.Seq import reverse_complement
+
+WORD_SIZE = 16
+"""The length of kmers indexed from each circular sequence."""
+
+STEP = 8
+"""Kmers are indexed every STEP bp of each circular sequence."""
+
+ANCHORS = 4
+"""The number of places in a query whose kmers are looked up."""
+
+INDEX_AFTER = 32
+"""Sequences are indexed once queries have scanned them this many times over."""
+
+
+class CircularSeqs:
+    """A set of circular sequences, on both strands, to search for sequences in.
+
+    A query is in the set if it's a substring of an added sequence doubled,
+    or of its reverse complement doubled: `query in seq + seq`. So it's a
+    rotation of an added sequence, or part of one (across its zero-index).
+
+    Queries are scanned for in each sequence, with `in`, until the scans
+    have cost INDEX_AFTER times the bp of the sequences. Then the sequences
+    are indexed. Small sets, like a record set's, are rarely queried enough.
+
+    In indexed sequences, rotations are found by a set lookup of their
+    canonical rotation: the lexicographically least rotation of either
+    strand (as in Booth's algorithm). Other queries are only compared with
+    the sequences that share kmers with them. Every STEP'th kmer of each
+    doubled sequence is indexed, so a query at any offset within one has an
+    indexed kmer in each of its first STEP kmers.
+    """
+
+    def __init__(self):
+        self._canonical: Set[str] = set()
+        self._lengths: Set[int] = set()
+        self._doubled: List[str] = []
+        self._indexes: Dict[str, int] = {}
+        self._kmers: Dict[str, List[int]] = {}
+        self._indexed = 0  # the doubled sequences with indexed kmers
+        self._unindexed: List[str] = []  # sequences added since they were indexed
+        self._unindexed_bp = 0
+        self._scanned_bp = 0  # scanned in those that aren't indexed
+
+    def add(self, seq: str):
+        """Add a circular sequence.
+
+        Args:
+            seq: The sequence of the circle, from any zero-index, on either strand
+        """
+
+        seq = seq.upper()
+        self._unindexed.append(seq)
+        for strand in (seq, reverse_complement(seq)):
+            doubled = strand + strand
+            if doubled in self._indexes:
+                continue
+
+            self._indexes[doubled] = len(self._doubled)
+            self._doubled.append(doubled)
+            self._unindexed_bp += len(doubled)
+
+    def __contains__(self, query: object) -> bool:
+        """Whether a sequence is within one of the circular sequences.
+
+        Args:
+            query: An uppercase sequence
+
+        Returns:
+            Whether the query is in one of the sequences doubled, either strand
+        """
+
+        if not isinstance(query, str):
+            return False
+
+        span = STEP - 1 + WORD_SIZE  # bp of a query to cover a kmer at any offset
+        if len(query) < span:
+            return any(query in d for d in self._doubled)
+
+        if self._unindexed_bp:
+            self._scanned_bp += self._unindexed_bp
+            if self._scanned_bp >= INDEX_AFTER * self._unindexed_bp:
+                self._index()
+            elif any(query in d for d in self._doubled[self._indexed :]):
+                return True
+        if not self._indexed:
+            return False
+
+        if len(query) in self._lengths and canonical_rotation(query) in self._canonical:
+            return True
+
+        candidates: Set[int] = set()
+        last = len(query) - span
+        anchors = sorted({last * i // max(ANCHORS - 1, 1) for i in range(ANCHORS)})
+        for i, anchor in enumerate(anchors):
+            found: Set[int] = set()
+            for offset in range(anchor, anchor + STEP):
+                found.update(self._kmers.get(query[offset : offset + WORD_SIZE], ()))
+            candidates = found if i == 0 else candidates & found
+            if not candidates:
+                return False
+
+        return any(query in self._doubled[i] for i in sorted(candidates))
+
+    def _index(self):
+        """Index the rotations and kmers of the sequences that aren't indexed yet."""
+
+        for seq in self._unindexed:
+            self._canonical.add(canonical_rotation(seq))
+            self._lengths.add(len(seq))
+
+        for index in range(self._indexed, len(self._doubled)):
+            doubled = self._doubled[index]
+            for start in range(0, len(doubled) - WORD_SIZE + 1, STEP):
+                kmer = doubled[start : start + WORD_SIZE]
+                postings = self._kmers.setdefault(kmer, [])
+                if not postings or postings[-1] != index:
+                    postings.append(index)
+
+        self._indexed = len(self._doubled)
+        self._unindexed = []
+        self._unindexed_bp = 0
+        self._scanned_bp = 0
+
+
+def canonical_rotation(seq: str) -> str:
+    """The lexicographically least rotation of a circular sequence, on either strand.
+
+    Args:
+        seq: An uppercase circular sequence
+
+    Returns:
+        The least rotation of the sequence and its reverse complement
+    """
+
+    return min(least_rotation(seq), least_rotation(reverse_complement(seq)))
+
+
+def least_rotation(seq: str) -> str:
+    """The lexicographically least rotation of a string.
+
+    Booth's algorithm is linear but steps through the string a character at
+    a time in Python. The least rotation starts with the longest run of the
+    least character though, which is found by string search. This starts
+    from the rotations at each such run and keeps only those with the least
+    prefix as the prefix doubles in length. Few outlast the first rounds.
+
+    Args:
+        seq: A string
+
+    Returns:
+        The rotation of the string that sorts first
+    """
+
+    if not seq:
+        return seq
+
+    # find the longest run of the least character, across the zero-index too
+    doubled = seq + seq
+    least = min(seq)
+    low, high = 1, len(seq)  # bounds on the length of the longest run
+    while low < high:
+        middle = (low + high + 1) // 2
+        if least * middle in doubled:
+            low = middle
+        else:
+            high = middle - 1
+    if low == len(seq):
+        return seq  # all the same character
+
+    run = least * low
+    starts = []
+    start = doubled.find(run)
+    while start != -1 and start < len(seq):
+        starts.append(start)
+        start = doubled.find(run, start + 1)
+
+    length = low
+    while len(starts) > 1 and length < len(seq):
+        length = min(2 * length, len(seq))
+        prefixes = [doubled[s : s + length] for s in starts]
+        first = min(prefixes)
+        starts = [s for s, p in zip(starts, prefixes) if p == first]
+    return doubled[starts[0] : starts[0] + len(seq)]
@@ -1,23 +1,25 @@
 """Cloning for digestion and ligation of fragments."""
 
 from collections import defaultdict
-from typing import Dict, List, Set, Tuple, Iterable, Optional
+from typing import Dict, List, Set, Tuple, Iterable, Iterator, Optional
 
 from Bio.Alphabet.IUPAC import IUPACUnambiguousDNA
 from Bio.Restriction import RestrictionBatch, BsaI, BpiI
 from Bio.Restriction.Restriction import RestrictionType
-from Bio.Seq import Seq
+from Bio.Seq import Seq, reverse_complement
 from Bio.SeqRecord import SeqRecord
-import networkx as nx
-from networkx.algorithms.cycles import simple_cycles
-from networkx.exception import NetworkXNoCycle
 
 from ..containers import content_id
 from ..designs import CombinatorialBins
+from .cache import DigestCache
+from .circular import CircularSeqs
+from .graph import OverhangGraph
 
+CATALYZE_CACHE = DigestCache(size=1024)
+"""Store the catalyze results of each SeqRecord. Avoid lots of string searches.
 
-CATALYZE_CACHE: Dict[str, List[Tuple[str, SeqRecord, str]]] = {}
-"""Store the catalyze results of each SeqRecord. Avoid lots of string searches."""
+Set its path to also keep digests in a SQLite database between runs.
+"""
 
 
 def clone(
@@ -25,6 +27,7 @@ def clone(
     enzymes: List[RestrictionType],
     include: List[str] = None,
     min_count: int = -1,
+    max_count: int = -1,
     linear: bool = True,
 ):
     """Simulate a digestion/ligation with a list of enzymes to get expected plasmids.
@@ -44,12 +47,18 @@ def clone(
     Keyword Args:
         include: feature names to filter plasmids against (default: {None})
         min_count: mininum # of SeqRecords in each output plasmid (default: {-1})
+        max_count: maximum # of SeqRecords in each output plasmid (default: {-1})
         linear: Whether the individual SeqRecords are assumed to be linear
     """
 
     cloned_plasmids: List[SeqRecord] = []
     for plasmids, _ in clone_combinatorial(
-        list(record_set), enzymes, include=include, min_count=min_count, linear=linear
+        list(record_set),
+        enzymes,
+        include=include,
+        min_count=min_count,
+        max_count=max_count,
+        linear=linear,
     ):
         cloned_plasmids.extend(plasmids)
     return cloned_plasmids
@@ -60,12 +69,14 @@ def goldengate(
     enzymes: List[RestrictionType] = [BsaI, BpiI],
     include: List[str] = None,
     min_count: int = -1,
+    max_count: int = -1,
     linear: bool = True,
 ) -> List[Tuple[List[SeqRecord], List[SeqRecord]]]:
     """Simulate a digestion and ligation using BsaI and BpiI.
 
     Accepts lists of SeqRecords that may combine and returns the lists
-    of SeqRecords that may circularize into new vectors.
+    of SeqRecords that may circularize into new vectors. A CombinatorialBins
+    design is cloned with `clone_bins()`, without making each of its record sets.
 
     Args:
         record_set: possible combinations of fragments
@@ -73,6 +84,7 @@ def goldengate(
     Keyword Args:
         include: the feature to filter assemblies on (default: {""})
         min_count: minimum number of SeqRecords for an assembly to be considered
+        max_count: maximum number of SeqRecords for an assembly to be considered
         linear: Whether the individual SeqRecords are assumed to be linear
 
     Returns:
@@ -81,8 +93,31 @@ def goldengate(
             2. SeqRecords that went into each formed plasmid
     """
 
+    if isinstance(record_set, CombinatorialBins):
+        # group the plasmids from the same records, as clone_combinatorial does
+        ids_to_fragments: Dict[str, List[SeqRecord]] = {}
+        ids_to_plasmids: Dict[str, List[SeqRecord]] = defaultdict(list)
+        for plasmids, fragments in clone_bins(
+            record_set.bins,
+            enzymes,
+            include=include,
+            min_count=min_count,
+            max_count=max_count,
+            linear=linear,
+        ):
+            fragments_id = _hash_fragments(fragments)
+            ids_to_fragments[fragments_id] = fragments
+            ids_to_plasmids[fragments_id].extend(plasmids)
+
+        return _name_plasmids(ids_to_fragments, ids_to_plasmids, enzymes)
+
     return clone_many_combinatorial(
-        record_set, enzymes, include=include, min_count=min_count, linear=linear
+        record_set,
+        enzymes,
+        include=include,
+        min_count=min_count,
+        max_count=max_count,
+        linear=linear,
     )
 
 
@@ -91,6 +126,7 @@ def clone_many_combinatorial(
     enzymes: List[RestrictionType],
     include: List[str] = None,
     min_count: int = -1,
+    max_count: int = -1,
     linear: bool = True,
 ) -> List[Tuple[List[SeqRecord], List[SeqRecord]]]:
     """Parse a single list of SeqRecords to find all circularizable plasmids.
@@ -106,6 +142,7 @@ def clone_many_combinatorial(
     Keyword Args:
         include: List of strings to filter assemblies against
         min_count: The mininum number of SeqRecords for an assembly to be considered
+        max_count: The maximum number of SeqRecords for an assembly to be considered
         linear: Whether the individual SeqRecords are assumed to be linear
 
     Returns:
@@ -118,7 +155,12 @@ def clone_many_combinatorial(
     all_plasmids_and_fragments: List[Tuple[List[SeqRecord], List[SeqRecord]]] = []
     for record_set in design:
         for plasmids, fragments in clone_combinatorial(
-            record_set, enzymes, include=include, min_count=min_count, linear=linear
+            record_set,
+            enzymes,
+            include=include,
+            min_count=min_count,
+            max_count=max_count,
+            linear=linear,
         ):
 
             # we don't want to re-use the fragment combination more than once
@@ -136,6 +178,7 @@ def clone_combinatorial(
     enzymes: List[RestrictionType],
     include: List[str] = None,
     min_count: int = -1,
+    max_count: int = -1,
     linear: bool = True,
 ) -> List[Tuple[List[SeqRecord], List[SeqRecord]]]:
     """Parse a single list of SeqRecords to find all circularizable plasmids.
@@ -151,6 +194,8 @@ def clone_combinatorial(
     Keyword Args:
         include: the include to filter assemblies
         min_count: mininum number of SeqRecords for an assembly to be considered
+        max_count: maximum number of SeqRecords for an assembly to be considered.
+            Longer cycles of overhangs aren't searched for
         linear: Whether the individual SeqRecords are assumed to be linear
 
     Returns:
@@ -159,67 +204,180 @@ def clone_combinatorial(
             2. SeqRecords that went into each formed plasmid
     """
 
-    graph = nx.MultiDiGraph()
+    graph = OverhangGraph()
 
-    seen_seqs: Set[str] = set()  # stored list of input seqs (not new combinations)
+    seen_seqs = CircularSeqs()  # input seqs and plasmids, to find re-ligations
     for record in record_set:
-        seen_seqs.add(str(record.seq + record.seq).upper())
-        seen_seqs.add(str((record.seq + record.seq).reverse_complement().upper()))
+        seen_seqs.add(str(record.seq))
 
         for left, frag, right in _catalyze(record, enzymes, linear):
-            graph.add_node(left)
-            graph.add_node(right)
-            graph.add_edge(left, right, frag=frag)
-
-    try:  # find all circularizable cycles
-        cycles = simple_cycles(graph)
-    except NetworkXNoCycle:
-        return []
+            graph.add(left, frag, right)
 
-    # get the fragments, enzymes back out of the cycle
+    # get the fragments, enzymes back out of each circularizable cycle
     ids_to_fragments: Dict[str, List[SeqRecord]] = defaultdict(list)
     ids_to_plasmids: Dict[str, List[SeqRecord]] = defaultdict(list)
-    for cycle in cycles:
-        # filter for the minimum number of SeqRecords
-        if min_count > 0 and len(cycle) < min_count:
+    for fragments in graph.assemblies(min_count, max_count):
+        # create the composite plasmid
+        plasmid = SeqRecord(Seq("", IUPACUnambiguousDNA()))
+        for fragment in fragments:
+            plasmid += fragment.upper()
+
+        # make sure it's not just a re-ligation of insert + backbone
+        plasmid_seq = str(plasmid.seq)
+        if plasmid_seq in seen_seqs:
             continue
 
-        combinations = CombinatorialBins()
-        for i, overhang in enumerate(cycle):
-            next_overhang = cycle[(i + 1) % len(cycle)]
-            record_bin = []
-            for out_edge in graph.out_edges(keys=True):
-                src, dest, index = out_edge
-                if src != overhang or dest != next_overhang:
-                    continue
-                record_bin.append(graph.edges[src, dest, index]["frag"])
-            combinations.append(record_bin)
+        # filter for plasmids that have an 'include' feature
+        if not _has_features(plasmid, include):
+            continue
+
+        # re-order the fragments to try and match the input order
+        fragments = _reorder_fragments(record_set, fragments)
+
+        seen_seqs.add(plasmid_seq)
+
+        # make a unique id for the fragments
+        fragments_id = _hash_fragments(fragments)
+        ids_to_fragments[fragments_id] = fragments
+        ids_to_plasmids[fragments_id].append(plasmid)
+
+    return _name_plasmids(ids_to_fragments, ids_to_plasmids, enzymes)
+
+
+def clone_bins(
+    bins: List[List[SeqRecord]],
+    enzymes: List[RestrictionType],
+    include: List[str] = None,
+    min_count: int = -1,
+    max_count: int = -1,
+    linear: bool = True,
+) -> Iterator[Tuple[List[SeqRecord], List[SeqRecord]]]:
+    """Find the circularizable plasmids of a record from each bin, lazily.
+
+    Finds the assemblies that `clone_many_combinatorial()` would across all
+    the record sets of a CombinatorialBins design without making them. Each
+    unique SeqRecord is digested once and all the fragments go into one graph
+    of overhangs. The fragments of each cycle are chosen so that each bin
+    gives at most one record to an assembly, as in a record set.
+
+    A plasmid is a re-ligation, and skipped, if it's in one of its records
+    or in every record of a bin: then every record set with its records
+    has it. Otherwise some record set forms it and it's kept.
+
+    Each plasmid is yielded as it's found, with the fragments it's from.
+    A later plasmid from the same records as another gets an id ending in
+    its count, ex "(2)". `goldengate()` groups and names them by records,
+    after the last fragments found, as `clone_combinatorial()` does. Cycles
+    are found in the same order in both, so the groups are the same
+    (plasmids, fragments) as `clone_many_combinatorial()`'s, in another order.
+
+    Args:
+        bins: bins of SeqRecords, one of which from each bin is combined
+        enzymes: list of enzymes to digest the input records with
 
-        for fragments in combinations:
-            # create the composite plasmid
+    Keyword Args:
+        include: the include to filter assemblies
+        min_count: mininum number of SeqRecords for an assembly to be considered
+        max_count: maximum number of SeqRecords for an assembly to be considered.
+            Longer cycles of overhangs aren't searched for
+        linear: Whether the individual SeqRecords are assumed to be linear
+
+    Returns:
+        An iterator over tuples with:
+            1. a plasmid that will form
+            2. SeqRecords that went into the plasmid
+    """
+
+    # the unique records and the bins each is in
+    records: List[SeqRecord] = []
+    record_bins: List[Set[int]] = []
+    record_indexes: Dict[str, int] = {}
+    bin_records: List[List[int]] = []
+    for i, record_bin in enumerate(bins):
+        bin_records.append([])
+        for record in record_bin:
+            index = record_indexes.setdefault(content_id(record), len(records))
+            if index == len(records):
+                records.append(record)
+                record_bins.append(set())
+            record_bins[index].add(i)
+            bin_records[i].append(index)
+
+    graph = OverhangGraph()
+    fragment_records: Dict[int, int] = {}  # id() of each fragment to its record
+    record_seqs: List[List[str]] = []  # each record's seq doubled, on both strands
+    for index, record in enumerate(records):
+        doubled = str(record.seq).upper() * 2
+        record_seqs.append([doubled, reverse_complement(doubled)])
+
+        for left, frag, right in _catalyze(record, enzymes, linear):
+            fragment_records[id(frag)] = index
+            graph.add(left, frag, right)
+
+    def in_records(seq: str, indexes: Iterable[int]) -> bool:
+        return any(seq in s for r in indexes for s in record_seqs[r])
+
+    # the plasmids' seqs from each set of records, doubled on both strands
+    ids_to_seqs: Dict[str, List[str]] = defaultdict(list)
+    description = f"cloned from {', '.join(str(e) for e in enzymes)}"
+    for cycle in graph.cycles(min_count, max_count):
+        for fragments, used in _assemblies(
+            graph.bins(cycle), fragment_records, record_bins
+        ):
             plasmid = SeqRecord(Seq("", IUPACUnambiguousDNA()))
             for fragment in fragments:
                 plasmid += fragment.upper()
 
-            # make sure it's not just a re-ligation of insert + backbone
+            # make sure it's not a re-ligation of a record in its record sets
             plasmid_seq = str(plasmid.seq)
-            if any(plasmid_seq in seq for seq in seen_seqs):
+            if in_records(plasmid_seq, used) or any(
+                b and all(in_records(plasmid_seq, [r]) for r in b) for b in bin_records
+            ):
+                continue
+
+            # or a plasmid that its records already form
+            fragments_id = _hash_fragments(fragments)
+            seen_seqs = ids_to_seqs[fragments_id]
+            if any(plasmid_seq in s for s in seen_seqs):
                 continue
 
-            # filter for plasmids that have an 'include' feature
             if not _has_features(plasmid, include):
                 continue
 
-            # re-order the fragments to try and match the input order
-            fragments = _reorder_fragments(record_set, fragments)
+            # re-order the fragments to match the input order
+            indexes = [fragment_records[id(f)] for f in fragments]
+            if any(len(record_bins[r]) > 1 for r in used):
+                positions = _first_positions(used, bin_records, record_bins)
+                indexes = [positions[r] for r in indexes]
+            first = indexes.index(min(indexes))
+            fragments = fragments[first:] + fragments[:first]
 
-            seen_seqs.add(str(plasmid.seq + plasmid.seq))
-            seen_seqs.add(str((plasmid.seq + plasmid.seq).reverse_complement()))
+            doubled = plasmid_seq * 2
+            seen_seqs.extend([doubled, reverse_complement(doubled)])
+            plasmid.id = "+".join(f.id for f in fragments if f.id != "<unknown id>")
+            plasmid.description = description
+            if len(seen_seqs) > 2:
+                plasmid.id += f"({len(seen_seqs) // 2})"
+            yield [plasmid], fragments
 
-            # make a unique id for the fragments
-            fragments_id = _hash_fragments(fragments)
-            ids_to_fragments[fragments_id] = fragments
-            ids_to_plasmids[fragments_id].append(plasmid)
+
+def _name_plasmids(
+    ids_to_fragments: Dict[str, List[SeqRecord]],
+    ids_to_plasmids: Dict[str, List[SeqRecord]],
+    enzymes: List[RestrictionType],
+) -> List[Tuple[List[SeqRecord], List[SeqRecord]]]:
+    """Name the plasmids of each set of fragments after the fragments.
+
+    Args:
+        ids_to_fragments: the fragments of each set of records, by its hash
+        ids_to_plasmids: the plasmids the fragments form, by their records' hash
+        enzymes: the enzymes the records were digested with
+
+    Returns:
+        A list of tuples with:
+            1. plasmids that will form
+            2. SeqRecords that went into each formed plasmid
+    """
 
     plasmids_and_fragments: List[Tuple[List[SeqRecord], List[SeqRecord]]] = []
     for ids, fragments in ids_to_fragments.items():
@@ -234,6 +392,113 @@ def clone_combinatorial(
     return plasmids_and_fragments
 
 
+def _assemblies(
+    fragment_bins: List[List[SeqRecord]],
+    fragment_records: Dict[int, int],
+    record_bins: List[Set[int]],
+) -> Iterator[Tuple[List[SeqRecord], Set[int]]]:
+    """Choose a fragment from each bin of a cycle, from records in distinct bins.
+
+    The combinations are those of `product(*fragment_bins)`, in the same
+    order, without the ones with records that can't each be from a different
+    bin of the design. Those are pruned as soon as a fragment is chosen.
+
+    Args:
+        fragment_bins: the fragments between each pair of overhangs of a cycle
+        fragment_records: the record of each fragment, by id() of the fragment
+        record_bins: the design's bins that each record is in
+
+    Returns:
+        An iterator over the fragments of each assembly and their records
+    """
+
+    fragments: List[SeqRecord] = []
+    used: List[int] = []  # distinct records, in the order they're first used
+
+    def choose(i: int) -> Iterator[Tuple[List[SeqRecord], Set[int]]]:
+        if i == len(fragment_bins):
+            yield list(fragments), set(used)
+            return
+
+        for fragment in fragment_bins[i]:
+            record = fragment_records[id(fragment)]
+            new = record not in used
+            if new:
+                used.append(record)
+                if not _in_distinct_bins([record_bins[r] for r in used]):
+                    used.pop()
+                    continue
+
+            fragments.append(fragment)
+            yield from choose(i + 1)
+            fragments.pop()
+            if new:
+                used.pop()
+
+    return choose(0)
+
+
+def _first_positions(
+    used: Set[int], bin_records: List[List[int]], record_bins: List[Set[int]]
+) -> Dict[int, int]:
+    """Find the position of each record in the first record set with all of them.
+
+    Record sets are in the order of CombinatorialBins, with the last bin's
+    records changing fastest, so the first is the one with the earliest
+    record of each bin in turn that still leaves later bins for the others.
+
+    Args:
+        used: the records to find in a record set
+        bin_records: the records in each bin of the design
+        record_bins: the bins that each record is in
+
+    Returns:
+        The position (bin) of each record in the record set
+    """
+
+    positions: Dict[int, int] = {}
+    for i, records in enumerate(bin_records):
+        later = set(range(i + 1, len(bin_records)))
+        for record in records:
+            rest = [r for r in used if r not in positions and r != record]
+            if _in_distinct_bins([record_bins[r] & later for r in rest]):
+                break
+        if record in used:
+            positions.setdefault(record, i)
+    return positions
+
+
+def _in_distinct_bins(record_bins: List[Set[int]]) -> bool:
+    """Return whether each record can be from a different bin than the others.
+
+    Records are usually in a single bin. Otherwise this finds a matching of
+    records to bins with augmenting paths.
+
+    Args:
+        record_bins: the bins each record is in
+
+    Returns:
+        Whether there's a bin for each record that no other record is from
+    """
+
+    if all(len(b) == 1 for b in record_bins):
+        return len(set().union(*record_bins)) == len(record_bins)
+
+    bin_records: Dict[int, int] = {}
+
+    def assign(record: int, visited: Set[int]) -> bool:
+        for bin_index in record_bins[record]:
+            if bin_index in visited:
+                continue
+            visited.add(bin_index)
+            if bin_index not in bin_records or assign(bin_records[bin_index], visited):
+                bin_records[bin_index] = record
+                return True
+        return False
+
+    return all(assign(r, set()) for r in range(len(record_bins)))
+
+
 def _reorder_fragments(
     input_set: List[SeqRecord], output_set: List[SeqRecord]
 ) -> List[SeqRecord]:
@@ -294,6 +559,11 @@ def _catalyze(
         Tuple with: (left overhang, cut fragment, right overhang)
     """
 
+    key = CATALYZE_CACHE.key(record, enzymes, linear)
+    cached = CATALYZE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     record = record.upper()
     batch = RestrictionBatch(enzymes)
     batch_sites = batch.search(record.seq, linear=linear)
@@ -377,6 +647,7 @@ def _catalyze(
         frag_w_overhangs.append((left, frag, right))
         frag_w_overhangs.append((left_rc, frag_rc, right_rc))
 
+    CATALYZE_CACHE.put(key, frag_w_overhangs)
     return frag_w_overhangs
 
 
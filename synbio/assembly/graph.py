@@ -0,0 +1,108 @@
+"""A graph of digested fragments by overhang, for finding circular assemblies."""
+
+from itertools import product
+from typing import Dict, Iterator, List, Tuple
+
+from Bio.SeqRecord import SeqRecord
+import networkx as nx
+from networkx.algorithms.cycles import simple_cycles
+
+
+class OverhangGraph:
+    """Digested fragments indexed by their (left overhang, right overhang).
+
+    The overhangs are the nodes of a directed graph, with an edge from the
+    left to the right overhang of each fragment. Each cycle of overhangs is
+    a plasmid that may form, from any of the fragments between each pair of
+    consecutive overhangs (a bin).
+
+    Fragments are binned by their overhangs once, as they're added, so the
+    bins of a cycle are looked up rather than found among all the fragments.
+    """
+
+    def __init__(self):
+        self._graph = nx.DiGraph()
+        self._bins: Dict[Tuple[str, str], List[SeqRecord]] = {}
+
+    def add(self, left: str, fragment: SeqRecord, right: str):
+        """Add a fragment between its left and right overhangs.
+
+        Args:
+            left: The fragment's left overhang, ex "^GGAG"
+            fragment: The digested fragment
+            right: The fragment's right overhang
+        """
+
+        self._graph.add_node(left)
+        self._graph.add_node(right)
+        self._graph.add_edge(left, right)
+        self._bins.setdefault((left, right), []).append(fragment)
+
+    def cycles(self, min_count: int = -1, max_count: int = -1) -> Iterator[List[str]]:
+        """Find the cycles of overhangs, each of which could form a plasmid.
+
+        Each cycle starts at its least overhang and the cycles are sorted, so
+        two cycles are found in the same order in any graph with both. The
+        cycles of a record set and those of a larger design are consistent.
+
+        Keyword Args:
+            min_count: The fewest overhangs (and fragments) in a cycle
+            max_count: The most overhangs in a cycle. Longer cycles aren't
+                searched for if set, on networkx 3.1 and later
+
+        Returns:
+            An iterator over cycles, each a list of overhangs
+        """
+
+        if max_count > 0 and max_count < min_count:
+            return
+
+        if max_count > 0:
+            try:
+                cycles = simple_cycles(self._graph, length_bound=max_count)
+            except TypeError:  # networkx < 3.1 can't bound the search
+                cycles = (c for c in simple_cycles(self._graph) if len(c) <= max_count)
+        else:
+            cycles = simple_cycles(self._graph)
+
+        rotated: List[List[str]] = []
+        for cycle in cycles:
+            if len(cycle) >= min_count:
+                first = cycle.index(min(cycle))
+                rotated.append(cycle[first:] + cycle[:first])
+        yield from sorted(rotated)
+
+    def bins(self, cycle: List[str]) -> List[List[SeqRecord]]:
+        """Get the fragments between each pair of consecutive overhangs in a cycle.
+
+        Args:
+            cycle: A cycle of overhangs from cycles()
+
+        Returns:
+            A bin of fragments per overhang of the cycle, in the order they were added
+        """
+
+        return [
+            self._bins[overhang, cycle[(i + 1) % len(cycle)]]
+            for i, overhang in enumerate(cycle)
+        ]
+
+    def assemblies(
+        self, min_count: int = -1, max_count: int = -1
+    ) -> Iterator[List[SeqRecord]]:
+        """Find the combinations of fragments that could circularize, lazily.
+
+        Each cycle's combinations are in the order of CombinatorialBins,
+        with the last bin's fragments changing fastest.
+
+        Keyword Args:
+            min_count: The fewest fragments in an assembly
+            max_count: The most fragments in an assembly, unbounded if not set
+
+        Returns:
+            An iterator over lists of fragments, in the order they anneal
+        """
+
+        for cycle in self.cycles(min_count, max_count):
+            for fragments in product(*self.bins(cycle)):
+                yield list(fragments)
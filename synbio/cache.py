@@ -0,0 +1,162 @@
+"""A bounded, LRU cache of pickled values with an optional SQLite tier."""
+
+from collections import OrderedDict
+import os
+import pickle
+import sqlite3
+import threading
+from typing import Any, Optional
+
+
+class PickleCache:
+    """A bounded, LRU cache of pickled values with an optional SQLite tier.
+
+    Values are stored pickled, so those returned on a hit are new objects
+    that can be changed without changing the cache.
+    If a path is given, values are also written to a SQLite database there,
+    which is checked on a miss in memory. That tier is unbounded,
+    persists between runs and can be shared by processes.
+
+    Subclasses name the SQLite table and column their values are kept in.
+
+    Keyword Args:
+        size: The most values to keep in memory
+        path: The path to a SQLite database to also keep values in
+
+    Attributes:
+        hits: The number of lookups with cached values
+        misses: The number of lookups without cached values
+    """
+
+    table = "cache"
+    column = "value"
+
+    def __init__(self, size: int = 128, path: Optional[str] = None):
+        if size < 0:
+            raise ValueError(f"size must be at least 0: {size}")
+
+        self.size = size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid = 0
+        self._db_path: Optional[str] = None
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get the cached value for a key.
+
+        Args:
+            key: The cache key
+
+        Returns:
+            A copy of the cached value, None if there isn't one
+        """
+
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            elif self.path:
+                row = (
+                    self._connect()
+                    .execute(
+                        f"SELECT {self.column} FROM {self.table} WHERE key = ?", (key,)
+                    )
+                    .fetchone()
+                )
+                if row is not None:
+                    data = row[0]
+                    self._remember(key, data)
+
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return pickle.loads(data)
+
+    def put(self, key: str, value: Any):
+        """Cache the value for a key.
+
+        Args:
+            key: The cache key
+            value: The value to cache, which must be picklable
+        """
+
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, data)
+            if self.path:
+                with self._connect() as db:
+                    db.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, {self.column}) "
+                        "VALUES (?, ?)",
+                        (key, data),
+                    )
+
+    def clear(self):
+        """Remove all cached values, including those in SQLite, and reset counts."""
+
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if self.path:
+                with self._connect() as db:
+                    db.execute(f"DELETE FROM {self.table}")
+
+    def close(self):
+        """Close the connection to the SQLite database, if open."""
+
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getstate__(self) -> dict:
+        # sent to worker processes without cached values or connections
+        state = self.__dict__.copy()
+        state["_entries"] = OrderedDict()
+        state["_lock"] = None
+        state["_db"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, data: bytes):
+        """Keep a value in memory, dropping the least recently used over size."""
+
+        if not self.size:
+            return
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connect to the SQLite database, once per process and path."""
+
+        if (
+            self._db is None
+            or self._db_pid != os.getpid()
+            or self._db_path != self.path
+        ):
+            if self._db is not None and self._db_pid == os.getpid():
+                self._db.close()  # the path changed
+            self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                f"(key TEXT PRIMARY KEY, {self.column} BLOB NOT NULL)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+            self._db_path = self.path
+        return self._db
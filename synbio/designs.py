@@ -4,7 +4,8 @@ Design encode plasmids, libraries (of plasmids) or combinatorial builds
 for DNA assembly. They are the design specification used for the assembly step.
 """
 
-from typing import Dict, Iterable, List, Union
+from itertools import product
+from typing import Dict, Iterable, Iterator, List, Union
 
 from Bio.SeqRecord import SeqRecord
 
@@ -147,23 +148,129 @@ class CombinatorialBins(Design):
         self.bins: List[List[SeqRecord]] = list(bins) if bins else []
         self.linear = linear
 
-    def __iter__(self):
-        """Create all combinations of bin SeqRecords. Return each combo as a list."""
+    def __iter__(self) -> Iterator[List[SeqRecord]]:
+        """Create all combinations of bin SeqRecords. Return each combo as a list.
+
+        Combinations are made as they're iterated over, with the last bin's
+        SeqRecords changing fastest.
+        """
 
         if not self.bins:
+            return
+
+        for record_set in product(*self.bins):
+            yield list(record_set)
+
+    def combination_count(self) -> int:
+        """Return the number of combinations of bin SeqRecords, without making them.
+
+        Returns:
+            The product of the bins' sizes, 0 if there are no bins
+        """
+
+        if not self.bins:
+            return 0
+
+        count = 1
+        for record_bin in self.bins:
+            count *= len(record_bin)
+        return count
+
+    def combination(self, index: int) -> List[SeqRecord]:
+        """Return a combination of bin SeqRecords by its index in iteration order.
+
+        Args:
+            index: The index of the combination. Negative indexes count from the end
+
+        Returns:
+            The SeqRecord from each bin in that combination
+
+        Raises:
+            IndexError: If the index is out of range
+        """
+
+        count = self.combination_count()
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError(f"combination index out of range: {index}")
+
+        return [b[d] for b, d in zip(self.bins, self._digits(index))]
+
+    def shard(self, k: int, n: int) -> Iterator[List[SeqRecord]]:
+        """Iterate over the k'th of n contiguous shards of the combinations.
+
+        Workers can each take a shard of the library to split it between
+        them. The first combination of the shard is found by its index rather
+        than by iterating over the combinations before it.
+
+        Args:
+            k: The index of the shard, from 0
+            n: The number of shards
+
+        Returns:
+            An iterator over the combinations in the shard
+
+        Raises:
+            ValueError: If k isn't a shard index of n shards
+        """
+
+        if not 0 <= k < n:
+            raise ValueError(f"shard must be within [0, {n}): {k}")
+
+        count = self.combination_count()
+        start, end = k * count // n, (k + 1) * count // n
+        if start == end:
             return iter([])
+        return self._combinations_from(self._digits(start), end - start)
 
-        # separate each of the first bin into the start of new assemblies
-        record_sets: List[List[SeqRecord]] = [[r] for r in self.bins[0]]
-        for i in range(1, len(self.bins)):
-            new_record_sets: List[List[SeqRecord]] = []
-            for record_set in record_sets:
-                for record in self.bins[i]:
-                    new_record_sets.append(record_set + [record])
+    def get_all_records(self) -> List[SeqRecord]:
+        """Return all unique SeqRecords across all bins, without making combinations.
 
-            record_sets = new_record_sets
+        They're in the order they're first seen in iteration: the first
+        SeqRecord of each bin, then the rest of each bin from the last bin.
+
+        Returns:
+            The unique set of SeqRecord in this Design.
+        """
+
+        if not self.combination_count():
+            return []
+
+        ordered = [b[0] for b in self.bins]
+        for record_bin in reversed(self.bins):
+            ordered.extend(record_bin[1:])
+
+        id_to_record: Dict[str, SeqRecord] = {}
+        for record in ordered:
+            id_to_record[content_id(record)] = record
+        return list(id_to_record.values())
+
+    def _digits(self, index: int) -> List[int]:
+        """Read an index as a mixed-radix number with a digit (record index) per bin.
+
+        The last bin's digit is the least significant, as it changes fastest.
+        """
 
-        return iter(record_sets)
+        digits: List[int] = []
+        for record_bin in reversed(self.bins):
+            index, digit = divmod(index, len(record_bin))
+            digits.append(digit)
+        return digits[::-1]
+
+    def _combinations_from(
+        self, digits: List[int], count: int
+    ) -> Iterator[List[SeqRecord]]:
+        """Yield count combinations, counting up from the one at digits."""
+
+        for _ in range(count):
+            yield [b[d] for b, d in zip(self.bins, digits)]
+
+            for i in reversed(range(len(digits))):
+                digits[i] += 1
+                if digits[i] < len(self.bins[i]):
+                    break
+                digits[i] = 0
 
     def __str__(self) -> str:
         """Return high level description of the number of records at each bin
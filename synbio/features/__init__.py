@@ -14,7 +14,39 @@ are stored as features in the database accessed during annotation.
 `synbio.features.annotate()` is a function that accepts a Bio.SeqRecord and returns
 a new one with additional Bio.SeqFeatures from the feature database. It uses a
 kmer seeding to seed alignments and then filters for all DNA and protein features
-that exceed the identity ratio threshold (0.95 by default).
+that exceed the identity ratio threshold (0.95 by default). With `gapped=True`
+it also finds features with small indels relative to the query, by banded
+alignment around the seeded diagonals.
+
+`synbio.features.annotate_many()` annotates an iterable of SeqRecords over a
+pool of worker processes that share the feature database.
+
+`synbio.features.annotate_file()` streams the records of a FASTA or GenBank file
+through annotation and writes them to a GenBank file. It's also a command line tool:
+`python -m synbio.features in.fasta out.gb`.
+
+`synbio.features.translate_frames()` translates a DNA sequence in all six reading
+frames, as annotate() does to search for protein features.
+
+The feature database is loaded lazily, on the first call to annotate(). Call
+`synbio.features.FEATURE_DATABASE.preload()` to load it up-front instead.
+
+Pass a `synbio.features.AnnotationCache` to annotate() or annotate_many() to
+reuse the features of sequences that were already annotated.
+
+`synbio.features.seed.add_features()` and `remove_features()` update the
+feature database's indexes in place, without rebuilding them.
+
+`python -m synbio.features.build` rebuilds the feature database phase by phase
+(cluster, snapgene, cat, seed), skipping phases whose inputs are unchanged, and
+writes the time, CPU, peak memory and records of each phase to a JSON report.
+
+Private feature libraries are seeded with `synbio.features.seed.seed(directory)`
+and opened with `FeatureDatabase.from_directory(directory)`. Pass
+`databases=[FEATURE_DATABASE, library]` to annotate() to search both at once.
 """
 
-from .annotate import annotate
+from .annotate import annotate, annotate_file, annotate_many
+from .cache import AnnotationCache
+from .database import FeatureDatabase, FEATURE_DATABASE
+from .translate import translate_frames
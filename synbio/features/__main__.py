@@ -0,0 +1,9 @@
+"""Annotate a FASTA or GenBank file: `python -m synbio.features in.fasta out.gb`.
+
+The command line tool lives here rather than in synbio.features.annotate, so
+running it doesn't execute a module the package has already imported.
+"""
+
+from .annotate import main
+
+main()
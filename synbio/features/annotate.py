@@ -1,36 +1,61 @@
 """Align query records against the DNA and protein database."""
 
-from collections import defaultdict
-import os
-import pickle
+import argparse
+from collections import defaultdict, deque
+import functools
+import hashlib
 from math import floor
-from typing import Dict, List, Set, Tuple
+import multiprocessing
+from multiprocessing.pool import AsyncResult
+import os
+import sys
+import time
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import numpy as np
 
-from Bio.Alphabet import generic_protein
+from Bio import SeqIO
+from Bio.Alphabet import NucleotideAlphabet, ProteinAlphabet
+from Bio.Alphabet.IUPAC import IUPACAmbiguousDNA
 from Bio.Seq import Seq
 from Bio.SeqFeature import SeqFeature, FeatureLocation
 from Bio.SeqRecord import SeqRecord
 
-from .config import (
-    DNA_ID_MAP_PICKLE,
-    DNA_KMER_MAP_PICKLE,
-    PROTEIN_ID_MAP_PICKLE,
-    PROTEIN_KMER_MAP_PICKLE,
+from .cache import AnnotationCache
+from .database import FEATURE_DATABASE, FeatureDatabase, Maps
+from .index import (
+    DNA_ALPHABET,
+    PROTEIN_ALPHABET,
+    KmerIndex,
+    KmerMap,
+    LayeredIndex,
 )
+from .translate import translate_frames
 
+BAND = 8
+"""The most a gapped alignment can stray from its seeded diagonal, in bp."""
 
-if os.path.isfile(DNA_ID_MAP_PICKLE):
-    with open(DNA_ID_MAP_PICKLE, "r+b") as KMER_MAP:
-        DNA_ID_MAP = pickle.load(KMER_MAP)
-
-    with open(DNA_KMER_MAP_PICKLE, "r+b") as KMER_MAP:
-        DNA_KMER_MAP = pickle.load(KMER_MAP)
-
-    with open(PROTEIN_ID_MAP_PICKLE, "r+b") as ID_MAP:
-        PROTEIN_ID_MAP = pickle.load(ID_MAP)
-
-    with open(PROTEIN_KMER_MAP_PICKLE, "r+b") as ID_MAP:
-        PROTEIN_KMER_MAP = pickle.load(ID_MAP)
+FILE_FORMATS = {
+    ".fa": "fasta",
+    ".fasta": "fasta",
+    ".fna": "fasta",
+    ".gb": "genbank",
+    ".gbk": "genbank",
+    ".genbank": "genbank",
+}
+"""Map from file extension to the SeqIO format of records to annotate."""
 
 
 class Hit:
@@ -50,6 +75,20 @@ class Hit:
         self.subject_loc = subject_loc
 
 
+class Hits(NamedTuple):
+    """Kmer hits between the query sequence and features, as arrays.
+
+    Attributes:
+        query_locs: The index of each hit on the query seq
+        subjects: The index of each hit's feature in the KmerIndex
+        subject_locs: The index of each hit on its feature
+    """
+
+    query_locs: np.ndarray
+    subjects: np.ndarray
+    subject_locs: np.ndarray
+
+
 class Match:
     """Matches are final matches between features in the DBs and the query sequence.
 
@@ -59,6 +98,8 @@ class Match:
         query_end: The end index on the query sequence
         subject_start: The start index on the subject sequence
         subject_end: The end index on the subject sequence
+        identity: The ratio of the subject's length that aligned without an edit
+        gaps: The number of gap bp in the alignment
     """
 
     def __init__(
@@ -68,16 +109,26 @@ class Match:
         query_end: int,
         subject_start: int,
         subject_end: int,
+        identity: Optional[float] = None,
+        gaps: int = 0,
     ):
         self.subject = subject
         self.query_start = query_start
         self.query_end = query_end
         self.subject_start = subject_start
         self.subject_end = subject_end
+        self.identity = identity
+        self.gaps = gaps
 
 
 def annotate(
-    record: SeqRecord, identity: float = 0.95, circular: bool = True, cull: bool = True
+    record: SeqRecord,
+    identity: float = 0.95,
+    circular: bool = True,
+    cull: bool = True,
+    gapped: bool = False,
+    cache: Optional[AnnotationCache] = None,
+    databases: Optional[Sequence[FeatureDatabase]] = None,
 ) -> SeqRecord:
     """Create a new SeqRecord with additional DNA and protein features.
 
@@ -101,6 +152,17 @@ def annotate(
             engulfed in others. Features are removed if they have either
             $identity bp in common with another feature or are fully engulfed
             by another feature
+        gapped: Whether to also align features with small indels relative to
+            the query. Seeded diagonals without an ungapped match are aligned
+            again within a band of 8 bp either side. The features' percent
+            identity and number of gap bp are added to their qualifiers
+        cache: A cache of features by sequence. If the sequence was already
+            annotated with the same settings and database, its cached features
+            are used, otherwise the features found are added to it
+        databases: The feature databases to annotate with, the bundled
+            FEATURE_DATABASE if None. They're searched together, as one
+            database. If a feature is in more than one, the last database's
+            is used, so private libraries can be layered over the bundled one
 
     Returns:
         A new SeqRecord with additional DNA and protein features
@@ -111,37 +173,353 @@ def annotate(
             "identity must be a ratio greater than 0 and less than or equal to 1"
         )
 
-    if isinstance(record.seq, Seq) and isinstance(record.seq.alphabet, generic_protein):
+    if isinstance(record.seq, Seq) and isinstance(record.seq.alphabet, ProteinAlphabet):
         raise ValueError("annotation only supports SeqRecords with DNA Alphabets")
 
     new_record = record.upper()
     seq = str(new_record.seq.upper())
 
-    # get DNA and protein features from the currated database
-    dna_features = _get_features(
-        seq, DNA_KMER_MAP, DNA_ID_MAP, identity, circular, False
-    )
-    protein_features = _get_features(
-        seq, PROTEIN_KMER_MAP, PROTEIN_ID_MAP, identity, circular, True
-    )
+    # get DNA and protein features from the currated database, loaded on first use
+    databases = databases or [FEATURE_DATABASE]
+    dna_kmer_map, dna_id_map = _layer([database.dna for database in databases])
+    protein_kmer_map, protein_id_map = _layer([db.protein for db in databases])
+    if dna_kmer_map is None and protein_kmer_map is None:
+        raise RuntimeError(
+            "no feature database found. Create one with synbio.features.seed.seed()"
+        )
+
+    key = ""
+    if cache is not None:
+        key = cache.key(seq, identity, circular, cull, gapped, _version(databases))
+        cached_features = cache.get(key)
+        if cached_features is not None:
+            new_record.features.extend(cached_features)
+            return new_record
+
+    dna_features: List[SeqFeature] = []
+    if dna_kmer_map is not None:
+        dna_features = _get_features(
+            seq, dna_kmer_map, dna_id_map, identity, circular, False, gapped
+        )
+    protein_features: List[SeqFeature] = []
+    if protein_kmer_map is not None:
+        protein_features = _get_features(
+            seq, protein_kmer_map, protein_id_map, identity, circular, True, gapped
+        )
 
     # cull the new features to avoid highly overlapping ones
     new_features = dna_features + protein_features
     if cull:
         new_features = _cull(seq, new_features, identity)
+    if cache is not None:
+        cache.put(key, new_features)
 
     # add to the new record
     new_record.features.extend(new_features)
     return new_record
 
 
+def annotate_many(
+    records: Iterable[SeqRecord],
+    identity: float = 0.95,
+    circular: bool = True,
+    cull: bool = True,
+    gapped: bool = False,
+    processes: Optional[int] = None,
+    chunksize: int = 4,
+    cache: Optional[AnnotationCache] = None,
+    databases: Optional[Sequence[FeatureDatabase]] = None,
+) -> Iterator[SeqRecord]:
+    """Annotate many SeqRecords over a pool of processes.
+
+    The feature databases are loaded once, before the pool is created, so
+    forked workers share its (memory-mapped) pages rather than each
+    loading or being sent a copy. Records are consumed lazily from the
+    iterable with only a few chunks in flight per worker, so memory stays flat
+    no matter how many records there are.
+
+    Args:
+        records: The records to annotate with features
+
+    Keyword Args:
+        identity: The identity ratio threshold
+            below which feature hits are ignored
+        circular: Whether the records to annotate are circular or linear
+        cull: Whether to remove features that are completely or nearly fully
+            engulfed in others
+        gapped: Whether to also align features with small indels
+        processes: The number of worker processes, os.cpu_count() if None.
+            Records are annotated in this process if it's 1
+        chunksize: The number of records sent to a worker at once
+        cache: A cache of features by sequence. It's checked and updated in
+            this process, so only records that miss it are sent to workers
+        databases: The feature databases to annotate with, the bundled
+            FEATURE_DATABASE if None
+
+    Returns:
+        An iterator of new SeqRecords with additional DNA and protein
+        features, in the same order as the input records
+    """
+
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be at least 1: {chunksize}")
+
+    annotate_record = functools.partial(
+        annotate, identity=identity, circular=circular, cull=cull, gapped=gapped
+    )
+
+    databases = databases or [FEATURE_DATABASE]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for record in records:
+            yield annotate_record(record, cache=cache, databases=databases)
+        return
+
+    for database in databases:
+        database.preload()  # load before fork so workers inherit it
+
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+    with context.Pool(processes, initializer=_preload, initargs=(databases,)) as pool:
+        pending: Deque[
+            Tuple[
+                List[SeqRecord],
+                List[str],
+                List[Optional[List[SeqFeature]]],
+                AsyncResult,
+            ]
+        ] = deque()
+
+        def chunks() -> Iterator[List[SeqRecord]]:
+            chunk: List[SeqRecord] = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+        for chunk in chunks():
+            keys: List[str] = []
+            cached: List[Optional[List[SeqFeature]]] = [None] * len(chunk)
+            if cache is not None:
+                version = _version(databases)
+                keys = [
+                    cache.key(str(r.seq), identity, circular, cull, gapped, version)
+                    for r in chunk
+                ]
+                cached = [cache.get(key) for key in keys]
+            misses = [r for r, features in zip(chunk, cached) if features is None]
+            result = pool.apply_async(_annotate_chunk, (misses, annotate_record))
+            pending.append((chunk, keys, cached, result))
+            if len(pending) >= 2 * processes:
+                yield from _merge_chunk(*pending.popleft(), cache)
+
+        while pending:
+            yield from _merge_chunk(*pending.popleft(), cache)
+
+
+def annotate_file(
+    in_path: str,
+    out_path: str,
+    fmt: str = "",
+    identity: float = 0.95,
+    circular: bool = True,
+    cull: bool = True,
+    gapped: bool = False,
+    processes: Optional[int] = 1,
+    chunksize: int = 4,
+    cache: Optional[AnnotationCache] = None,
+    databases: Optional[Sequence[FeatureDatabase]] = None,
+    progress: Optional[Callable[[int, int, float], None]] = None,
+) -> int:
+    """Annotate every record in a FASTA or GenBank file and write them to GenBank.
+
+    Records are parsed, annotated and written one at a time (a few chunks at
+    a time over many processes) so memory stays flat however large the file.
+
+    Args:
+        in_path: The FASTA or GenBank file to annotate
+        out_path: The GenBank file to write annotated records to, "-" for stdout
+
+    Keyword Args:
+        fmt: The SeqIO format of the input file, guessed from its
+            extension (FILE_FORMATS) if empty
+        identity: The identity ratio threshold
+            below which feature hits are ignored
+        circular: Whether the records to annotate are circular or linear
+        cull: Whether to remove features that are completely or nearly fully
+            engulfed in others
+        gapped: Whether to also align features with small indels
+        processes: The number of worker processes, os.cpu_count() if None
+        chunksize: The number of records sent to a worker at once
+        cache: A cache of features by sequence
+        databases: The feature databases to annotate with, the bundled
+            FEATURE_DATABASE if None
+        progress: Called after each record is written with the number of
+            records and bp written and the seconds since starting
+
+    Returns:
+        The number of records written
+    """
+
+    if not fmt:
+        extension = os.path.splitext(in_path)[1].lower()
+        if extension not in FILE_FORMATS:
+            raise ValueError(f"unknown format of {in_path}, set fmt")
+        fmt = FILE_FORMATS[extension]
+
+    annotated = annotate_many(
+        SeqIO.parse(in_path, fmt),
+        identity=identity,
+        circular=circular,
+        cull=cull,
+        gapped=gapped,
+        processes=processes,
+        chunksize=chunksize,
+        cache=cache,
+        databases=databases,
+    )
+
+    start = time.perf_counter()
+    count = 0
+    bp = 0
+
+    def written() -> Iterator[SeqRecord]:
+        nonlocal count, bp
+        for record in annotated:
+            # GenBank needs a nucleotide alphabet, FASTA records have a generic one
+            if not isinstance(record.seq.alphabet, NucleotideAlphabet):
+                record.seq = Seq(str(record.seq), IUPACAmbiguousDNA())
+            yield record
+
+            count += 1
+            bp += len(record)
+            if progress:
+                progress(count, bp, time.perf_counter() - start)
+
+    if out_path == "-":
+        SeqIO.write(written(), sys.stdout, "genbank")
+    else:
+        with open(out_path, "w") as out_file:
+            SeqIO.write(written(), out_file, "genbank")
+    return count
+
+
+LAYERED_CACHE_SIZE = 4
+"""The number of combinations of feature databases whose layers are kept."""
+
+_layered: Dict[Tuple[int, ...], Tuple[List[KmerIndex], Maps]] = {}
+
+_worker_databases: Optional[Sequence[FeatureDatabase]] = None
+"""The feature databases a worker process annotates with, set by `_preload`."""
+
+
+def _preload(databases: Sequence[FeatureDatabase]):
+    """Load the feature databases in a worker process, if they weren't inherited."""
+
+    global _worker_databases
+
+    _worker_databases = databases
+    for database in databases:
+        database.preload()
+
+
+def _annotate_chunk(
+    chunk: List[SeqRecord], annotate_record: functools.partial
+) -> List[SeqRecord]:
+    """Annotate a chunk of records in a worker process."""
+
+    return [annotate_record(record, databases=_worker_databases) for record in chunk]
+
+
+def _layer(maps: List[Maps]) -> Maps:
+    """Search the DNA, or protein, kmer maps of several databases as one.
+
+    Args:
+        maps: Each database's kmer map and map from feature ID to feature
+
+    Returns:
+        A LayeredIndex over the kmer maps (the kmer map itself if there's
+        only one, None if there are none) and a map from ID to feature
+        across them all
+    """
+
+    maps = [m for m in maps if m[0] is not None]
+    if not maps:
+        return None, {}
+    if len(maps) == 1:
+        return maps[0]
+
+    # reuse the layers while the databases keep the same kmer maps loaded
+    key = tuple(id(kmer_map) for kmer_map, _ in maps)
+    layered = _layered.get(key)
+    if layered is None or any(a is not b[0] for a, b in zip(layered[0], maps)):
+        id_map: Dict[str, SeqRecord] = {}
+        for _, layer_id_map in maps:
+            id_map.update(layer_id_map)
+
+        indexes = [kmer_map for kmer_map, _ in maps]
+        layered = (indexes, (LayeredIndex(indexes), id_map))
+        _layered[key] = layered
+        while len(_layered) > LAYERED_CACHE_SIZE:
+            del _layered[next(iter(_layered))]
+    return layered[1]
+
+
+def _version(databases: Sequence[FeatureDatabase]) -> str:
+    """The version of several feature databases searched together."""
+
+    if len(databases) == 1:
+        return databases[0].version
+
+    sha = hashlib.sha1()
+    for database in databases:
+        sha.update(database.version.encode())
+    return sha.hexdigest()
+
+
+def _merge_chunk(
+    chunk: List[SeqRecord],
+    keys: List[str],
+    cached: List[Optional[List[SeqFeature]]],
+    result: AsyncResult,
+    cache: Optional[AnnotationCache],
+) -> Iterator[SeqRecord]:
+    """Merge a chunk's cached features and those annotated by a worker, in order.
+
+    Args:
+        chunk: The chunk's records
+        keys: The cache key of each record, empty without a cache
+        cached: The cached features of each record, None if not cached
+        result: The records that weren't cached, annotated by a worker
+        cache: The cache to add newly annotated features to
+
+    Returns:
+        An iterator of the chunk's annotated records
+    """
+
+    annotated = iter(result.get())
+    for i, (record, features) in enumerate(zip(chunk, cached)):
+        if features is None:
+            new_record = next(annotated)
+            if cache is not None:
+                cache.put(keys[i], new_record.features[len(record.features) :])
+        else:
+            new_record = record.upper()
+            new_record.features.extend(features)
+        yield new_record
+
+
 def _get_features(
     seq: str,
-    kmer_map: Dict[str, List[Tuple[str, int]]],
+    kmer_map: KmerMap,
     subject_map: Dict[str, SeqRecord],
     identity: float,
     circular: bool,
     protein: bool,
+    gapped: bool = False,
 ) -> List[SeqFeature]:
     """Get a list of SeqFeatures for the sequence.
 
@@ -158,29 +536,32 @@ def _get_features(
         protein: Whether to gather coding sequence annotations, in which
             case the query sequence needs to be translated into each
             of its three open reading frames
+        gapped: Whether to also align features with small indels, and add
+            their identity and gaps to the features' qualifiers
 
     Returns:
         A list of SeqFeatures that align with the query sequence
     """
 
+    if not isinstance(kmer_map, (KmerIndex, LayeredIndex)):
+        alphabet = PROTEIN_ALPHABET if protein else DNA_ALPHABET
+        kmer_map = KmerIndex.from_kmer_map(kmer_map, subject_map, alphabet)
+    index = kmer_map
+
     features: List[SeqFeature] = []
 
     def add_features(strand: bool):
-        query = seq.upper()
-        if not strand:
-            query = str(Seq(seq).reverse_complement())
-
-        frames = [query]
         if protein:
-            frames = [query[i:] for i in [0, 1, 2]]
-            frames = [f[: (len(f) // 3) * 3] for f in frames]
-            frames = [str(Seq(f).translate()) for f in frames]
+            frames = list(translate_frames(seq.upper()))
+            frames = frames[:3] if strand else frames[3:]
+        elif strand:
+            frames = [seq.upper()]
+        else:
+            frames = [str(Seq(seq).reverse_complement())]
 
         for i, frame in enumerate(frames):
-            hits = _get_hits(frame, kmer_map, subject_map, circular)
-            hits_filtered = _filter_hits(frame, hits)
-            hits_reduced = _reduce_hits(hits_filtered)
-            matches = _get_matches(frame, hits_reduced, identity)
+            hits = _get_hit_arrays(frame, index, circular)
+            matches = _chain_hits(frame, hits, index, subject_map, identity, gapped)
 
             for match in matches:
                 feature_subject = match.subject
@@ -195,7 +576,7 @@ def _get_features(
                     query_start = (query_start * 3) + i
                     query_end = (query_end * 3) + i
 
-                if query_end >= len(query):
+                if query_end >= len(seq):
                     # TODO: why aren't features across the 1-index
                     # supported by BioPython
                     continue
@@ -204,12 +585,18 @@ def _get_features(
 
                 feature_loc = FeatureLocation(query_start, query_end, strand=strand_int)
 
+                qualifiers = feature_subject.annotations
+                if gapped:
+                    qualifiers = dict(qualifiers)
+                    qualifiers["identity"] = round(100 * match.identity, 1)
+                    qualifiers["gaps"] = match.gaps
+
                 feature = SeqFeature(
                     id=feature_subject.name or feature_subject.id,
                     location=feature_loc,
                     type=feature_type,
                     strand=strand_int,
-                    qualifiers=feature_subject.annotations,
+                    qualifiers=qualifiers,
                 )
                 features.append(feature)
 
@@ -219,14 +606,533 @@ def _get_features(
     return features
 
 
+def _get_hit_arrays(seq: str, index: KmerIndex, circular: bool) -> Hits:
+    """Gather all the matches from a seq's kmers in a KmerIndex.
+
+    The query is bit-packed into an integer code per kmer all at once
+    and the codes are searched for in the index's sorted codes.
+    This is the vectorized equivalent of `_get_hits`.
+
+    Args:
+        seq: The query sequence
+        index: The kmer index to search
+        circular: Whether the query sequence is circular
+
+    Returns:
+        Hits with one entry per hit, sorted by the index of the hit on the query
+    """
+
+    word_size = index.word_size
+    query_len = 2 * len(seq) if circular else len(seq)
+
+    # only kmers starting before the end of seq, so seq + seq isn't necessary
+    query = seq + seq[: word_size - 1] if circular else seq
+    codes, valid = index.kmer_codes(query)
+    query_locs = np.flatnonzero(valid[: len(seq)])
+
+    matched, subjects, subject_locs = index.lookup(codes[query_locs])
+    query_locs = query_locs[matched]
+
+    # it starts to the left of 1-index or ends to the right of the query seq
+    subject_lefts = index.lengths[subjects] - subject_locs
+    keep = (query_locs >= subject_locs) & (subject_lefts + query_locs < query_len)
+
+    return Hits(query_locs[keep], subjects[keep], subject_locs[keep])
+
+
+def _chain_hits(
+    seq: str,
+    hits: Hits,
+    index: KmerIndex,
+    subject_map: Dict[str, SeqRecord],
+    identity: float,
+    gapped: bool = False,
+) -> List[Match]:
+    """Chain hits along diagonals, extend those that may align, turn into Matches.
+
+    Hits are grouped by their feature and diagonal (query_loc - subject_loc)
+    and the seeds on each diagonal are counted. A diagonal is only extended
+    if it has enough seeds to possibly reach the identity threshold: each
+    mismatch can remove at most weight seeds (word_size, unless the index has
+    spaced seeds) from an ungapped alignment. If only minimizers are indexed,
+    the seeds that weren't are discounted. Extension compares the query and
+    feature as byte arrays.
+
+    This replaces `_filter_hits`, `_reduce_hits` and `_get_matches`, which remain
+    as the reference implementation. Results and their order are the same.
+
+    If gapped, nearby diagonals of a feature are chained into a band and those
+    bands without an ungapped match are aligned with `_align_banded`. Their
+    Matches follow the ungapped ones.
+
+    Args:
+        seq: The query sequence
+        hits: Hits between the query sequence and the index's features
+        index: The KmerIndex the hits came from
+        subject_map: Map from subject ID to the source SeqRecord/feature
+        identity: The identity threshold below which features are ignored
+        gapped: Whether to also align bands of diagonals with gaps
+
+    Returns:
+        Matches with ranges on the query sequence
+    """
+
+    word_size = index.word_size
+    lengths = index.lengths.astype(np.int64)
+
+    # remove features that don't have enough hits to reach the identity threshold
+    counts = np.bincount(hits.subjects, minlength=len(lengths))
+    hit_lengths = lengths[hits.subjects]
+    min_hits = hit_lengths // (word_size + 1)
+    if index.window > 1:
+        # only minimizers are indexed, so expect that many fewer hits
+        hit_kmers = np.maximum(hit_lengths - word_size + 1, 1)
+        min_hits = min_hits * index.kmer_counts[hits.subjects] // hit_kmers
+    keep = (counts[hits.subjects] >= min_hits) & (hit_lengths < len(seq))
+    query_locs = hits.query_locs[keep]
+    subjects = hits.subjects[keep]
+    diagonals = query_locs - hits.subject_locs[keep]
+    if not len(subjects):
+        return []
+
+    # group by feature and diagonal, keeping the first hit of each and its seed count
+    order = np.lexsort((query_locs, diagonals, subjects))
+    query_locs, subjects, diagonals = (
+        query_locs[order],
+        subjects[order],
+        diagonals[order],
+    )
+    first = np.ones(len(subjects), dtype=bool)
+    first[1:] = (subjects[1:] != subjects[:-1]) | (diagonals[1:] != diagonals[:-1])
+    firsts = np.flatnonzero(first)
+    seeds = np.diff(np.append(firsts, len(subjects)))
+    query_locs, subjects, diagonals = (
+        query_locs[firsts],
+        subjects[firsts],
+        diagonals[firsts],
+    )
+
+    # skip diagonals with too few seeds for the ungapped alignment to reach identity
+    subject_lengths = lengths[subjects]
+    kmers = subject_lengths - word_size + 1
+    max_misses = _max_edits(subject_lengths, identity)
+    windows = np.minimum(kmers, len(seq) - diagonals)  # kmers with hits on the query
+    unindexed = kmers - index.kmer_counts[subjects]  # ambiguous, or not minimizers
+    possible = seeds >= windows - index.weight * max_misses - unindexed
+
+    # extend in the order of the first hit on the query, as in _get_matches
+    order = np.lexsort((query_locs - diagonals, subjects, query_locs))
+    order = order[possible[order]]
+
+    query = np.frombuffer((seq + seq).encode("ascii", "replace"), dtype=np.uint8)
+
+    matches: List[Match] = []
+    for batch in _batches(lengths[subjects[order]]):
+        batch_subjects = subjects[order[batch]]
+        for subject, query_start, query_end, subject_start, subject_end, score in zip(
+            *_extend(query, index, batch_subjects, diagonals[order[batch]], identity)
+        ):
+            matches.append(
+                Match(
+                    subject_map[index.ids[subject]],
+                    query_start,
+                    query_end,
+                    subject_start,
+                    subject_end,
+                    score / int(lengths[subject]),
+                )
+            )
+
+    if gapped:
+        matches.extend(
+            _chain_bands(
+                seq,
+                query,
+                index,
+                subject_map,
+                identity,
+                query_locs,
+                subjects,
+                diagonals,
+                seeds,
+                matches,
+            )
+        )
+
+    return matches
+
+
+def _chain_bands(
+    seq: str,
+    query: np.ndarray,
+    index: KmerIndex,
+    subject_map: Dict[str, SeqRecord],
+    identity: float,
+    query_locs: np.ndarray,
+    subjects: np.ndarray,
+    diagonals: np.ndarray,
+    seeds: np.ndarray,
+    ungapped: List[Match],
+) -> List[Match]:
+    """Chain diagonals into bands and align those without an ungapped Match.
+
+    A feature's diagonals are chained while they're within BAND of one another,
+    and the band is centered on the diagonal with the most seeds. A band is
+    only aligned if its seeds could reach the identity threshold: like
+    mismatches, each gap bp can remove at most word_size seeds. Bands
+    that would run past the end of the query aren't aligned, since
+    features across the 1-index aren't supported.
+
+    Args:
+        seq: The query sequence
+        query: The query sequence (doubled) as bytes
+        index: The KmerIndex the hits came from
+        subject_map: Map from subject ID to the source SeqRecord/feature
+        identity: The identity threshold below which features are ignored
+        query_locs: The first hit on the query of each diagonal
+        subjects: The feature index of each diagonal
+        diagonals: The diagonals, sorted by feature and then diagonal
+        seeds: The number of seeds on each diagonal
+        ungapped: Matches from ungapped extension of the diagonals
+
+    Returns:
+        Gapped Matches for bands without an ungapped Match
+    """
+
+    word_size = index.word_size
+    lengths = index.lengths.astype(np.int64)
+
+    # chain each feature's diagonals that are within BAND of the previous one
+    chained = np.zeros(len(subjects), dtype=bool)
+    chained[1:] = (subjects[1:] == subjects[:-1]) & (
+        diagonals[1:] - diagonals[:-1] <= BAND
+    )
+    chains = np.cumsum(~chained) - 1
+
+    # center each band on its diagonal with the most seeds
+    order = np.lexsort((-seeds, chains))
+    firsts = order[np.flatnonzero(np.diff(chains[order], prepend=-1))]
+    centers = diagonals[firsts]
+    in_band = np.abs(diagonals - centers[chains]) <= BAND
+    band_seeds = np.bincount(chains[in_band], weights=seeds[in_band])
+    band_subjects = subjects[firsts]
+    band_query_locs = np.minimum.reduceat(query_locs, np.flatnonzero(~chained))
+
+    # skip bands with too few seeds to reach identity, even with gaps
+    subject_lengths = lengths[band_subjects]
+    kmers = subject_lengths - word_size + 1
+    max_edits = _max_edits(subject_lengths, identity)
+    unindexed = kmers - index.kmer_counts[band_subjects]
+    possible = band_seeds >= kmers - word_size * max_edits - unindexed
+    possible &= centers + subject_lengths - BAND < len(seq)
+
+    # skip bands with an ungapped match
+    if ungapped:
+        ids = {subject_id: i for i, subject_id in enumerate(index.ids)}
+        matched = np.array(
+            sorted(
+                (ids[m.subject.id], m.query_start - m.subject_start) for m in ungapped
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        lows = np.searchsorted(
+            matched[:, 0] * len(query) + matched[:, 1],
+            band_subjects * len(query) + centers - BAND,
+        )
+        highs = np.searchsorted(
+            matched[:, 0] * len(query) + matched[:, 1],
+            band_subjects * len(query) + centers + BAND,
+            side="right",
+        )
+        possible &= lows == highs
+
+    order = np.lexsort((band_subjects, band_query_locs))
+    order = order[possible[order]]
+
+    # each feature bp is compared on every diagonal of its band, so smaller batches
+    matches: List[Match] = []
+    for batch in _batches(lengths[band_subjects[order]], 1 << 16):
+        batch_subjects = band_subjects[order[batch]]
+        edits, query_starts, query_ends, gaps = _align_banded(
+            query, index, batch_subjects, centers[order[batch]], max_edits[order[batch]]
+        )
+        for i in np.flatnonzero(edits <= max_edits[order[batch]]):
+            subject_length = lengths[batch_subjects[i]]
+            matches.append(
+                Match(
+                    subject_map[index.ids[batch_subjects[i]]],
+                    int(query_starts[i]),
+                    int(query_ends[i]) - 1,
+                    0,
+                    int(subject_length) - 1,
+                    float(subject_length - edits[i]) / subject_length,
+                    int(gaps[i]),
+                )
+            )
+
+    return matches
+
+
+def _max_edits(lengths: np.ndarray, identity: float) -> np.ndarray:
+    """The most edits in alignments of the given lengths that reach identity."""
+
+    return lengths - np.ceil(identity * lengths - 1e-9).astype(np.int64)
+
+
+def _batches(lengths: np.ndarray, batch_bp: int = 1 << 20) -> Iterator[slice]:
+    """Split features into batches of about batch_bp to bound memory.
+
+    Args:
+        lengths: The length of each feature
+
+    Keyword Args:
+        batch_bp: The number of bp in a batch
+
+    Returns:
+        An iterator of slices, each with at least one feature
+    """
+
+    ends = np.cumsum(lengths)
+    start = 0
+    while start < len(lengths):
+        limit = ends[start] - lengths[start] + batch_bp
+        end = max(start + 1, int(np.searchsorted(ends, limit, side="right")))
+        yield slice(start, end)
+        start = end
+
+
+def _extend(
+    query: np.ndarray,
+    index: KmerIndex,
+    subjects: np.ndarray,
+    diagonals: np.ndarray,
+    identity: float,
+) -> Tuple[List[int], List[int], List[int], List[int], List[int], List[int]]:
+    """Extend features along diagonals of the query without gaps.
+
+    Each feature is compared, in full, to the query starting at its diagonal.
+    Like `_get_matches`, an alignment is abandoned if, at any multiple of 10bp,
+    it has more mismatches than the identity threshold allows.
+
+    Args:
+        query: The query sequence (doubled) as bytes
+        index: The KmerIndex with the features
+        subjects: The index of each feature to extend
+        diagonals: The start index on the query of each feature
+        identity: The identity threshold below which features are ignored
+
+    Returns:
+        A tuple of lists, one entry for each alignment above the threshold:
+            1. the feature index
+            2. the first matched index on the query
+            3. the last matched index on the query
+            4. the first matched index on the feature
+            5. the last matched index on the feature
+            6. the number of matched bp
+    """
+
+    lengths = index.lengths[subjects].astype(np.int64)
+    segment_starts = np.cumsum(lengths) - lengths
+    segments = np.repeat(np.arange(len(subjects)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(segment_starts, lengths)
+
+    subject_starts = index.seq_starts[subjects].astype(np.int64)
+    equal = (
+        query[np.repeat(diagonals, lengths) + offsets]
+        == index.seqs[np.repeat(subject_starts, lengths) + offsets]
+    )
+    scores = np.bincount(segments, weights=equal, minlength=len(subjects))
+
+    # mismatches at every 10bp checkpoint before the end of the feature
+    misses = np.cumsum(~equal)
+    misses_before = misses[segment_starts] - (~equal[segment_starts])
+    checks = (lengths - 1) // 10
+    check_segments = np.repeat(np.arange(len(subjects)), checks)
+    check_ends = 10 * (
+        np.arange(checks.sum()) - np.repeat(np.cumsum(checks) - checks, checks) + 1
+    )
+    check_misses = (
+        misses[segment_starts[check_segments] + check_ends - 1]
+        - misses_before[check_segments]
+    )
+    bailed = np.bincount(
+        check_segments,
+        weights=check_misses >= (1 - identity) * lengths[check_segments],
+        minlength=len(subjects),
+    )
+
+    passed = (bailed == 0) & (scores >= identity * lengths)
+
+    # first and last matched bp of each alignment
+    matched = np.flatnonzero(equal)
+    matched_segments = segments[matched]
+    _, firsts = np.unique(matched_segments, return_index=True)
+    _, lasts = np.unique(matched_segments[::-1], return_index=True)
+    matched_ids = np.unique(matched_segments)
+    subject_firsts = np.zeros(len(subjects), dtype=np.int64)
+    subject_lasts = np.zeros(len(subjects), dtype=np.int64)
+    subject_firsts[matched_ids] = offsets[matched[firsts]]
+    subject_lasts[matched_ids] = offsets[matched[len(matched) - 1 - lasts]]
+
+    passed_ids = np.flatnonzero(passed)
+    return (
+        subjects[passed_ids].tolist(),
+        (diagonals[passed_ids] + subject_firsts[passed_ids]).tolist(),
+        (diagonals[passed_ids] + subject_lasts[passed_ids]).tolist(),
+        subject_firsts[passed_ids].tolist(),
+        subject_lasts[passed_ids].tolist(),
+        scores[passed_ids].astype(np.int64).tolist(),
+    )
+
+
+def _align_banded(
+    query: np.ndarray,
+    index: KmerIndex,
+    subjects: np.ndarray,
+    diagonals: np.ndarray,
+    max_edits: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Align features to the query, with gaps, within BAND of a diagonal.
+
+    Each feature is aligned in full against any stretch of the query within
+    the band, counting one edit per mismatch and per gap bp. Alignments grow
+    one edit at a time: with e edits, each diagonal of the band records the
+    furthest feature bp it reaches, sliding along runs of matches
+    (a diagonal-transition, or wavefront, alignment). All features are aligned
+    together and the best alignment is the first to reach a feature's end.
+
+    An alignment is abandoned early if its edits so far, plus one for
+    every word_size feature kmers past its furthest bp that don't match
+    the query on any diagonal of the band, exceed its max edits.
+
+    Args:
+        query: The query sequence (doubled) as bytes
+        index: The KmerIndex with the features
+        subjects: The index of each feature to align
+        diagonals: The query index that each feature's band is centered on
+        max_edits: The most edits each alignment can have and reach identity
+
+    Returns:
+        A tuple of arrays, one entry for each feature:
+            1. the number of edits in its best alignment, above max_edits if abandoned
+            2. the start index of the alignment on the query
+            3. the end index (exclusive) of the alignment on the query
+            4. the number of gap bp in the alignment
+    """
+
+    word_size = index.word_size
+    count = len(subjects)
+    band = np.arange(-BAND, BAND + 1)
+    unreached = -(1 << 30)
+
+    edits = max_edits.astype(np.int64) + 1
+    query_starts = np.zeros(count, dtype=np.int64)
+    query_ends = np.zeros(count, dtype=np.int64)
+    gap_counts = np.zeros(count, dtype=np.int64)
+
+    # a row per feature bp, plus one that never matches, and a column per diagonal
+    lengths = index.lengths[subjects].astype(np.int64)
+    row_starts = np.cumsum(lengths + 1) - lengths - 1
+    rows = np.repeat(np.arange(count), lengths + 1)
+    offsets = np.arange(len(rows)) - row_starts[rows]
+    at_end = offsets == lengths[rows]
+
+    # whether each feature bp matches the query on each diagonal. Padding the
+    # query with bytes that never match keeps the band within it
+    padded = np.zeros(len(query) + 3 * BAND + 2, dtype=np.uint8)
+    padded[BAND + 1 : BAND + 1 + len(query)] = query
+    subject_bp = index.seqs[
+        index.seq_starts[subjects].astype(np.int64)[rows]
+        + np.minimum(offsets, lengths[rows] - 1)
+    ]
+    query_locs = diagonals.astype(np.int64)[rows] + offsets
+    equal = padded[query_locs[:, None] + band + BAND + 1] == subject_bp[:, None]
+    equal[at_end] = False
+
+    # the length of the run of matches from each bp on each diagonal
+    positions = np.arange(len(rows), dtype=np.int32)[:, None]
+    mismatches = np.where(equal, np.int32(len(rows)), positions)
+    runs = np.minimum.accumulate(mismatches[::-1], axis=0)[::-1] - positions
+    del equal, mismatches
+
+    # the feature kmers from each bp on that don't match on any diagonal
+    unmatched = ((runs < word_size).all(axis=1)) & (
+        offsets <= lengths[rows] - word_size
+    )
+    unmatched_after = np.append(np.cumsum(unmatched[::-1])[::-1], 0)
+    unmatched_after = (
+        unmatched_after[:-1] - unmatched_after[(row_starts + lengths + 1)[rows]]
+    )
+
+    # with no edits, every diagonal whose query index is in range
+    ids = np.arange(count)
+    limits = max_edits.astype(np.int64)
+    firsts = diagonals.astype(np.int64)[:, None] + band
+    reached = np.where(firsts >= 0, runs[row_starts], unreached)
+    traces = firsts << 24  # the alignment's start on the query, then its gap bp
+
+    for edit in range(int(limits.max()) + 1 if len(limits) else 0):
+        ends = lengths[ids]
+        done = (reached >= ends[:, None]).any(axis=1)
+        furthest = np.clip(reached.max(axis=1), 0, ends)
+        bound = (
+            edit
+            + (unmatched_after[row_starts[ids] + furthest] + word_size - 1) // word_size
+        )
+        abandoned = (reached.max(axis=1) < 0) | (bound > limits)
+
+        finished = np.flatnonzero(done)
+        diagonal = np.argmax(reached[finished] >= ends[finished, None], axis=1)
+        edits[ids[finished]] = edit
+        query_starts[ids[finished]] = traces[finished, diagonal] >> 24
+        query_ends[ids[finished]] = firsts[finished, diagonal] + ends[finished]
+        gap_counts[ids[finished]] = traces[finished, diagonal] & 0xFFFFFF
+
+        keep = ~(done | abandoned)
+        if not keep.any():
+            break
+        ids, limits, firsts = ids[keep], limits[keep], firsts[keep]
+        reached, traces = reached[keep], traces[keep]
+
+        # a mismatch on the same diagonal, or a gap in the query from the next
+        # diagonal, or a gap in the feature from the previous diagonal
+        deletion, deletion_traces = np.full_like(reached, unreached), traces.copy()
+        deletion[:, :-1] = reached[:, 1:] + 1
+        deletion_traces[:, :-1] = traces[:, 1:] + 1
+        insertion, insertion_traces = np.full_like(reached, unreached), traces.copy()
+        insertion[:, 1:] = reached[:, :-1]
+        insertion_traces[:, 1:] = traces[:, :-1] + 1
+
+        reached = reached + 1
+        use = deletion > reached
+        reached = np.where(use, deletion, reached)
+        traces = np.where(use, deletion_traces, traces)
+        use = insertion > reached
+        reached = np.minimum(np.where(use, insertion, reached), lengths[ids, None])
+        traces = np.where(use, insertion_traces, traces)
+
+        # slide along the run of matches from the new furthest bp
+        valid = reached >= 0
+        slides = runs[
+            (row_starts[ids, None] + np.maximum(reached, 0)),
+            np.arange(len(band)),
+        ]
+        reached = np.where(valid, reached + slides, unreached)
+
+    return edits, query_starts, query_ends, gap_counts
+
+
 def _get_hits(
     seq: str,
-    kmer_map: Dict[str, List[Tuple[str, int]]],
+    kmer_map: KmerMap,
     subject_map: Dict[str, SeqRecord],
     circular: bool,
 ) -> List[Hit]:
     """Gather all the matches from a seq's kmers in a kmer_map.
 
+    This is the reference, one kmer at a time, implementation
+    of `_get_hit_arrays`.
+
     Args:
         seq: The query sequence
         kmer_map: Map from kmer to a list of tuples with:
@@ -241,8 +1147,10 @@ def _get_hits(
 
     assert kmer_map and subject_map
 
-    first_key = list(kmer_map.keys())[0]
-    word_size = len(first_key)
+    if isinstance(kmer_map, KmerIndex):
+        word_size = kmer_map.word_size
+    else:
+        word_size = len(next(iter(kmer_map)))
 
     query = seq + seq if circular else seq
 
@@ -280,6 +1188,8 @@ def _get_hits(
 def _filter_hits(seq: str, hits: List[Hit]) -> List[Hit]:
     """Remove hits that don't show up enough to reach identity threshold.
 
+    This is the reference implementation of the first step of `_chain_hits`.
+
     This is just a small heuristic method to avoid the hit expansion/DP
     part of alignment. The alignment/expansion part is expensive
     and this cuts down the number of hits that have to be expanded
@@ -327,6 +1237,8 @@ def _filter_hits(seq: str, hits: List[Hit]) -> List[Hit]:
 def _reduce_hits(hits: List[Hit]) -> List[Hit]:
     """Get rid of redundant hits representing the same stretch.
 
+    This is the reference implementation of the grouping in `_chain_hits`.
+
     If hits all correspond to the same range on the query sequence
     the hits can be reduced to just the first hit since it will be
     expanded and engulf the other hits during expansion.
@@ -352,6 +1264,8 @@ def _reduce_hits(hits: List[Hit]) -> List[Hit]:
 def _get_matches(seq: str, hits: List[Hit], identity: float) -> List[Match]:
     """Expand Hits with an alignment against the query sequence, turn into Matches.
 
+    This is the reference implementation of `_extend`.
+
     Filter out hits/matches that fall beneath the identity threshold after expansion.
 
     Args:
@@ -412,6 +1326,11 @@ def _cull(seq: str, features: List[SeqFeature], identity: float) -> List[SeqFeat
         1. 100% engulfed by another feature
         2. percentage identity bp in common with another feature
 
+    Features are considered longest first and the bp each has in common with
+    longer features (culled or not) are summed per feature ID. The bp in common
+    come from a sweep over the features' ranges, so the cost depends on the
+    number of overlapping features rather than their length.
+
     Args:
         seq: The query sequence
         features: Features to cull
@@ -423,26 +1342,124 @@ def _cull(seq: str, features: List[SeqFeature], identity: float) -> List[SeqFeat
 
     features = sorted(features, key=len, reverse=True)
 
-    hits: List[List[str]] = []
-    for _ in range(len(seq)):
-        hits.append([])
+    # the bp each feature covers, inclusive of its end, split across the 1-index
+    ranges: List[Tuple[int, int, int]] = []
+    for rank, feature in enumerate(features):
+        start, end = int(feature.location.start), int(feature.location.end)
+        if start < 0:
+            ranges.append((start + len(seq), len(seq) - 1, rank))
+            start = 0
+        ranges.append((start, end, rank))
+    ranges.sort()
+
+    # bp in common with the features before each feature, by feature ID
+    overlaps: List[Dict[str, int]] = [defaultdict(int) for _ in features]
+    active: List[Tuple[int, int, int]] = []
+    for start, end, rank in ranges:
+        active = [r for r in active if r[1] >= start]
+        for _, other_end, other_rank in active:
+            common = min(end, other_end) - start + 1
+            if other_rank < rank:
+                overlaps[rank][features[other_rank].id] += common
+            elif other_rank > rank:
+                overlaps[other_rank][features[rank].id] += common
+        active.append((start, end, rank))
 
     features_unculled: List[SeqFeature] = []
-    for feature in features:
-        overlaps: Dict[str, int] = defaultdict(int)
-        for i in range(int(feature.location.start), int(feature.location.end) + 1):
-            for overlap in hits[i]:
-                overlaps[overlap] += 1
-            hits[i].append(feature.id)
-
-        cull = False
+    for feature, feature_overlaps in zip(features, overlaps):
         overlap_threshold = identity * len(feature)
-        for overlap, count in overlaps.items():
-            if count >= overlap_threshold:
-                cull = True
-                break
-
-        if not cull:
+        if all(count < overlap_threshold for count in feature_overlaps.values()):
             features_unculled.append(feature)
 
     return features_unculled
+
+
+def main(args: Optional[List[str]] = None):
+    """Annotate a FASTA or GenBank file from the command line.
+
+    Usage:
+        python -m synbio.features [options] in_path out_path
+
+    Keyword Args:
+        args: Command line arguments, sys.argv[1:] if None
+    """
+
+    parser = argparse.ArgumentParser(
+        prog="python -m synbio.features",
+        description="Annotate the records in a FASTA or GenBank file with "
+        "features and write them to a GenBank file.",
+    )
+    parser.add_argument("in_path", help="FASTA or GenBank file to annotate")
+    parser.add_argument("out_path", help="GenBank file to write, - for stdout")
+    parser.add_argument(
+        "--format", default="", help="input format, guessed from extension if unset"
+    )
+    parser.add_argument(
+        "--identity", type=float, default=0.95, help="identity ratio threshold"
+    )
+    parser.add_argument("--linear", action="store_true", help="records are linear")
+    parser.add_argument("--no-cull", action="store_true", help="keep engulfed features")
+    parser.add_argument(
+        "--gapped", action="store_true", help="align features with small indels"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="worker processes, 0 for one per CPU"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=4, help="records sent to a worker at once"
+    )
+    parser.add_argument("--cache", default="", help="SQLite file to cache features in")
+    parser.add_argument(
+        "--database",
+        action="append",
+        default=[],
+        help="directory of a private feature library (see seed) to annotate with "
+        "too, may be repeated",
+    )
+    parser.add_argument("--quiet", action="store_true", help="don't report progress")
+    parsed = parser.parse_args(args)
+
+    progress = [0, 0, 0.0]  # records, bp, seconds
+    last_report = 0.0
+
+    def report(count: int, bp: int, seconds: float):
+        nonlocal last_report
+        progress[:] = [count, bp, seconds]
+        if not parsed.quiet and seconds - last_report >= 1.0:
+            last_report = seconds
+            print(_throughput(count, bp, seconds), file=sys.stderr)
+
+    cache = AnnotationCache(path=parsed.cache) if parsed.cache else None
+    databases = [FEATURE_DATABASE] + [
+        FeatureDatabase.from_directory(d) for d in parsed.database
+    ]
+    annotate_file(
+        parsed.in_path,
+        parsed.out_path,
+        fmt=parsed.format,
+        identity=parsed.identity,
+        circular=not parsed.linear,
+        cull=not parsed.no_cull,
+        gapped=parsed.gapped,
+        processes=parsed.processes or None,
+        chunksize=parsed.chunksize,
+        cache=cache,
+        databases=databases,
+        progress=report,
+    )
+    if cache is not None:
+        cache.close()
+
+    if not parsed.quiet:
+        count, bp, seconds = progress
+        print(f"annotated {_throughput(count, bp, seconds)}", file=sys.stderr)
+
+
+def _throughput(count: int, bp: int, seconds: float) -> str:
+    """Describe the records and bp annotated per second."""
+
+    rate = max(seconds, 1e-9)
+    return (
+        f"{count} records ({bp} bp) in {seconds:.1f}s: "
+        f"{count / rate:.2f} records/s, {bp / rate / 1000:.1f} kbp/s"
+    )
@@ -0,0 +1,428 @@
+"""Build the feature databases phase by phase, with a report on each phase.
+
+`python -m synbio.features.build` runs the phases of `make features`:
+
+- cluster: cluster iGEM's features into igem/dna.db and igem/protein.db
+- snapgene: parse SnapGene's features into snapgene/dna.db and protein.db
+- cat: concatenate the SnapGene and iGEM databases into dna.db and protein.db
+- seed: index dna.db and protein.db for annotation
+
+Each phase runs in its own process so its CPU time (counting its worker
+processes) and peak RSS are its own. The wall time, CPU time, peak RSS and
+the records in each phase's outputs are written to a JSON report.
+
+A phase is skipped if the content of its inputs, including the source of
+the modules it runs, hasn't changed since it last ran and its outputs are
+as it left them. The SHA-256 digests of both are kept in BUILD_STATE.
+"""
+
+import argparse
+from datetime import datetime
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import time
+import traceback
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from . import cluster as cluster_module
+from .config import (
+    DIR_NAME,
+    DNA_DB,
+    DNA_ID_MAP_PICKLE,
+    DNA_INDEX,
+    FEATURE_DIR,
+    PROTEIN_DB,
+    PROTEIN_ID_MAP_PICKLE,
+    PROTEIN_INDEX,
+)
+from .index import read_header
+from .seed import seed
+
+BUILD_STATE = os.path.join(FEATURE_DIR, "build.state.json")
+BUILD_REPORT = os.path.join(FEATURE_DIR, "build.json")
+SNAPGENE_DIR = os.path.join(FEATURE_DIR, "snapgene")
+SNAPGENE_DNA_DB = os.path.join(SNAPGENE_DIR, "dna.db")
+SNAPGENE_PROTEIN_DB = os.path.join(SNAPGENE_DIR, "protein.db")
+
+CHUNK_SIZE = 1 << 20  # bytes read at a time when hashing files
+
+
+class Phase(NamedTuple):
+    """A phase of the build.
+
+    Attributes:
+        name: The name of the phase, ex "cluster"
+        inputs: The files and directories the phase reads
+        outputs: The files and directories the phase writes
+        run: Runs the phase
+        count: Counts the records in the phase's outputs, by output name
+    """
+
+    name: str
+    inputs: List[str]
+    outputs: List[str]
+    run: Callable[[], None]
+    count: Callable[[], Dict[str, int]]
+
+
+def phases(processes: Optional[int] = None, python2: str = "python2") -> List[Phase]:
+    """Create the phases of the feature database build, in order.
+
+    Keyword Args:
+        processes: The number of worker processes, os.cpu_count() if None
+        python2: The Python 2 interpreter to parse SnapGene files with
+
+    Returns:
+        The cluster, snapgene, cat and seed phases
+    """
+
+    igem_dna_db = cluster_module.DNA_DB
+    igem_protein_db = cluster_module.PROTEIN_DB
+
+    return [
+        Phase(
+            "cluster",
+            [cluster_module.IGEM]
+            + _sources("cluster", "config", "greedy", "index", "store"),
+            [igem_dna_db, igem_protein_db],
+            functools.partial(_cluster, processes),
+            functools.partial(
+                _count_fastas, {"dna": igem_dna_db, "protein": igem_protein_db}
+            ),
+        ),
+        Phase(
+            "snapgene",
+            [SNAPGENE_DIR + os.sep + "*.dna"] + _sources("snapgene"),
+            [SNAPGENE_DNA_DB, SNAPGENE_PROTEIN_DB],
+            functools.partial(_snapgene, python2),
+            functools.partial(
+                _count_fastas, {"dna": SNAPGENE_DNA_DB, "protein": SNAPGENE_PROTEIN_DB}
+            ),
+        ),
+        Phase(
+            "cat",
+            [SNAPGENE_DNA_DB, igem_dna_db, SNAPGENE_PROTEIN_DB, igem_protein_db],
+            [DNA_DB, PROTEIN_DB],
+            _cat,
+            functools.partial(_count_fastas, {"dna": DNA_DB, "protein": PROTEIN_DB}),
+        ),
+        Phase(
+            "seed",
+            [DNA_DB, PROTEIN_DB] + _sources("seed", "config", "index"),
+            [DNA_ID_MAP_PICKLE, PROTEIN_ID_MAP_PICKLE, DNA_INDEX, PROTEIN_INDEX],
+            functools.partial(_seed, processes),
+            _count_indexes,
+        ),
+    ]
+
+
+def build(
+    build_phases: List[Phase],
+    state_path: str = BUILD_STATE,
+    force: bool = False,
+    quiet: bool = False,
+) -> dict:
+    """Run the phases of a build, skipping those whose inputs are unchanged.
+
+    Args:
+        build_phases: The phases to run, in order
+
+    Keyword Args:
+        state_path: The JSON file with the digests of each phase's inputs
+            and outputs when it last ran
+        force: Whether to run every phase, changed or not
+        quiet: Whether to not report each phase on stderr
+
+    Raises:
+        RuntimeError: If a phase fails, after saving the state of the phases
+            before it
+
+    Returns:
+        The report of the build: when it started, its wall time, and for
+        each phase whether it was skipped, its wall time, CPU time and peak
+        RSS (None if skipped) and the records in its outputs
+    """
+
+    state: Dict[str, Dict[str, str]] = {}
+    if os.path.exists(state_path):
+        with open(state_path, "r") as state_file:
+            state = json.load(state_file)
+
+    report: dict = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "wall_seconds": 0.0,
+        "phases": [],
+    }
+    start = time.perf_counter()
+
+    for phase in build_phases:
+        inputs = _digest(phase.inputs)
+        last = state.get(phase.name, {})
+        skip = (
+            not force
+            and last.get("inputs") == inputs
+            and all(os.path.exists(o) for o in phase.outputs)
+            and last.get("outputs") == _digest(phase.outputs)
+        )
+
+        usage: dict = {"skipped": skip}
+        usage.update(wall_seconds=None, cpu_seconds=None, peak_rss_mb=None)
+        if not skip:
+            phase_start = time.perf_counter()
+            usage.update(_run(phase))
+            usage["wall_seconds"] = round(time.perf_counter() - phase_start, 3)
+
+            state[phase.name] = {"inputs": inputs, "outputs": _digest(phase.outputs)}
+            with open(state_path, "w") as state_file:
+                json.dump(state, state_file, indent=2)
+
+        usage["records"] = phase.count()
+        report["phases"].append({"name": phase.name, **usage})
+
+        if not quiet:
+            print(_describe(phase.name, usage), file=sys.stderr)
+
+    report["wall_seconds"] = round(time.perf_counter() - start, 3)
+    return report
+
+
+def main(args: Optional[List[str]] = None):
+    """Build the feature databases from the command line.
+
+    Usage:
+        python -m synbio.features.build [options]
+
+    Keyword Args:
+        args: Command line arguments, sys.argv[1:] if None
+    """
+
+    names = [p.name for p in phases()]
+    parser = argparse.ArgumentParser(
+        prog="python -m synbio.features.build",
+        description="Build the feature databases and report the time and memory "
+        "of each phase.",
+    )
+    parser.add_argument(
+        "--phase",
+        action="append",
+        choices=names,
+        default=[],
+        help="phase to run, may be repeated, all phases if unset",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="run phases whose inputs are unchanged"
+    )
+    parser.add_argument(
+        "--processes", type=int, default=0, help="worker processes, 0 for one per CPU"
+    )
+    parser.add_argument(
+        "--python2", default="python2", help="Python 2 to parse SnapGene files with"
+    )
+    parser.add_argument("--report", default=BUILD_REPORT, help="JSON report to write")
+    parser.add_argument("--quiet", action="store_true", help="don't report phases")
+    parsed = parser.parse_args(args)
+
+    build_phases = [
+        p
+        for p in phases(parsed.processes or None, parsed.python2)
+        if not parsed.phase or p.name in parsed.phase
+    ]
+    report = build(build_phases, force=parsed.force, quiet=parsed.quiet)
+    with open(parsed.report, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+def _run(phase: Phase) -> Dict[str, float]:
+    """Run a phase in a child process and measure its resource usage.
+
+    Raises:
+        RuntimeError: If the phase fails
+
+    Returns:
+        The CPU time (in seconds) and peak RSS (in MB) of the phase, with
+        its worker processes
+    """
+
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_child, args=(phase.run, sender))
+    process.start()
+    sender.close()
+    try:
+        error, usage = receiver.recv()
+    except EOFError:
+        error, usage = f"exited with code {process.exitcode}", {}
+    process.join()
+
+    if error:
+        raise RuntimeError(f"{phase.name} failed: {error}")
+    return usage
+
+
+def _run_child(run: Callable[[], None], sender):
+    """Run a phase and send its error (if any) and resource usage to the parent.
+
+    Without the resource module, the CPU time is only this process's and
+    the peak RSS is None.
+    """
+
+    try:
+        run()
+    except BaseException:
+        sender.send((traceback.format_exc(), {}))
+        return
+
+    try:
+        import resource
+    except ImportError:  # not on Windows, where there's no peak RSS to read
+        cpu = time.process_time()
+        sender.send(("", {"cpu_seconds": round(cpu, 3), "peak_rss_mb": None}))
+        return
+
+    cpu = 0.0
+    peak = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        cpu += usage.ru_utime + usage.ru_stime
+        peak = max(peak, usage.ru_maxrss)
+    peak /= 1024 * 1024 if sys.platform == "darwin" else 1024  # bytes or KB
+
+    sender.send(("", {"cpu_seconds": round(cpu, 3), "peak_rss_mb": round(peak, 1)}))
+
+
+def _digest(paths: List[str]) -> str:
+    """Hash the names and contents of files and directories, in order.
+
+    Paths ending in "*.ext" are the files with that extension in a directory
+    and its subdirectories. Missing paths are hashed as missing.
+    """
+
+    digest = hashlib.sha256()
+    for path in paths:
+        files = [path]
+        if os.path.basename(path).startswith("*"):
+            path, extension = os.path.dirname(path), os.path.basename(path)[1:]
+            files = [f for f in _walk(path) if f.endswith(extension)]
+        elif os.path.isdir(path):
+            files = _walk(path)
+
+        digest.update(f"{path}\0".encode())
+        for file in files:
+            digest.update(f"{os.path.relpath(file, path)}\0".encode())
+            if not os.path.isfile(file):
+                digest.update(b"missing\0")
+                continue
+            with open(file, "rb") as opened:
+                for chunk in iter(lambda: opened.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _walk(directory: str) -> List[str]:
+    """List the files in a directory and its subdirectories, sorted."""
+
+    return sorted(os.path.join(d, f) for d, _, fs in os.walk(directory) for f in fs)
+
+
+def _sources(*modules: str) -> List[str]:
+    """The source files of modules in this package."""
+
+    return [os.path.join(DIR_NAME, m + ".py") for m in modules]
+
+
+def _describe(name: str, usage: dict) -> str:
+    """Describe a phase's run for the progress report."""
+
+    records = ", ".join(f"{c} {n}" for n, c in usage["records"].items())
+    if usage["skipped"]:
+        return f"{name}: skipped, unchanged ({records})"
+    peak = usage["peak_rss_mb"]
+    return (
+        f"{name}: {usage['wall_seconds']:.1f}s wall, {usage['cpu_seconds']:.1f}s CPU, "
+        f"{'?' if peak is None else f'{peak:.0f}'} MB peak RSS ({records})"
+    )
+
+
+def _cluster(processes: Optional[int]):
+    """Cluster iGEM's features, without the intermediate files of a past build."""
+
+    for intermediate in [
+        cluster_module.PARTS,
+        cluster_module.DNA,
+        cluster_module.PROTEIN,
+        cluster_module.DNA_CLSTR,
+        cluster_module.DNA_CLSTR + ".clstr",
+        cluster_module.PROTEIN_CLSTR,
+        cluster_module.PROTEIN_CLSTR + ".clstr",
+    ]:
+        if os.path.exists(intermediate):
+            os.remove(intermediate)
+
+    cluster_module.cluster(processes)
+
+
+def _snapgene(python2: str):
+    """Parse the SnapGene files with Python 2, which dgparse requires.
+
+    snapgene.py is run as a script, by path, so Python 2 doesn't import the
+    (Python 3) synbio packages it's in.
+    """
+
+    subprocess.run([python2, os.path.join(DIR_NAME, "snapgene.py")], check=True)
+
+
+def _cat():
+    """Concatenate the SnapGene and iGEM databases, SnapGene's first.
+
+    Each database is written to a temporary file that replaces it once
+    complete, so a missing input doesn't truncate the last build's.
+    """
+
+    for out_path, in_paths in [
+        (DNA_DB, [SNAPGENE_DNA_DB, cluster_module.DNA_DB]),
+        (PROTEIN_DB, [SNAPGENE_PROTEIN_DB, cluster_module.PROTEIN_DB]),
+    ]:
+        with open(out_path + ".tmp", "wb") as out_file:
+            for in_path in in_paths:
+                with open(in_path, "rb") as in_file:
+                    shutil.copyfileobj(in_file, out_file)
+        os.replace(out_path + ".tmp", out_path)
+
+
+def _seed(processes: Optional[int]):
+    """Index the feature databases."""
+
+    seed(processes=processes)
+
+
+def _count_fastas(paths: Dict[str, str]) -> Dict[str, int]:
+    """Count the records in FASTA files, by name. 0 if a file is missing."""
+
+    counts: Dict[str, int] = {}
+    for name, path in paths.items():
+        counts[name] = 0
+        if os.path.isfile(path):
+            with open(path, "rb") as fasta:
+                counts[name] = sum(line.startswith(b">") for line in fasta)
+    return counts
+
+
+def _count_indexes() -> Dict[str, int]:
+    """Count the features in the DNA and protein indexes."""
+
+    return {
+        name: len(read_header(index)["ids"]) if os.path.isdir(index) else 0
+        for name, index in [("dna", DNA_INDEX), ("protein", PROTEIN_INDEX)]
+    }
+
+
+if __name__ == "__main__":
+    main()
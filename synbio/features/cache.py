@@ -0,0 +1,86 @@
+"""Memoize annotation results by sequence.
+
+Libraries of plasmids share backbones and parts, so the same sequences are
+annotated again and again. An AnnotationCache keeps the features annotate()
+found for a sequence, keyed on a hash of the sequence, the annotation
+settings and the feature database's version, so changing any of those
+misses the cache rather than returning stale features.
+"""
+
+import hashlib
+from typing import List, Optional
+
+from Bio.SeqFeature import SeqFeature
+
+from ..cache import PickleCache
+
+
+class AnnotationCache(PickleCache):
+    """A bounded, LRU cache of annotate() features with an optional SQLite tier.
+
+    Features are stored pickled, so those returned on a hit are new
+    SeqFeatures that can be changed without changing the cache.
+    If a path is given, features are also written to a SQLite database there,
+    which is checked on a miss in memory. That tier is unbounded,
+    persists between runs and can be shared by processes.
+
+    Keyword Args:
+        size: The most sequences to keep in memory
+        path: The path to a SQLite database to also keep features in
+
+    Attributes:
+        hits: The number of lookups with cached features
+        misses: The number of lookups without cached features
+    """
+
+    table = "annotations"
+    column = "features"
+
+    @staticmethod
+    def key(
+        seq: str,
+        identity: float,
+        circular: bool,
+        cull: bool,
+        gapped: bool,
+        version: str,
+    ) -> str:
+        """Create the cache key of a sequence's annotation.
+
+        Args:
+            seq: The sequence to annotate
+            identity: The identity ratio threshold
+            circular: Whether the sequence is circular
+            cull: Whether overlapping features are culled
+            gapped: Whether features are aligned with gaps
+            version: The version of the feature database
+
+        Returns:
+            A hex digest of the sequence and settings
+        """
+
+        sha = hashlib.sha1(seq.upper().encode("ascii", "replace"))
+        sha.update(f"|{identity!r}|{circular}|{cull}|{gapped}|{version}".encode())
+        return sha.hexdigest()
+
+    def get(self, key: str) -> Optional[List[SeqFeature]]:
+        """Get the cached features for a key.
+
+        Args:
+            key: The cache key, from `AnnotationCache.key()`
+
+        Returns:
+            A copy of the cached features, None if there aren't any
+        """
+
+        return super().get(key)
+
+    def put(self, key: str, features: List[SeqFeature]):
+        """Cache the features annotated for a key.
+
+        Args:
+            key: The cache key, from `AnnotationCache.key()`
+            features: The features annotate() found
+        """
+
+        super().put(key, features)
@@ -1,19 +1,41 @@
 """Cluster iGEM annotated features with cd-hit to create DNA and protein feature databases."""
 
-from collections import defaultdict
+from collections import defaultdict, deque
+from contextlib import contextmanager
 import functools
+import hashlib
+import multiprocessing
+from multiprocessing.pool import AsyncResult
 import os
 import pickle
 import re
+import shutil
 import subprocess
-from typing import Dict, Optional, List, Tuple, Set
+import sys
+import time
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    Optional,
+    List,
+    Tuple,
+    Set,
+)
 
 from Bio.Alphabet.IUPAC import IUPACUnambiguousDNA
 from Bio.Seq import Seq
 from Bio.SeqFeature import SeqFeature, FeatureLocation
 from Bio.SeqRecord import SeqRecord
 from fuzzywuzzy import fuzz
+from fuzzywuzzy.utils import full_process
+import numpy as np
 
+from .greedy import cluster_fasta
+from .store import PartStore
 from .config import (
     DNA_WORD_SIZE,
     DNA_IDENTITY_THRESHOLD,
@@ -28,10 +50,10 @@ from .config import (
     RED_FLAG_NAMES_INNER,
 )
 
-
 # File names
 IGEM = os.path.join(IGEM_DIR, "igem.2017.xml")
-ID_TO_RECORD = os.path.join(IGEM_DIR, "igem.pickle")
+ID_TO_RECORD = os.path.join(IGEM_DIR, "igem.pickle")  # before the PartStore
+PARTS = os.path.join(IGEM_DIR, "parts.sqlite")
 DNA = os.path.join(IGEM_DIR, "dna.fa")
 DNA_CLSTR = os.path.join(IGEM_DIR, "dna")
 DNA_DB = os.path.join(IGEM_DIR, "dna.db")
@@ -39,92 +61,352 @@ PROTEIN = os.path.join(IGEM_DIR, "protein.fa")
 PROTEIN_CLSTR = os.path.join(IGEM_DIR, "protein")
 PROTEIN_DB = os.path.join(IGEM_DIR, "protein.db")
 
-# Regexes for parsing rows from the iGEM XML dump (SHA1s hinder XML parsing)
-RE_NAME = re.compile(r"<field name=\"part_name\">(\w*)</field>")
-RE_SEQ = re.compile(r"<field name=\"sequence\">(\w*)</field>")
-RE_SHORT_DESC = re.compile(r"<field name=\"short_desc\">(.*)</field>")
-RE_DESC = re.compile(r"<field name=\"description\">(.*)</field>")
-RE_CATS = re.compile(r"<field name=\"categories\">(.*)</field>")
-RE_CACHE = re.compile(r"<field name=\"seq_edit_cache\">(.*)")
-RE_TYPE = re.compile(r"<field name=\"part_type\">(.*)</field>")
-RE_NICKNAME = re.compile(r"<field name=\"nickname\">(.*)</field>")
-RES = [RE_NAME, RE_SEQ, RE_SHORT_DESC, RE_DESC, RE_CATS, RE_CACHE, RE_TYPE, RE_NICKNAME]
+# Regex for parsing rows from the iGEM XML dump (SHA1s hinder XML parsing).
+# Each field is on its own line, and the rest of that line is its value
+RE_FIELD = re.compile(
+    r"<field name=\"(part_name|sequence|short_desc|description|categories"
+    r"|seq_edit_cache|part_type|nickname)\">(.*)"
+)
+RE_WORD_VALUE = re.compile(r"(\w*)</field>")
+FIELDS = [
+    "part_name",
+    "sequence",
+    "short_desc",
+    "description",
+    "categories",
+    "seq_edit_cache",
+    "part_type",
+    "nickname",
+]
+WORD_FIELDS = {"part_name", "sequence"}  # only \w characters
+OPEN_FIELDS = {"seq_edit_cache"}  # the value runs on past the field's line
 RE_FEATURES = re.compile(r"seqFeatures = new Array\((.+?)\)")
 
+# Streaming the iGEM XML dump
+ROW = b"<row>"
+CHUNK_SIZE = 1 << 20  # bytes read from the dump at a time
+RANGE_SIZE = 1 << 24  # bytes of the dump parsed by a worker process at a time
+
+
+NAME_SOURCES = ["short_desc", "description", "nickname"]  # annotations to name with
 
 Cluster = List[SeqRecord]
 Clusters = List[Cluster]
 
 
-def cluster():
+def cluster(processes: Optional[int] = None, quiet: bool = False):
     """Create feature databases.
 
-    - Make a map from iGEM part ID to SeqRecord
+    - Make a store of iGEM parts' SeqRecords, by part ID
         - Gather features out of each SeqRecord's "seq_edit_cache" script
         - Remove all features that are redundant w/ an iGEM part
     - Make a DNA/protein databases from each SeqRecord and feature in /data
     - Cluster the DNA/protein databases with cdhit
     - Gather all DNA/protein clusters above some threshold
     - Find common names for each feature in a cluster using their description
+
+    Keyword Args:
+        processes: The number of worker processes, os.cpu_count() if None
+        quiet: Whether to not report the progress and time of each phase on stderr
     """
 
     # parse the iGEM XML file
-    if all(os.path.exists(f) for f in [DNA, PROTEIN, ID_TO_RECORD]):
-        with open(ID_TO_RECORD, "r+b") as record_file:
-            id_to_record = pickle.load(record_file)
-    else:
-        id_to_record = _parse_igem_data()
-        _write_databases(id_to_record)
-        with open(ID_TO_RECORD, "w+b") as record_file:
-            pickle.dump(id_to_record, record_file)
+    with _phase("parse iGEM parts", quiet) as report:
+        if not _parts_current():
+            _parse_igem_data(processes)
+            for path in [DNA, PROTEIN, DNA_CLSTR, PROTEIN_CLSTR]:  # of old parts
+                for stale in [path, path + ".clstr"]:
+                    if os.path.exists(stale):
+                        os.remove(stale)
+        parts = PartStore(PARTS)
+        report(f"{len(parts)} parts")
+    with _phase("write databases", quiet):
+        if not all(os.path.exists(f) for f in [DNA, PROTEIN]):
+            _write_databases(parts)
 
     # run cd-hit
-    if not os.path.exists(DNA_CLSTR + ".clstr"):
-        _cluster_databases()
+    with _phase("cluster databases", quiet):
+        if not os.path.exists(DNA_CLSTR + ".clstr"):
+            _cluster_databases(processes)
 
     # read in the SeqRecord/SeqFeature clusters
-    dna_clusters, protein_clusters = _parse_clusters(id_to_record)
+    with _phase("parse clusters", quiet) as report:
+        dna_clusters, protein_clusters = _parse_clusters(parts)
+        report(f"{len(dna_clusters)} DNA, {len(protein_clusters)} protein clusters")
 
     # create a consensus SeqRecord for each cluster
-    dna_features, protein_features = _create_features(dna_clusters, protein_clusters)
+    with _phase("create features", quiet) as report:
+        last_report = 0.0
+
+        def progress(count: int, total: int, seconds: float):
+            nonlocal last_report
+            if seconds - last_report >= 1.0:
+                last_report = seconds
+                report(f"{count}/{total} clusters", done=False)
+
+        dna_features, protein_features = _create_features(
+            dna_clusters, protein_clusters, processes, progress=progress
+        )
+        report(f"{len(dna_features)} DNA, {len(protein_features)} protein features")
 
     # store
-    with open(DNA_DB, "w") as dna_db:
-        for feature in dna_features:
-            dna_db.write(_fasta(feature))
-    with open(PROTEIN_DB, "w") as protein_db:
-        for feature in protein_features:
-            protein_db.write(_fasta(feature))
+    with _phase("store features", quiet):
+        with open(DNA_DB, "w") as dna_db:
+            for feature in dna_features:
+                dna_db.write(_fasta(feature))
+        with open(PROTEIN_DB, "w") as protein_db:
+            for feature in protein_features:
+                protein_db.write(_fasta(feature))
 
 
-def _parse_igem_data() -> Dict[str, SeqRecord]:
-    """Parse the iGEM XML into a Dict with part_id -> SeqRecord.
+@contextmanager
+def _phase(name: str, quiet: bool = False) -> Iterator[Callable[..., None]]:
+    """Time a phase of cluster(), reporting it on stderr.
+
+    Yields a function that reports the phase's progress, ex "12 parts", and
+    keeps the last as a summary for when the phase is done.
 
     Args:
-        test: Is a test, truncate the number of rows
+        name: The name of the phase, ex "parse clusters"
+
+    Keyword Args:
+        quiet: Whether to not report anything
+    """
+
+    start = time.perf_counter()
+    summary = ""
+
+    def report(detail: str, done: bool = True):
+        nonlocal summary
+        if done:
+            summary = detail
+        elif not quiet:
+            seconds = time.perf_counter() - start
+            print(f"{name}: {detail} in {seconds:.1f}s", file=sys.stderr)
+
+    yield report
+
+    if not quiet:
+        seconds = time.perf_counter() - start
+        print(
+            f"{name}: {summary + ' ' if summary else ''}in {seconds:.1f}s",
+            file=sys.stderr,
+        )
+
+
+def _parts_current() -> bool:
+    """Whether PARTS was parsed from the iGEM XML as it is now.
+
+    A PartStore without the XML to compare it to is taken to be current.
+    """
+
+    if not os.path.exists(PARTS):
+        return False
+    if not os.path.exists(IGEM):
+        return True
+
+    parts = PartStore(PARTS)
+    source = parts.source
+    parts.close()
+    return source == _digest(IGEM)
+
+
+def _digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Create a hex digest of a file's contents, a chunk at a time."""
+
+    sha = hashlib.sha1()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _parse_igem_data(processes: Optional[int] = 1) -> PartStore:
+    """Parse the iGEM XML into a PartStore of SeqRecords by part_id.
+
+    Parts are written to a temporary store that replaces PARTS once complete,
+    so an interrupted parse isn't mistaken for a finished one. The store
+    keeps a digest of the XML to know when it's stale. If there's an
+    igem.pickle from an earlier run that's newer than the XML, its parts are
+    stored rather than parsing the XML again.
+
+    Keyword Args:
+        processes: The number of worker processes, os.cpu_count() if None
 
     Returns:
-        A map from each part's ID to a SeqRecord representing it.
+        A PartStore of each part's SeqRecord
     """
 
-    id_to_record: Dict[str, SeqRecord] = {}
-    with open(IGEM, "r") as data:
-        for row in data.read().split("<row>"):
+    records: Iterable[SeqRecord]
+    pickled = os.path.exists(ID_TO_RECORD)
+    if pickled and os.path.getmtime(ID_TO_RECORD) >= os.path.getmtime(IGEM):
+        with open(ID_TO_RECORD, "r+b") as record_file:
+            records = pickle.load(record_file).values()
+    else:
+        records = _iter_igem_records(IGEM, processes=processes)
+
+    tmp = PARTS + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    parts = PartStore(tmp)
+    parts.add(records)
+    assert "BBa_J23104" in parts
+    parts.source = _digest(IGEM)
+    parts.close()
+    os.replace(tmp, PARTS)
+
+    return PartStore(PARTS)
+
+
+def _iter_igem_records(
+    path: str,
+    processes: Optional[int] = 1,
+    chunk_size: int = CHUNK_SIZE,
+    range_size: int = RANGE_SIZE,
+) -> Iterator[SeqRecord]:
+    """Stream the SeqRecords of the parts in an iGEM XML dump.
+
+    The dump is read `chunk_size` bytes at a time, so memory is bounded by
+    the chunk and the longest row rather than the size of the dump. With
+    many processes, the dump is split into byte ranges of about `range_size`
+    bytes that start at rows, and those are parsed in parallel. Records are
+    yielded in the dump's order either way.
+
+    Args:
+        path: The path to the iGEM XML dump
+
+    Keyword Args:
+        processes: The number of worker processes, os.cpu_count() if None
+        chunk_size: The number of bytes to read at a time
+        range_size: The number of bytes in each worker's range
+
+    Returns:
+        An iterator over the SeqRecords of each parsed part
+    """
+
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for row in _iter_rows(path, chunk_size=chunk_size):
             record = _parse_row(row)
             if record:
-                id_to_record[record.id] = record
+                yield record
+        return
+
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+    with context.Pool(processes) as pool:
+        pending: Deque[AsyncResult] = deque()
+        for start, end in _byte_ranges(path, range_size):
+            pending.append(
+                pool.apply_async(_parse_range, (path, start, end, chunk_size))
+            )
+            if len(pending) >= 2 * processes:
+                yield from pending.popleft().get()
+
+        while pending:
+            yield from pending.popleft().get()
 
-    assert "BBa_J23104" in id_to_record
 
-    return id_to_record
+def _parse_range(path: str, start: int, end: int, chunk_size: int) -> List[SeqRecord]:
+    """Parse the rows in a byte range of the iGEM XML dump.
+
+    Args:
+        path: The path to the iGEM XML dump
+        start: The offset of the first byte in the range
+        end: The offset after the range's last byte, -1 for the end of the file
+        chunk_size: The number of bytes to read at a time
+
+    Returns:
+        The SeqRecords of the parts in the range
+    """
+
+    records: List[SeqRecord] = []
+    for row in _iter_rows(path, start, end, chunk_size):
+        record = _parse_row(row)
+        if record:
+            records.append(record)
+    return records
+
+
+def _iter_rows(
+    path: str, start: int = 0, end: int = -1, chunk_size: int = CHUNK_SIZE
+) -> Iterator[str]:
+    """Split a byte range of the iGEM XML dump on "<row>", a chunk at a time.
+
+    Args:
+        path: The path to the iGEM XML dump
+
+    Keyword Args:
+        start: The offset of the first byte in the range
+        end: The offset after the range's last byte, -1 for the end of the file
+        chunk_size: The number of bytes to read at a time
+
+    Returns:
+        An iterator over the text between each "<row>" in the range
+    """
+
+    with open(path, "rb") as data:
+        data.seek(start)
+        remaining = end - start if end >= 0 else -1
+        rest = b""
+        while remaining:
+            chunk = data.read(
+                chunk_size if remaining < 0 else min(chunk_size, remaining)
+            )
+            if not chunk:
+                break
+            if remaining > 0:
+                remaining -= len(chunk)
+
+            rows = (rest + chunk).split(ROW)
+            rest = rows.pop()  # may be cut short by the end of the chunk
+            for row in rows:
+                yield row.decode(errors="replace")
+        yield rest.decode(errors="replace")
+
+
+def _byte_ranges(path: str, range_size: int) -> List[Tuple[int, int]]:
+    """Split the iGEM XML dump into byte ranges that each start at a row.
+
+    Args:
+        path: The path to the iGEM XML dump
+        range_size: The approximate number of bytes in each range
+
+    Returns:
+        The start and end offset of each range, covering the whole file
+    """
+
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, "rb") as data:
+        for offset in range(range_size, size, range_size):
+            if offset <= starts[-1]:
+                continue  # a row longer than range_size
+
+            # find the next row start, which may straddle chunks
+            data.seek(offset)
+            found = -1
+            while found < 0:
+                chunk = data.read(CHUNK_SIZE + len(ROW) - 1)
+                if len(chunk) < len(ROW):
+                    break
+                found = chunk.find(ROW)
+                if found < 0:
+                    offset += len(chunk) - len(ROW) + 1
+                    data.seek(offset)
+            if found < 0:
+                break
+            starts.append(offset + found)
+
+    return list(zip(starts, starts[1:] + [size]))
 
 
 def _parse_row(row: str) -> Optional[SeqRecord]:
     """Parse a single row of the iGEM XML into a SeqRecord.
 
     I'm using the regex package here because there are characters
-    in the XML's sha1 that throw the XML parsers that I tried. I know
-    that this regex is slow...
+    in the XML's sha1 that throw the XML parsers that I tried. One
+    regex finds every field we want in a single pass over the row.
 
     Args:
         row: A single 'row' element in the XML
@@ -133,13 +415,23 @@ def _parse_row(row: str) -> Optional[SeqRecord]:
         A SeqRecord with the part id, sequence, and description stored
     """
 
-    def match(regex):
-        row_match = regex.search(row)
-        if row_match:
-            return row_match[1]
-        return ""
+    values: Dict[str, str] = {}
+    for field_match in RE_FIELD.finditer(row):
+        field, value = field_match.groups()
+        if field in values:
+            continue  # the first of each field
+        if field in WORD_FIELDS:
+            word_match = RE_WORD_VALUE.match(value)
+            if not word_match:
+                continue
+            value = word_match[1]
+        elif field not in OPEN_FIELDS:
+            if "</field>" not in value:
+                continue
+            value = value[: value.rindex("</field>")]
+        values[field] = value
 
-    matches = [match(r) for r in RES]
+    matches = [values.get(field, "") for field in FIELDS]
     name, seq, desc_short, desc_long, cats, cache, ftype, nickname = matches
 
     if not seq or len(seq) > 10_000:
@@ -200,7 +492,7 @@ def _parse_row(row: str) -> Optional[SeqRecord]:
 
 def _get_type(name: str, ftype: str):
     """Get the feature type from its name and type
-    
+
     Args:
         name: Feature's name
         ftype: Feature's type
@@ -231,23 +523,17 @@ def _get_type(name: str, ftype: str):
     return ftype
 
 
-def _write_databases(id_to_record: Dict[str, SeqRecord]):
+def _write_databases(parts: PartStore):
     """Create the DNA and protein databases for each SeqRecord.
 
-    Write both databases to a tmp directory, return paths
-
     Args:
-        id_to_record: Dictionary from iGEM part ID to SeqRecord
-
-    Returns:
-        A tuple with two file names. The first is for the DNA database
-        and the second is for the translated protein database
+        parts: The store of iGEM parts' SeqRecords
     """
 
-    records = {r for r in id_to_record.keys()}
+    records = set(parts.ids())
 
     with open(DNA, "w") as dna_file, open(PROTEIN, "w") as protein_file:
-        for record in id_to_record.values():
+        for record in parts:
             dna_file.write(f">{record.id}\n{str(record.seq)}\n")
             if _is_cds(record):
                 protein_file.write(f">{record.id}\n{_translate(record.seq)}\n")
@@ -310,17 +596,38 @@ def _translate(seq: Seq) -> str:
     return str(aas)
 
 
-def _cluster_databases():
-    """Run mmseqs on the DNA and protein databases
+def _cluster_databases(processes: Optional[int] = None):
+    """Run cd-hit on the DNA and protein databases
 
-    Args:
-        dna_file: The name of the DNA file
-        protein_file: The name of the protein file
+    If cd-hit isn't installed, cluster them in-process with the same
+    thresholds instead (see synbio.features.greedy), writing the same files.
 
-    Returns:
-        The name of the DNA and protein cluster file
+    Keyword Args:
+        processes: The number of worker processes when clustering in-process,
+            os.cpu_count() if None
     """
 
+    if not (shutil.which("cd-hit-est") and shutil.which("cd-hit")):
+        cluster_fasta(
+            DNA,
+            DNA_CLSTR,
+            DNA_IDENTITY_THRESHOLD,
+            DNA_WORD_SIZE,
+            DNA_LENGTH_DISTANCE_CUTOFF,
+            best=True,  # -g 1
+            processes=processes,
+        )
+        cluster_fasta(
+            PROTEIN,
+            PROTEIN_CLSTR,
+            PROTEIN_IDENTITY_THRESHOLD,
+            PROTEIN_WORD_SIZE,
+            PROTEIN_LENGTH_DISTANCE_CUTOFF,
+            protein=True,
+            processes=processes,
+        )
+        return
+
     # see: https://github.com/weizhongli/cdhit/wiki/3.-User's-Guide#Hierarchically_clustering
     subprocess.call(
         [
@@ -369,7 +676,7 @@ def _cluster_databases():
     )
 
 
-def _parse_clusters(id_to_record: Dict[str, SeqRecord]) -> Tuple[Clusters, Clusters]:
+def _parse_clusters(parts: PartStore) -> Tuple[Clusters, Clusters]:
     """Parse clusters to gather reference seq and other meta
 
     - Filter clusters to those with at least $CLUSTER_SIZE_THRESHOLD members
@@ -392,7 +699,7 @@ def _parse_clusters(id_to_record: Dict[str, SeqRecord]) -> Tuple[Clusters, Clust
     the reference sequence that's refered to in elsewhere
 
     Args:
-        id_to_record: A dictionary from SeqRecord's id to the SeqRecord
+        parts: The store of iGEM parts' SeqRecords, by part ID
 
     Returns:
         Two lists of clusters. The first list is for DNA, the second is for protein
@@ -419,12 +726,12 @@ def _parse_clusters(id_to_record: Dict[str, SeqRecord]) -> Tuple[Clusters, Clust
                         rid, fid = rid.split(".")
                         findex = int(fid)  # index of feature on record
 
-                    record = id_to_record[rid]
+                    record = parts.get(rid)
                     member = record.upper()  # copy member here
 
                     if findex > -1:
                         # turn the feature into a SeqRecord
-                        feature = record.features[findex]
+                        feature = parts.feature(rid, findex)
                         member = SeqRecord(
                             feature.extract(record.seq),
                             id=feature.id,
@@ -454,7 +761,10 @@ def _parse_clusters(id_to_record: Dict[str, SeqRecord]) -> Tuple[Clusters, Clust
 
 
 def _create_features(
-    dna_clusters: Clusters, protein_clusters: Clusters
+    dna_clusters: Clusters,
+    protein_clusters: Clusters,
+    processes: Optional[int] = None,
+    progress: Optional[Callable[[int, int, float], None]] = None,
 ) -> Tuple[List[SeqRecord], List[SeqRecord]]:
     """Create the lists of consensus DNA and protein features
 
@@ -466,12 +776,20 @@ def _create_features(
         dna_clusters: The list of DNA clusters
         protein_clusters: The list of protein clusters
 
+    Keyword Args:
+        processes: The number of worker processes, os.cpu_count() if None
+        progress: Called as clusters are done with the number done, the
+            number of clusters, and the seconds elapsed
+
     Returns:
         Two lists. One of DNA features and one of protein features
     """
 
-    dna_features = [_consensus_record(c) for c in dna_clusters]
-    protein_features = [_consensus_record(c) for c in protein_clusters]
+    features = _consensus_records(
+        dna_clusters + protein_clusters, processes, progress=progress
+    )
+    dna_features = features[: len(dna_clusters)]
+    protein_features = features[len(dna_clusters) :]
 
     dna_features = [f for f in dna_features if f]
     protein_features = [f for f in protein_features if f]
@@ -479,6 +797,64 @@ def _create_features(
     return dna_features, protein_features
 
 
+def _consensus_records(
+    clusters: Clusters,
+    processes: Optional[int] = 1,
+    progress: Optional[Callable[[int, int, float], None]] = None,
+) -> List[Optional[SeqRecord]]:
+    """Create the consensus SeqRecord of each cluster over a pool of processes.
+
+    Only what _consensus_record() reads of each member is sent to the
+    workers: IDs, annotations, dbxrefs, and the first member's sequence.
+
+    Args:
+        clusters: The clusters to create consensus SeqRecords for
+
+    Keyword Args:
+        processes: The number of worker processes, os.cpu_count() if None
+        progress: Called as clusters are done with the number done, the
+            number of clusters, and the seconds elapsed
+
+    Returns:
+        The consensus SeqRecord of each cluster, in order, None if filtered out
+    """
+
+    start = time.perf_counter()
+    processes = processes or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(clusters) // (4 * processes)))
+
+    def collect(results: Iterable[Optional[SeqRecord]]) -> List[Optional[SeqRecord]]:
+        records: List[Optional[SeqRecord]] = []
+        for record in results:
+            records.append(record)
+            if progress and (
+                len(records) % chunksize == 0 or len(records) == len(clusters)
+            ):
+                progress(len(records), len(clusters), time.perf_counter() - start)
+        return records
+
+    if processes == 1 or len(clusters) < 2:
+        return collect(_consensus_record(c) for c in clusters)
+
+    sources = [
+        [
+            SeqRecord(
+                r.seq if i == 0 else Seq(""),
+                id=r.id,
+                dbxrefs=r.dbxrefs,
+                annotations=r.annotations,
+            )
+            for i, r in enumerate(c)
+        ]
+        for c in clusters
+    ]
+
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in start_methods else None)
+    with context.Pool(processes) as pool:
+        return collect(pool.imap(_consensus_record, sources, chunksize=chunksize))
+
+
 def _consensus_record(records: Cluster) -> Optional[SeqRecord]:
     """Deduplicate a list of clustered SeqRecords into a single "consensus" SeqRecord
 
@@ -551,8 +927,8 @@ def _consensus_name(records: Cluster) -> str:
 
     1. If there is a consensus nickname, use that
     2. Otherwise, gather all short_desc, description and nicknames,
-        take the 6 shortest and use the one with the smallest
-        token set ratio distance from the others
+        and use the one with the smallest token set ratio distance
+        from the others
 
     Args:
         records: The Records whose feature we want a consensus name for
@@ -569,7 +945,7 @@ def _consensus_name(records: Cluster) -> str:
     entries: List[str] = []
     for record in records:
         entries.append(record.id)
-        for src in ["short_desc", "description", "nickname"]:
+        for src in NAME_SOURCES:
             if src in record.annotations and record.annotations[src].strip():
                 entries.append(record.annotations[src])
 
@@ -587,35 +963,13 @@ def _consensus_name(records: Cluster) -> str:
         if not entries:
             return records[0].id.strip()  # give up, all empty, keep consensus id
 
-    # heuristic so this doesn't take ages
-    entry_max_count = 10
-    if len(entries) > entry_max_count:
-        # try to filter to just those under at or under a small number of words
-        entries_short = [e for e in entries if len(e.split()) <= 5]
-        if entries_short:
-            entries = entries_short
-        else:
-            entries = sorted(entries, key=len)
-            entries = entries[:entry_max_count]
-    entries = sorted(entries)  # for functools.lru
-
-    set_ratio_matrix: List[List[float]] = []
-    for _ in range(len(entries)):
-        set_ratio_matrix.append([100.0] * len(entries))
-
-    # calc token set ratio of each pairing
-    for i, entry in enumerate(entries):
-        for j in range(i + 1, len(entries)):
-            other = entries[j]
-            set_ratio = _token_set_ratio(entry, other)
-            set_ratio_matrix[i][j] = set_ratio
-            set_ratio_matrix[j][i] = set_ratio
+    entries = sorted(entries)
+    row_sums = _token_set_sums(entries)
 
     # find the row with the max summed set ratio
     max_row = 0
-    max_sum = sum(set_ratio_matrix[0])
-    for i, row in enumerate(set_ratio_matrix):
-        row_sum = sum(row)
+    max_sum = row_sums[0]
+    for i, row_sum in enumerate(row_sums):
         if row_sum > max_sum or (
             row_sum == max_sum and len(entries[i]) < len(entries[max_row])
         ):
@@ -652,11 +1006,70 @@ def _consensus_attribute(records: Cluster, field: str, threshold=2) -> str:
     return ""
 
 
+def _token_set_sums(entries: List[str]) -> List[float]:
+    """Sum each entry's token set ratios with the others, plus 100 for itself.
+
+    The same as summing fuzz.token_set_ratio(first, second) over each pair of
+    entries, with the first entry in sorted order first, but each distinct
+    entry is tokenized once and pairs of token sets are scored once.
+
+    Args:
+        entries: The sorted possible names of a feature
+
+    Returns:
+        The summed token set ratios of each entry
+    """
+
+    counts: Dict[str, int] = defaultdict(int)
+    for entry in entries:
+        counts[entry] += 1
+    distinct = list(counts)
+    tokens = [frozenset(full_process(e, force_ascii=True).split()) for e in distinct]
+    copies = np.array([counts[e] for e in distinct], dtype=np.float64)
+
+    # an entry scores 100 with its copies, 0 if it has no tokens
+    sums = 100.0 + (copies - 1) * np.array([100.0 if t else 0.0 for t in tokens])
+    for i, first in enumerate(tokens):
+        for j in range(i + 1, len(tokens)):
+            ratio = _token_set_ratio(first, tokens[j])
+            sums[i] += copies[j] * ratio
+            sums[j] += copies[i] * ratio
+
+    entry_sums = dict(zip(distinct, sums.tolist()))
+    return [entry_sums[e] for e in entries]
+
+
 @functools.lru_cache(maxsize=32768)
-def _token_set_ratio(str1: str, str2: str) -> float:
-    """Get the token set ratio. Memoize results."""
+def _token_set_ratio(first: FrozenSet[str], second: FrozenSet[str]) -> int:
+    """fuzz.token_set_ratio() of two entries, from their tokens. Memoize results.
+
+    fuzz.token_set_ratio() takes the max ratio between the sorted tokens the
+    entries share and each entry's sorted tokens, with the shared ones first,
+    and between the two entries' sorted tokens. The shared tokens are a
+    prefix of the others, so only the last ratio needs comparing strings.
+    """
+
+    if not first or not second:
+        return 0
+    if first <= second or second <= first:
+        return 100  # the shared tokens are one of the entries'
+
+    shared = " ".join(sorted(first & second))
+    first_joined = (shared + " " + " ".join(sorted(first - second))).strip()
+    second_joined = (shared + " " + " ".join(sorted(second - first))).strip()
+    return max(
+        _prefix_ratio(shared, first_joined),
+        _prefix_ratio(shared, second_joined),
+        fuzz.ratio(first_joined, second_joined),
+    )
+
+
+def _prefix_ratio(prefix: str, string: str) -> int:
+    """fuzz.ratio() of a string and its prefix, all of which matches."""
 
-    return fuzz.token_set_ratio(str1, str2)
+    if not prefix or len(string) >= 200:
+        return fuzz.ratio(prefix, string)  # SequenceMatcher's autojunk
+    return int(round(100 * (2.0 * len(prefix) / (len(prefix) + len(string)))))
 
 
 def _fasta(record: SeqRecord) -> str:
@@ -9,17 +9,22 @@ IGEM_DIR = path.join(FEATURE_DIR, "igem")
 DNA_DB = path.join(FEATURE_DIR, "dna.db")
 DNA_ID_MAP_PICKLE = path.join(FEATURE_DIR, "dna.id.pickle")
 DNA_KMER_MAP_PICKLE = path.join(FEATURE_DIR, "dna.kmermap.pickle")
+DNA_INDEX = path.join(FEATURE_DIR, "dna.index")
 PROTEIN_DB = path.join(FEATURE_DIR, "protein.db")
 PROTEIN_ID_MAP_PICKLE = path.join(FEATURE_DIR, "protein.id.pickle")
 PROTEIN_KMER_MAP_PICKLE = path.join(FEATURE_DIR, "protein.kmermap.pickle")
+PROTEIN_INDEX = path.join(FEATURE_DIR, "protein.index")
 
 # Parameters
 DNA_WORD_SIZE = 11
+DNA_SEED_PATTERN = ""  # spaced seed of DNA kmers, ex "111010010100110111"
+DNA_MINIMIZER_WINDOW = 1  # index one DNA kmer (minimizer) per window of kmers
 DNA_IDENTITY_THRESHOLD = 0.95  # -c from cd-hit
 DNA_LENGTH_DISTANCE_CUTOFF = 0.9  # -s from cd-hit
 PROTEIN_WORD_SIZE = 5
 PROTEIN_IDENTITY_THRESHOLD = 0.9
 PROTEIN_LENGTH_DISTANCE_CUTOFF = 0.85  # -s from cd-hit
+UPDATES_BEFORE_COMPACTION = 8  # feature index updates before they're compacted
 CLUSTER_SIZE_THRESHOLD = 3  # min number of cluster members to become feature
 CLUSTER_SOURCES_CUTOFF = 2  # min number of part source to become a feature
 RED_FLAG_NAMES = ["ori", "cds"]
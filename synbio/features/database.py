@@ -0,0 +1,247 @@
+"""A lazily loaded feature database for annotation."""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from Bio.SeqRecord import SeqRecord
+
+from .config import (
+    DNA_ID_MAP_PICKLE,
+    DNA_INDEX,
+    DNA_KMER_MAP_PICKLE,
+    DNA_MINIMIZER_WINDOW,
+    DNA_SEED_PATTERN,
+    DNA_WORD_SIZE,
+    PROTEIN_ID_MAP_PICKLE,
+    PROTEIN_INDEX,
+    PROTEIN_KMER_MAP_PICKLE,
+    PROTEIN_WORD_SIZE,
+)
+from .index import DNA_ALPHABET, PROTEIN_ALPHABET, KmerIndex, load_kmer_map
+
+Maps = Tuple[Optional[KmerIndex], Dict[str, SeqRecord]]
+
+
+class FeatureDatabase:
+    """The DNA and protein kmer maps and features used during annotation.
+
+    Nothing is read from disk until the first call to annotate() (or
+    to `preload()`) so importing synbio.features is cheap. Loading is
+    thread-safe and happens once; `release()` drops the maps so the next
+    access loads them again.
+
+    Private feature libraries are FeatureDatabases too, see `from_directory()`,
+    and can be passed to annotate() along with the bundled database.
+
+    Keyword Args:
+        dna_index: Directory of the DNA KmerIndex
+        protein_index: Directory of the protein KmerIndex
+        dna_kmer_map_pickle: Legacy pickled DNA kmer map, used if there's no index
+        dna_id_map_pickle: Pickled DNA id map, indexed in memory if there's
+            no index
+        protein_kmer_map_pickle: Legacy pickled protein kmer map
+        protein_id_map_pickle: Pickled protein id map, indexed in memory if
+            there's no index
+
+    Attributes:
+        load_time: Seconds spent loading the maps, None if they aren't loaded
+    """
+
+    def __init__(
+        self,
+        dna_index: str = DNA_INDEX,
+        protein_index: str = PROTEIN_INDEX,
+        dna_kmer_map_pickle: str = DNA_KMER_MAP_PICKLE,
+        dna_id_map_pickle: str = DNA_ID_MAP_PICKLE,
+        protein_kmer_map_pickle: str = PROTEIN_KMER_MAP_PICKLE,
+        protein_id_map_pickle: str = PROTEIN_ID_MAP_PICKLE,
+    ):
+        self.dna_paths = (dna_index, dna_kmer_map_pickle, dna_id_map_pickle)
+        self.protein_paths = (
+            protein_index,
+            protein_kmer_map_pickle,
+            protein_id_map_pickle,
+        )
+        self.load_time: Optional[float] = None
+
+        self._dna: Optional[Maps] = None
+        self._protein: Optional[Maps] = None
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, directory: str) -> "FeatureDatabase":
+        """Create a FeatureDatabase over the indexes in a directory.
+
+        The directory is one seeded with `synbio.features.seed.seed(directory)`,
+        or its indexes' directories are `add_features()`'s index_dir.
+
+        Args:
+            directory: The directory with the DNA and protein indexes
+
+        Returns:
+            A FeatureDatabase of the directory's features, not yet loaded
+        """
+
+        def path(bundled: str) -> str:
+            return os.path.join(directory, os.path.basename(bundled))
+
+        return cls(
+            dna_index=path(DNA_INDEX),
+            protein_index=path(PROTEIN_INDEX),
+            dna_kmer_map_pickle=path(DNA_KMER_MAP_PICKLE),
+            dna_id_map_pickle=path(DNA_ID_MAP_PICKLE),
+            protein_kmer_map_pickle=path(PROTEIN_KMER_MAP_PICKLE),
+            protein_id_map_pickle=path(PROTEIN_ID_MAP_PICKLE),
+        )
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the DNA and protein maps are loaded."""
+
+        return self._dna is not None and self._protein is not None
+
+    @property
+    def dna(self) -> Maps:
+        """The DNA kmer map and map from feature ID to feature (SeqRecord)."""
+
+        maps = self._dna
+        if maps is None:
+            self.preload()
+            maps = self._dna
+        return maps
+
+    @property
+    def protein(self) -> Maps:
+        """The protein kmer map and map from feature ID to feature (SeqRecord)."""
+
+        maps = self._protein
+        if maps is None:
+            self.preload()
+            maps = self._protein
+        return maps
+
+    @property
+    def version(self) -> str:
+        """A hash of the DNA and protein features. It changes when they change."""
+
+        version = self._version
+        if version is None:
+            self.preload()
+            version = self._version
+        return version
+
+    def preload(self) -> "FeatureDatabase":
+        """Load the DNA and protein maps now rather than on first use.
+
+        Returns:
+            This FeatureDatabase, loaded
+        """
+
+        with self._lock:
+            if not self.loaded:
+                start = time.perf_counter()
+                self._dna = _load(
+                    *self.dna_paths,
+                    DNA_ALPHABET,
+                    len(DNA_SEED_PATTERN) or DNA_WORD_SIZE,
+                    pattern=DNA_SEED_PATTERN,
+                    window=DNA_MINIMIZER_WINDOW,
+                )
+                self._protein = _load(
+                    *self.protein_paths, PROTEIN_ALPHABET, PROTEIN_WORD_SIZE
+                )
+                self._version = _version(self._dna[0], self._protein[0])
+                self.load_time = time.perf_counter() - start
+        return self
+
+    def release(self):
+        """Drop the loaded maps. They're loaded again on next use."""
+
+        with self._lock:
+            self._dna = None
+            self._protein = None
+            self._version = None
+            self.load_time = None
+
+    def __getstate__(self) -> dict:
+        # sent to worker processes without the maps, which are loaded there
+        state = self.__dict__.copy()
+        state["_dna"] = None
+        state["_protein"] = None
+        state["_version"] = None
+        state["load_time"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+def _load(
+    index_dir: str,
+    kmer_map_pickle: str,
+    id_map_pickle: str,
+    alphabet: str,
+    word_size: int,
+    pattern: str = "",
+    window: int = 1,
+) -> Maps:
+    """Open a feature database's KmerIndex, or build one from its pickled maps.
+
+    The KmerIndex is memory-mapped and holds the features themselves, so the
+    id map pickle is only read when there's no index. Then a legacy pickled
+    kmer map is converted to an (in-memory) KmerIndex or, without one, the
+    id map's features are indexed in memory. That's the case for installed
+    packages, which only ship the id map pickles: `seed()` saves the indexes.
+
+    Args:
+        index_dir: Directory of the KmerIndex
+        kmer_map_pickle: Legacy pickled kmer map
+        id_map_pickle: Pickled map from feature ID to feature
+        alphabet: The alphabet of the features' sequences
+        word_size: The length of each kmer, if the features are indexed
+
+    Keyword Args:
+        pattern: The spaced seed of the kmers, if the features are indexed
+        window: The minimizer window of the kmers, if the features are indexed
+
+    Returns:
+        The KmerIndex (None if there isn't one) and the map from ID to feature
+    """
+
+    kmer_map = load_kmer_map(index_dir, kmer_map_pickle)
+    if isinstance(kmer_map, KmerIndex):
+        return kmer_map, kmer_map.id_map()
+
+    if not os.path.isfile(id_map_pickle):
+        if kmer_map is None:
+            return None, {}
+        return KmerIndex.from_kmer_map(kmer_map, {}, alphabet), {}
+
+    with open(id_map_pickle, "rb") as id_map_file:
+        id_map: Dict[str, SeqRecord] = pickle.load(id_map_file)
+    if kmer_map is None:
+        index = KmerIndex.build(
+            id_map, word_size, alphabet, processes=1, pattern=pattern, window=window
+        )
+        return index, id_map
+    return KmerIndex.from_kmer_map(kmer_map, id_map, alphabet), id_map
+
+
+def _version(*indexes: Optional[KmerIndex]) -> str:
+    """Hash the digests of a database's indexes, skipping missing ones."""
+
+    sha = hashlib.sha1()
+    for index in indexes:
+        sha.update((index.digest() if index is not None else "").encode())
+    return sha.hexdigest()
+
+
+FEATURE_DATABASE = FeatureDatabase()
+"""The bundled feature database of SnapGene and iGEM features."""
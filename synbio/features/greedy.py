@@ -0,0 +1,330 @@
+"""Greedy incremental clustering of sequences, a fallback for cd-hit.
+
+Clusters a FASTA file the way cd-hit and cd-hit-est do, for build machines
+without them, and writes the same representative FASTA and .clstr files.
+Sequences are taken longest first. Each joins the cluster of a representative
+it's similar enough to, or becomes the representative of a new cluster:
+
+- Only representatives sharing enough kmers with a sequence are compared
+  with it. Each edit removes at most word_size kmers, so a sequence with
+  max edits e shares at least its kmer count - word_size * e of them
+- A sequence's length is at least `length_cutoff` of its representative's (-s)
+- A sequence's identity is the share of its length left after the fewest
+  edits to align all of it within the representative (-c). DNA is aligned
+  on both strands. Unlike cd-hit, bp missing from the sequence count
+  against it too, so identities are at most a gap or two lower
+
+Sequences are compared with the representatives of earlier batches over a
+pool of processes, then in order with those of their own batch, so the
+clusters are the same however many processes there are.
+"""
+
+from collections import defaultdict
+from itertools import chain
+import math
+import multiprocessing
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from Bio import SeqIO
+
+from .index import DNA_ALPHABET, PROTEIN_ALPHABET, kmer_codes
+
+BATCH_SIZE = 1024
+"""The number of sequences compared with earlier representatives at a time."""
+
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+Match = Tuple[int, float, str]
+"""A representative's index, the identity with it, and the strand matched on."""
+
+
+class Clusterer:
+    """Greedily cluster sequences by identity, see the module docstring.
+
+    Args:
+        seqs: The sequences to cluster
+        identity: The identity threshold of cluster members (-c)
+        word_size: The length of kmers used to filter representatives (-n)
+        length_cutoff: The shortest a member can be, relative to its
+            representative (-s)
+
+    Keyword Args:
+        protein: Whether the sequences are protein, otherwise DNA
+        best: Join the most similar representative, not the first (-g 1)
+
+    Attributes:
+        reps: The index of each representative's sequence, in the order
+            their clusters were created
+        matches: Each sequence's match, its representative's index in `reps`
+    """
+
+    def __init__(
+        self,
+        seqs: Sequence[str],
+        identity: float,
+        word_size: int,
+        length_cutoff: float,
+        protein: bool = False,
+        best: bool = False,
+    ):
+        self.seqs = [seq.upper() for seq in seqs]
+        self.identity = identity
+        self.word_size = word_size
+        self.length_cutoff = length_cutoff
+        self.protein = protein
+        self.best = best
+
+        self.reps: List[int] = []
+        self.matches: List[Optional[Match]] = [None] * len(seqs)
+
+        self._alphabet = PROTEIN_ALPHABET if protein else DNA_ALPHABET
+        self._kmers: Dict[int, List[int]] = defaultdict(list)
+
+    def cluster(self, processes: Optional[int] = 1) -> "Clusterer":
+        """Cluster the sequences, longest first.
+
+        Keyword Args:
+            processes: The number of worker processes, os.cpu_count() if None
+
+        Returns:
+            This Clusterer, with its reps and matches set
+        """
+
+        processes = processes or os.cpu_count() or 1
+        order = sorted(range(len(self.seqs)), key=lambda i: (-len(self.seqs[i]), i))
+
+        for start in range(0, len(order), BATCH_SIZE):
+            batch = order[start : start + BATCH_SIZE]
+            earlier = len(self.reps)
+
+            # compare with the representatives of earlier batches
+            if processes == 1 or not earlier:
+                matches = [self.match(i, 0, earlier) for i in batch]
+            else:
+                start_methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context(
+                    "fork" if "fork" in start_methods else None
+                )
+                with context.Pool(
+                    processes, initializer=_set_clusterer, initargs=(self,)
+                ) as pool:
+                    matches = pool.starmap(
+                        _match, [(i, earlier) for i in batch], chunksize=16
+                    )
+
+            # then in order with the representatives of this batch
+            for i, match in zip(batch, matches):
+                if match is None or self.best:
+                    later = self.match(i, earlier, len(self.reps))
+                    if later is not None and (match is None or later[1] > match[1]):
+                        match = later
+
+                if match is None:
+                    match = (len(self.reps), 1.0, "+")
+                    self._add_rep(i)
+                self.matches[i] = match
+
+        return self
+
+    def match(self, index: int, first: int, last: int) -> Optional[Match]:
+        """Find a sequence's match among some of the representatives.
+
+        Args:
+            index: The index of the sequence
+            first: The index (in reps) of the first representative to compare
+            last: The index (in reps) after the last representative to compare
+
+        Returns:
+            The first (or best) match, None if there isn't one
+        """
+
+        if first >= last:
+            return None
+
+        seq = self.seqs[index]
+        max_edits = math.floor((1 - self.identity) * len(seq) + 1e-9)
+        strands = [("+", seq)]
+        if not self.protein:
+            strands.append(("-", seq.translate(COMPLEMENT)[::-1]))
+
+        candidates: Dict[int, List[Tuple[str, str]]] = defaultdict(list)
+        for strand, strand_seq in strands:
+            for rep in self._candidates(strand_seq, max_edits, first, last):
+                candidates[rep].append((strand, strand_seq))
+
+        match: Optional[Match] = None
+        for rep in sorted(candidates):
+            rep_seq = self.seqs[self.reps[rep]]
+            for strand, strand_seq in candidates[rep]:
+                if strand_seq in rep_seq:
+                    edits = 0
+                else:
+                    edits = edit_distance(strand_seq, rep_seq)
+                if edits > max_edits:
+                    continue
+
+                identity = (len(seq) - edits) / len(seq)
+                if match is None or identity > match[1]:
+                    match = (rep, identity, strand)
+                if not self.best or edits == 0:
+                    return match
+        return match
+
+    def _candidates(self, seq: str, max_edits: int, first: int, last: int) -> List[int]:
+        """Find the representatives sharing enough kmers and length with a sequence."""
+
+        codes, valid = kmer_codes(seq, self.word_size, self._alphabet)
+        codes = np.unique(codes[valid]).tolist()
+        postings = np.fromiter(
+            chain.from_iterable(self._kmers[c] for c in codes if c in self._kmers),
+            dtype=np.int64,
+        )
+        postings = postings[(postings >= first) & (postings < last)]
+        if not len(postings):
+            return []
+
+        reps, shared = np.unique(postings, return_counts=True)
+        needed = max(len(codes) - self.word_size * max_edits, 1)
+        lengths = np.array([len(self.seqs[self.reps[r]]) for r in reps])
+        keep = (shared >= needed) & (len(seq) >= self.length_cutoff * lengths)
+        return reps[keep].tolist()
+
+    def _add_rep(self, index: int):
+        """Make a sequence the representative of a new cluster."""
+
+        rep = len(self.reps)
+        self.reps.append(index)
+        codes, valid = kmer_codes(self.seqs[index], self.word_size, self._alphabet)
+        for code in np.unique(codes[valid]).tolist():
+            self._kmers[code].append(rep)
+
+
+def cluster_fasta(
+    in_path: str,
+    out_path: str,
+    identity: float,
+    word_size: int,
+    length_cutoff: float,
+    protein: bool = False,
+    best: bool = False,
+    processes: Optional[int] = 1,
+) -> int:
+    """Cluster a FASTA file like cd-hit (protein) or cd-hit-est (DNA).
+
+    Writes the representative sequences to out_path and the clusters to
+    out_path + ".clstr", in cd-hit's format with full sequence names (-d 0).
+
+    Args:
+        in_path: The FASTA file to cluster (-i)
+        out_path: The FASTA file for the representative sequences (-o)
+        identity: The identity threshold of cluster members (-c)
+        word_size: The length of kmers used to filter representatives (-n)
+        length_cutoff: The shortest a member can be, relative to its
+            representative (-s)
+
+    Keyword Args:
+        protein: Whether the sequences are protein, otherwise DNA
+        best: Join the most similar representative, not the first (-g 1)
+        processes: The number of worker processes, os.cpu_count() if None
+
+    Returns:
+        The number of clusters
+    """
+
+    records = list(SeqIO.parse(in_path, "fasta"))
+    clusterer = Clusterer(
+        [str(r.seq) for r in records],
+        identity,
+        word_size,
+        length_cutoff,
+        protein=protein,
+        best=best,
+    ).cluster(processes)
+
+    members: List[List[int]] = [[] for _ in clusterer.reps]
+    for index, match in enumerate(clusterer.matches):
+        members[match[0]].append(index)
+
+    with open(out_path, "w") as out_file:
+        for index in sorted(clusterer.reps):
+            out_file.write(f">{records[index].id}\n{str(records[index].seq)}\n")
+
+    unit = "aa" if protein else "nt"
+    with open(out_path + ".clstr", "w") as clstr_file:
+        for number, (rep, indexes) in enumerate(zip(clusterer.reps, members)):
+            clstr_file.write(f">Cluster {number}\n")
+            for j, index in enumerate(indexes):
+                record = records[index]
+                line = f"{j}\t{len(record.seq)}{unit}, >{record.id}... "
+                if index == rep:
+                    line += "*"
+                else:
+                    _, identity_, strand = clusterer.matches[index]
+                    prefix = "" if protein else f"{strand}/"
+                    line += f"at {prefix}{identity_ * 100:.2f}%"
+                clstr_file.write(line + "\n")
+
+    return len(clusterer.reps)
+
+
+def edit_distance(query: str, subject: str) -> int:
+    """Find the fewest edits to align all of a query within a subject.
+
+    Myers' bit-vector algorithm, with the query's columns as bits of an int.
+
+    Args:
+        query: The sequence to align in full
+        subject: The sequence to align it within, with free ends
+
+    Returns:
+        The fewest mismatches and gap bp in an alignment
+    """
+
+    if not query:
+        return 0
+
+    peq: Dict[str, int] = {}
+    for i, symbol in enumerate(query):
+        peq[symbol] = peq.get(symbol, 0) | (1 << i)
+
+    mask = (1 << len(query)) - 1
+    high = 1 << (len(query) - 1)
+    pv, mv = mask, 0
+    score = best = len(query)
+    for symbol in subject:
+        eq = peq.get(symbol, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        if score < best:
+            best = score
+    return best
+
+
+_worker_clusterer: Optional[Clusterer] = None
+"""The Clusterer of a worker process."""
+
+
+def _set_clusterer(clusterer: Clusterer):
+    """Keep the Clusterer in a worker process, inherited when forked."""
+
+    global _worker_clusterer
+    _worker_clusterer = clusterer
+
+
+def _match(index: int, last: int) -> Optional[Match]:
+    """Match a sequence with the worker's representatives before last."""
+
+    assert _worker_clusterer is not None
+    return _worker_clusterer.match(index, 0, last)
@@ -0,0 +1,971 @@
+"""A memory-mapped kmer index over the DNA and protein feature databases.
+
+The index replaces the pickled kmer maps (``Dict[str, List[Tuple[str, int]]]``)
+that had to be fully unpickled into every process that annotates. Instead,
+each kmer is bit-packed into an unsigned integer and stored in a sorted array
+with flat "posting" arrays listing the feature index and offset of every
+occurrence of that kmer. The arrays are saved with NumPy and opened with mmap,
+so loading is near-instant and worker processes share the same pages.
+
+An index directory has the layout:
+
+    header.json: format version, word size, seed pattern, minimizer window,
+        alphabet and feature metadata
+    codes.npy: sorted, unique kmer codes (uint64)
+    starts.npy: offset of each code's postings (int64, len(codes) + 1)
+    features.npy: feature index of each posting (uint32)
+    locs.npy: offset of the kmer within its feature, per posting (uint32)
+    seqs.npy: every feature's sequence concatenated together (uint8)
+    seq_starts.npy: offset of each feature in seqs (int64, features + 1)
+    segments.json: features added and removed since the index was built, if any
+
+Features can be added to and removed from a saved index without rebuilding it
+(see `synbio.features.seed.add_features`). Added features are saved as small
+"segment" indexes in subdirectories and removed features are listed by
+position in segments.json. `KmerIndex.load` merges those into the index it
+returns, until they're compacted back into the index's own arrays.
+
+By default every kmer of every feature is indexed. Two options, recorded in
+the header so queries are chopped up the same way, change that:
+
+    pattern: A spaced seed, like "1101101101101101". Kmers are word_size
+        (the pattern's length) long but only the symbols at its 1s are packed
+        into the kmer's code, so a mismatch at a 0 doesn't break the seed.
+        Spaced seeds find more features with scattered SNPs than contiguous
+        kmers packed with as many symbols
+    window: Only each window of this many consecutive kmers' minimizer (the
+        kmer with the smallest hashed code) is indexed, about 2 / (window + 1)
+        of a feature's kmers. Queries still look up all of their kmers, so a
+        feature is found if any of its minimizers matches the query. Every
+        kmer of features shorter than window * word_size bp is indexed
+"""
+
+from collections.abc import Mapping
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+INDEX_VERSION = 2
+"""The newest index format. Indexes with a seed pattern or window are version 2."""
+DNA_ALPHABET = "ACGT"
+PROTEIN_ALPHABET = "ACDEFGHIKLMNPQRSTVWYBJOUXZ*"
+
+HEADER = "header.json"
+MANIFEST = "segments.json"
+FEATURE_KEYS = ["ids", "names", "types", "descriptions"]
+ARRAYS = ["codes", "starts", "features", "locs", "seqs", "seq_starts"]
+
+
+KmerMap = Union["KmerIndex", "LayeredIndex", Dict[str, List[Tuple[str, int]]]]
+
+
+class KmerIndex(Mapping):
+    """Sorted, bit-packed kmers with flat posting arrays of feature index/offset.
+
+    KmerIndex is a read-only Mapping from kmer to a list of (feature id, offset)
+    tuples so it can be used in place of the pickled kmer maps.
+
+    Attributes:
+        word_size: The length of each kmer
+        alphabet: The symbols that may be in a kmer. Kmers with other
+            symbols (ambiguous bases, for example) aren't indexed
+        pattern: The spaced seed of each kmer, "1" for each symbol in its code
+            and "0" for those ignored. All 1s unless the index has spaced seeds
+        weight: The number of symbols in each kmer's code, 1s in the pattern
+        window: The number of consecutive kmers with one indexed minimizer,
+            1 if every kmer is indexed
+        ids: The ID of each feature, by feature index
+        names: The name of each feature, by feature index
+        types: The type of each feature, by feature index
+        descriptions: The description of each feature, by feature index
+        codes: Sorted unique kmer codes
+        starts: Offset of each code's postings in features/locs
+        features: Feature index of each posting
+        locs: Offset of the kmer in the feature of each posting
+        seqs: Concatenated feature sequences as bytes
+        seq_starts: Offset of each feature's sequence in seqs
+        lengths: The length of each feature's sequence
+        generation: The number of updates to the index since it was built
+    """
+
+    def __init__(self, header: dict, arrays: Dict[str, np.ndarray]):
+        if header.get("version", 0) > INDEX_VERSION:
+            raise ValueError(
+                f"index version {header['version']} is newer than {INDEX_VERSION}"
+            )
+
+        self.header = header
+        self.word_size: int = header["word_size"]
+        self.alphabet: str = header["alphabet"]
+        self.pattern: str = header.get("pattern", "1" * self.word_size)
+        self.weight = self.pattern.count("1")
+        self.window: int = header.get("window", 1)
+        self.ids: List[str] = header["ids"]
+        self.names: List[str] = header["names"]
+        self.types: List[str] = header["types"]
+        self.descriptions: List[str] = header["descriptions"]
+        self.generation: int = header.get("generation", 0)
+
+        self.codes = arrays["codes"]
+        self.starts = arrays["starts"]
+        self.features = arrays["features"]
+        self.locs = arrays["locs"]
+        self.seqs = arrays["seqs"]
+        self.seq_starts = arrays["seq_starts"]
+
+        self.lengths = np.diff(self.seq_starts)
+        self._kmer_counts: Optional[np.ndarray] = None
+
+        self._table = _symbol_table(self.alphabet)
+        self._bits = symbol_bits(self.alphabet)
+
+    @classmethod
+    def build(
+        cls,
+        id_map: Dict[str, SeqRecord],
+        word_size: int,
+        alphabet: str,
+        processes: Optional[int] = 1,
+        pattern: str = "",
+        window: int = 1,
+    ) -> "KmerIndex":
+        """Build a new index from a map of feature ID to feature.
+
+        Features are split into shards of consecutive features with about
+        the same number of bp. Each shard is chopped into kmers and sorted by
+        kmer code on its own, over a pool of processes, and the sorted shards
+        are merged with a k-way merge (see `_merge_postings`).
+
+        Args:
+            id_map: Map from feature ID to the feature (SeqRecord)
+            word_size: The length of each kmer
+            alphabet: The alphabet of the features' sequences
+
+        Keyword Args:
+            processes: The number of worker processes and shards,
+                os.cpu_count() if None. Shards are built in this process if 1
+            pattern: A spaced seed as long as word_size, with a "1" for each
+                symbol packed into a kmer's code and "0" for those ignored.
+                Contiguous kmers if empty
+            window: Index only the minimizer of each window of this many
+                consecutive kmers, every kmer if 1
+
+        Returns:
+            A new, in-memory, KmerIndex
+        """
+
+        pattern = pattern or "1" * word_size
+        if len(pattern) != word_size or set(pattern) - {"0", "1"}:
+            raise ValueError(f"pattern must be {word_size} 0s and 1s: {pattern}")
+        if pattern[0] != "1" or pattern[-1] != "1" or window < 1:
+            raise ValueError("pattern must start and end with 1, window be >= 1")
+
+        records = list(id_map.values())
+        seqs = [str(r.seq) for r in records]
+        seq_starts = np.cumsum([0] + [len(s) for s in seqs])
+
+        processes = processes or os.cpu_count() or 1
+        bounds = np.searchsorted(
+            seq_starts[1:], np.linspace(0, seq_starts[-1], processes + 1)[1:-1]
+        )
+        bounds = [0] + sorted(set(int(b) + 1 for b in bounds)) + [len(seqs)]
+        shards = [
+            (seqs[start:end], start, word_size, alphabet, pattern, window)
+            for start, end in zip(bounds[:-1], bounds[1:])
+            if start < end
+        ]
+
+        if processes == 1 or len(shards) < 2:
+            postings = [_shard_postings(*shard) for shard in shards]
+        else:
+            start_methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "fork" if "fork" in start_methods else None
+            )
+            with context.Pool(len(shards)) as pool:
+                postings = pool.starmap(_shard_postings, shards)
+
+        codes, features, locs = _merge_postings(postings)
+        return cls._pack(
+            _header(records, word_size, alphabet, pattern, window),
+            codes,
+            features,
+            locs,
+            np.frombuffer("".join(seqs).encode(), dtype=np.uint8),
+            seq_starts,
+        )
+
+    @classmethod
+    def from_kmer_map(
+        cls,
+        kmer_map: Dict[str, List[Tuple[str, int]]],
+        id_map: Dict[str, SeqRecord],
+        alphabet: str,
+    ) -> "KmerIndex":
+        """Convert a legacy kmer map and its id map to a KmerIndex.
+
+        Kmers with symbols outside the alphabet are dropped.
+
+        Args:
+            kmer_map: Map from kmer to a list of (feature id, offset) tuples
+            id_map: Map from feature ID to the feature (SeqRecord)
+            alphabet: The alphabet of the features' sequences
+
+        Returns:
+            A new, in-memory, KmerIndex with the same postings as the kmer map
+        """
+
+        records = list(id_map.values())
+        id_to_index = {fid: i for i, fid in enumerate(id_map)}
+        word_size = len(next(iter(kmer_map))) if kmer_map else 1
+
+        kmers = list(kmer_map.keys())
+        codes, valid = kmer_codes("".join(kmers), word_size, alphabet)
+        codes, valid = codes[::word_size], valid[::word_size]
+
+        counts = np.array([len(kmer_map[k]) for k in kmers], dtype=np.int64)
+        postings = [posting for k in kmers for posting in kmer_map[k]]
+        features = np.array([id_to_index[f] for f, _ in postings], dtype=np.uint32)
+        locs = np.array([l for _, l in postings], dtype=np.uint32)
+        keep = np.repeat(valid, counts)
+
+        return cls._from_postings(
+            records,
+            word_size,
+            alphabet,
+            [np.repeat(codes, counts)[keep]],
+            [features[keep]],
+            [locs[keep]],
+        )
+
+    @classmethod
+    def _from_postings(
+        cls,
+        records: List[SeqRecord],
+        word_size: int,
+        alphabet: str,
+        all_codes: List[np.ndarray],
+        all_features: List[np.ndarray],
+        all_locs: List[np.ndarray],
+    ) -> "KmerIndex":
+        """Sort and pack kmer postings into a KmerIndex."""
+
+        codes = np.concatenate(all_codes) if all_codes else np.zeros(0, np.uint64)
+        features = (
+            np.concatenate(all_features) if all_features else np.zeros(0, np.uint32)
+        )
+        locs = np.concatenate(all_locs) if all_locs else np.zeros(0, np.uint32)
+
+        # stable so each kmer's postings keep their order (by feature, then offset)
+        order = np.argsort(codes, kind="stable")
+
+        seqs = [str(r.seq) for r in records]
+        return cls._pack(
+            _header(records, word_size, alphabet),
+            codes[order],
+            features[order],
+            locs[order],
+            np.frombuffer("".join(seqs).encode(), dtype=np.uint8),
+            np.cumsum([0] + [len(s) for s in seqs]),
+        )
+
+    @classmethod
+    def _pack(
+        cls,
+        header: dict,
+        codes: np.ndarray,
+        features: np.ndarray,
+        locs: np.ndarray,
+        seqs: np.ndarray,
+        seq_starts: np.ndarray,
+    ) -> "KmerIndex":
+        """Pack postings, already sorted by kmer code, into a KmerIndex."""
+
+        first = np.ones(len(codes), dtype=bool)
+        first[1:] = codes[1:] != codes[:-1]
+        starts = np.flatnonzero(first)
+
+        arrays = {
+            "codes": codes[starts].astype(np.uint64),
+            "starts": np.append(starts, len(codes)).astype(np.int64),
+            "features": features.astype(np.uint32),
+            "locs": locs.astype(np.uint32),
+            "seqs": seqs.astype(np.uint8),
+            "seq_starts": seq_starts.astype(np.int64),
+        }
+
+        return cls(header, arrays)
+
+    def merge(self, other: "KmerIndex") -> "KmerIndex":
+        """Append another index's features to this index's.
+
+        The other index's postings are inserted after this index's postings
+        of the same kmers, so postings stay ordered by feature and offset
+        without sorting every kmer again.
+
+        Args:
+            other: An index with the same word size and alphabet
+
+        Returns:
+            A new, in-memory, KmerIndex with the features of both indexes
+        """
+
+        if _seed(other) != _seed(self):
+            raise ValueError("can't merge indexes of different kmers")
+
+        codes = self._posting_codes()
+        other_codes = other._posting_codes()
+        at = np.searchsorted(codes, other_codes, side="right")
+        other_features = other.features.astype(np.int64) + len(self.ids)
+
+        header = dict(self.header)
+        for key in FEATURE_KEYS:
+            header[key] = self.header[key] + other.header[key]
+
+        return self._pack(
+            header,
+            np.insert(codes, at, other_codes),
+            np.insert(self.features.astype(np.int64), at, other_features),
+            np.insert(self.locs, at, other.locs),
+            np.concatenate((self.seqs, other.seqs)),
+            np.concatenate(
+                (self.seq_starts, other.seq_starts[1:] + self.seq_starts[-1])
+            ),
+        )
+
+    def remove(self, features: List[int]) -> "KmerIndex":
+        """Remove features, and their postings, from the index.
+
+        Args:
+            features: The indexes of the features to remove
+
+        Returns:
+            A new, in-memory, KmerIndex without the features
+        """
+
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[np.asarray(features, dtype=np.int64)] = False
+        postings = keep[self.features]
+        new_features = np.cumsum(keep) - 1
+
+        header = dict(self.header)
+        for key in FEATURE_KEYS:
+            header[key] = [v for v, k in zip(self.header[key], keep) if k]
+
+        return self._pack(
+            header,
+            self._posting_codes()[postings],
+            new_features[self.features[postings]],
+            self.locs[postings],
+            self.seqs[np.repeat(keep, self.lengths)],
+            np.cumsum(np.append(0, self.lengths[keep])),
+        )
+
+    def _posting_codes(self) -> np.ndarray:
+        """The kmer code of each posting."""
+
+        return np.repeat(self.codes, np.diff(self.starts))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "KmerIndex":
+        """Open an index saved to a directory.
+
+        Args:
+            directory: The index directory written by `KmerIndex.save`
+
+        Keyword Args:
+            mmap: Whether to memory-map the arrays rather than read them
+
+        Returns:
+            The KmerIndex in the directory, with features added since it was
+            built and without those removed
+        """
+
+        header = read_header(directory)
+        arrays: Dict[str, np.ndarray] = {}
+        for name in ARRAYS:
+            filename = os.path.join(directory, name + ".npy")
+            arrays[name] = np.load(filename, mmap_mode="r" if mmap else None)
+        index = cls(header, arrays)
+
+        manifest = read_manifest(directory)
+        if manifest is None or manifest["base"] != index.generation:
+            return index  # not updated, or compacted since the manifest was written
+
+        for segment in manifest["segments"]:
+            index = index.merge(cls.load(os.path.join(directory, segment), mmap))
+        if manifest["removed"]:
+            index = index.remove(manifest["removed"])
+
+        index.header["generation"] = index.generation = manifest["generation"]
+        return index
+
+    def save(self, directory: str):
+        """Save the index to a directory.
+
+        Args:
+            directory: The directory to write the header and arrays to
+        """
+
+        os.makedirs(directory, exist_ok=True)
+
+        # replace rather than overwrite files, which may be memory-mapped
+        for name in ARRAYS:
+            filename = os.path.join(directory, name + ".npy")
+            with open(filename + ".tmp", "wb") as array_file:
+                np.save(array_file, getattr(self, name))
+            os.replace(filename + ".tmp", filename)
+        _write_json(os.path.join(directory, HEADER), self.header)
+
+    def encode(self, kmer: str) -> int:
+        """Return a kmer's integer code, or -1 if it can't be in the index."""
+
+        if len(kmer) != self.word_size:
+            return -1
+
+        code = 0
+        for char, care in zip(kmer.encode("ascii", "replace"), self.pattern):
+            if care == "0":
+                continue
+            symbol = self._table[char]
+            if symbol >= len(self.alphabet):
+                return -1
+            code = (code << self._bits) | int(symbol)
+        return code
+
+    def decode(self, code: int) -> str:
+        """Return the kmer for an integer code, "N" where the pattern has a 0."""
+
+        mask = (1 << self._bits) - 1
+        chars: List[str] = []
+        for care in reversed(self.pattern):
+            if care == "0":
+                chars.append("N")
+                continue
+            chars.append(self.alphabet[code & mask])
+            code >>= self._bits
+        return "".join(reversed(chars))
+
+    def kmer_codes(self, seq: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the code of every kmer in a sequence, as they're indexed.
+
+        Args:
+            seq: The sequence to chop into kmers
+
+        Returns:
+            The code of each kmer and whether it's valid, as from `kmer_codes`
+        """
+
+        return kmer_codes(seq, self.word_size, self.alphabet, self.pattern)
+
+    def postings(self, kmer: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return the feature indexes and offsets of a kmer, None if absent."""
+
+        code = self.encode(kmer)
+        if code < 0:
+            return None
+
+        i = int(np.searchsorted(self.codes, np.uint64(code)))
+        if i >= len(self.codes) or int(self.codes[i]) != code:
+            return None
+
+        start, end = int(self.starts[i]), int(self.starts[i + 1])
+        return self.features[start:end], self.locs[start:end]
+
+    @property
+    def kmer_counts(self) -> np.ndarray:
+        """The number of kmers indexed for each feature."""
+
+        if self._kmer_counts is None:
+            self._kmer_counts = np.bincount(
+                self.features, minlength=len(self.ids)
+            ).astype(np.int64)
+        return self._kmer_counts
+
+    def digest(self) -> str:
+        """Hash the header and features' sequences, which determine the index.
+
+        Returns:
+            A hex digest that changes if the index's features change
+        """
+
+        sha = hashlib.sha1(json.dumps(self.header, sort_keys=True).encode())
+        sha.update(np.ascontiguousarray(self.seq_starts, dtype=np.int64).tobytes())
+        sha.update(memoryview(np.ascontiguousarray(self.seqs)))
+        return sha.hexdigest()
+
+    def lookup(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find the postings of many kmer codes at once.
+
+        Args:
+            codes: Kmer codes to search for, as from `kmer_codes`
+
+        Returns:
+            A tuple with three arrays, one entry per posting:
+                1. the index in codes of the matched kmer
+                2. the feature index of the posting
+                3. the offset of the kmer in the feature
+        """
+
+        empty = np.zeros(0, dtype=np.int64)
+        if not len(self.codes) or not len(codes):
+            return empty, empty, empty
+
+        key_indexes = np.searchsorted(self.codes, codes)
+        found = self.codes[np.minimum(key_indexes, len(self.codes) - 1)] == codes
+        found &= key_indexes < len(self.codes)
+
+        matched = np.flatnonzero(found)
+        key_indexes = key_indexes[matched]
+        starts = self.starts[key_indexes]
+        counts = self.starts[key_indexes + 1] - starts
+
+        # expand each matched kmer into one entry per posting
+        offsets = np.cumsum(counts) - counts
+        postings = np.arange(counts.sum()) + np.repeat(starts - offsets, counts)
+
+        return (
+            np.repeat(matched, counts),
+            self.features[postings].astype(np.int64),
+            self.locs[postings].astype(np.int64),
+        )
+
+    def seq(self, feature: int) -> str:
+        """Return the sequence of a feature by its index."""
+
+        start, end = self.seq_starts[feature], self.seq_starts[feature + 1]
+        return self.seqs[start:end].tobytes().decode()
+
+    def record(self, feature: int) -> SeqRecord:
+        """Create a SeqRecord for a feature by its index."""
+
+        return SeqRecord(
+            Seq(self.seq(feature)),
+            id=self.ids[feature],
+            name=self.names[feature],
+            description=self.descriptions[feature],
+            annotations={"type": self.types[feature]},
+        )
+
+    def id_map(self) -> Dict[str, SeqRecord]:
+        """Create a map from feature ID to feature (SeqRecord)."""
+
+        return {self.ids[i]: self.record(i) for i in range(len(self.ids))}
+
+    def __getitem__(self, kmer: str) -> List[Tuple[str, int]]:
+        postings = self.postings(kmer)
+        if postings is None:
+            raise KeyError(kmer)
+
+        features, locs = postings
+        return [(self.ids[f], int(l)) for f, l in zip(features, locs)]
+
+    def __contains__(self, kmer) -> bool:
+        return isinstance(kmer, str) and self.postings(kmer) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        for code in self.codes:
+            yield self.decode(int(code))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+class LayeredIndex:
+    """Several KmerIndexes searched as one, as if their features were in one index.
+
+    Features are numbered across the layers: those of the first index, then
+    those of the second, and so on. A query's kmers are looked up in every
+    layer at once. If a feature is in more than one layer (it has the same ID,
+    so the same sequence) only the last layer's is searched, so later layers
+    override earlier ones.
+
+    Args:
+        indexes: The indexes to search, with the same kmers: word size,
+            alphabet, seed pattern and window
+
+    Attributes:
+        indexes: The layers' indexes
+        word_size: The length of each kmer
+        alphabet: The symbols that may be in a kmer
+        pattern: The spaced seed of each kmer
+        weight: The number of symbols in each kmer's code
+        window: The number of consecutive kmers with one indexed minimizer
+        ids: The ID of each feature, by feature index
+        seqs: Concatenated feature sequences as bytes
+        seq_starts: Offset of each feature's sequence in seqs
+        lengths: The length of each feature's sequence
+    """
+
+    def __init__(self, indexes: List[KmerIndex]):
+        if not indexes:
+            raise ValueError("a LayeredIndex needs at least one index")
+        if len({_seed(index) for index in indexes}) > 1:
+            raise ValueError("can't layer indexes of different kmers")
+
+        self.indexes = indexes
+        self.word_size = indexes[0].word_size
+        self.alphabet = indexes[0].alphabet
+        self.pattern = indexes[0].pattern
+        self.weight = indexes[0].weight
+        self.window = indexes[0].window
+        self.ids: List[str] = [fid for index in indexes for fid in index.ids]
+
+        self.offsets = np.cumsum([0] + [len(index.ids) for index in indexes])
+        self.seqs = np.concatenate([index.seqs for index in indexes])
+        seq_offsets = np.cumsum([0] + [len(index.seqs) for index in indexes])
+        self.seq_starts = np.concatenate(
+            [index.seq_starts[:-1] + o for index, o in zip(indexes, seq_offsets)]
+            + [seq_offsets[-1:]]
+        ).astype(np.int64)
+        self.lengths = np.diff(self.seq_starts)
+
+        # hide features overridden by a later layer
+        last = {fid: i for i, fid in enumerate(self.ids)}
+        self._hidden = np.array(
+            [last[fid] != i for i, fid in enumerate(self.ids)], dtype=bool
+        )
+        self._kmer_counts: Optional[np.ndarray] = None
+
+    @property
+    def kmer_counts(self) -> np.ndarray:
+        """The number of kmers indexed for each feature."""
+
+        if self._kmer_counts is None:
+            self._kmer_counts = np.concatenate([i.kmer_counts for i in self.indexes])
+        return self._kmer_counts
+
+    def lookup(self, codes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Find the postings of many kmer codes at once in every layer.
+
+        Args:
+            codes: Kmer codes to search for, as from `kmer_codes`
+
+        Returns:
+            A tuple with three arrays, one entry per posting, like
+            `KmerIndex.lookup`. Postings are ordered by the index in codes of
+            their kmer, then by layer
+        """
+
+        # sort the query's codes once, so each layer's search walks its codes in order
+        query_order = np.argsort(codes, kind="stable")
+        results = [index.lookup(codes[query_order]) for index in self.indexes]
+        matched = query_order[np.concatenate([r[0] for r in results])]
+        features = np.concatenate([r[1] + o for r, o in zip(results, self.offsets)])
+        locs = np.concatenate([r[2] for r in results])
+
+        order = np.argsort(matched, kind="stable")
+        order = order[~self._hidden[features[order]]]
+        return matched[order], features[order], locs[order]
+
+    def seq(self, feature: int) -> str:
+        """Return the sequence of a feature by its index."""
+
+        start, end = self.seq_starts[feature], self.seq_starts[feature + 1]
+        return self.seqs[start:end].tobytes().decode()
+
+    def kmer_codes(self, seq: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute the code of every kmer in a sequence, as they're indexed."""
+
+        return kmer_codes(seq, self.word_size, self.alphabet, self.pattern)
+
+
+def load_kmer_map(index_dir: str, kmer_map_pickle: str) -> Optional[KmerMap]:
+    """Open a KmerIndex, falling back to the legacy pickled kmer map.
+
+    Args:
+        index_dir: The directory of a KmerIndex
+        kmer_map_pickle: The filename of a pickled kmer map
+
+    Returns:
+        The kmer map, None if neither exists
+    """
+
+    if os.path.isfile(os.path.join(index_dir, HEADER)):
+        return KmerIndex.load(index_dir)
+
+    if os.path.isfile(kmer_map_pickle):
+        with open(kmer_map_pickle, "r+b") as kmer_map_file:
+            return pickle.load(kmer_map_file)
+
+    return None
+
+
+def _header(
+    records: List[SeqRecord],
+    word_size: int,
+    alphabet: str,
+    pattern: str = "",
+    window: int = 1,
+) -> dict:
+    """Create the header of an index of features."""
+
+    header: dict = {"version": 1, "word_size": word_size, "alphabet": alphabet}
+    if (pattern and pattern.count("1") != word_size) or window != 1:
+        # readers that predate seed patterns and windows can't read the index
+        header.update(version=INDEX_VERSION, pattern=pattern, window=window)
+
+    return {
+        **header,
+        "ids": [r.id for r in records],
+        "names": [r.name for r in records],
+        "types": [r.annotations.get("type", "misc_feature") for r in records],
+        "descriptions": [r.description for r in records],
+    }
+
+
+def _shard_postings(
+    seqs: List[str],
+    first_feature: int,
+    word_size: int,
+    alphabet: str,
+    pattern: str = "",
+    window: int = 1,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Chop a shard of consecutive features into kmer postings sorted by kmer code.
+
+    Args:
+        seqs: The sequences of the shard's features
+        first_feature: The feature index of the shard's first feature
+        word_size: The length of each kmer
+        alphabet: The alphabet of the features' sequences
+        pattern: The spaced seed of each kmer, contiguous if empty
+        window: The number of consecutive kmers with one indexed minimizer
+
+    Returns:
+        A tuple with three arrays, one entry per posting:
+            1. the kmer code
+            2. the feature index
+            3. the offset of the kmer in the feature
+    """
+
+    all_codes: List[np.ndarray] = [np.zeros(0, dtype=np.uint64)]
+    all_features: List[np.ndarray] = [np.zeros(0, dtype=np.uint32)]
+    all_locs: List[np.ndarray] = [np.zeros(0, dtype=np.uint32)]
+    for i, seq in enumerate(seqs):
+        codes, valid = kmer_codes(seq, word_size, alphabet, pattern)
+        # short features have too few windows to be found past a mismatch
+        locs = minimizers(codes, valid, window if len(seq) >= window * word_size else 1)
+        all_codes.append(codes[locs])
+        all_features.append(np.full(len(locs), first_feature + i, dtype=np.uint32))
+        all_locs.append(locs.astype(np.uint32))
+
+    codes = np.concatenate(all_codes)
+
+    # stable so each kmer's postings keep their order (by feature, then offset)
+    order = np.argsort(codes, kind="stable")
+    return (
+        codes[order],
+        np.concatenate(all_features)[order],
+        np.concatenate(all_locs)[order],
+    )
+
+
+def _merge_postings(
+    shards: List[Tuple[np.ndarray, np.ndarray, np.ndarray]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Merge shards' postings, each sorted by kmer code, with a k-way merge.
+
+    Shards are of consecutive features, in order. A posting's position in
+    the merged arrays is its position in its shard plus the number of postings
+    in other shards that come before it: those with a smaller kmer code or the
+    same code in an earlier shard. Those are counted with a binary search of
+    each other shard, so the merge never compares postings within a shard and
+    is stable, like sorting every posting at once.
+
+    Args:
+        shards: Each shard's kmer codes, feature indexes and offsets, as from
+            `_shard_postings`
+
+    Returns:
+        The kmer codes, feature indexes and offsets of every posting, sorted
+        by kmer code, then feature, then offset
+    """
+
+    if len(shards) == 1:
+        return shards[0]
+
+    total = sum(len(codes) for codes, _, _ in shards)
+    merged = (
+        np.zeros(total, dtype=np.uint64),
+        np.zeros(total, dtype=np.uint32),
+        np.zeros(total, dtype=np.uint32),
+    )
+
+    for j, shard in enumerate(shards):
+        positions = np.arange(len(shard[0]))
+        for i, (other_codes, _, _) in enumerate(shards):
+            if i != j:
+                side = "right" if i < j else "left"
+                positions += np.searchsorted(other_codes, shard[0], side=side)
+        for array, values in zip(merged, shard):
+            array[positions] = values
+
+    return merged
+
+
+def read_header(directory: str) -> dict:
+    """Read the header of an index saved to a directory.
+
+    Args:
+        directory: The index directory written by `KmerIndex.save`
+
+    Returns:
+        The index's format version, word size, alphabet and feature metadata
+    """
+
+    with open(os.path.join(directory, HEADER), "r") as header_file:
+        return json.load(header_file)
+
+
+def read_manifest(directory: str) -> Optional[dict]:
+    """Read the features added to and removed from an index since it was built.
+
+    Args:
+        directory: The index directory written by `KmerIndex.save`
+
+    Returns:
+        None if the index hasn't been updated, otherwise a dict with:
+            base: the generation of the index the updates apply to
+            generation: the generation of the index after the updates
+            segments: subdirectories with indexes of added features, in order
+            removed: indexes of removed features, counting added features
+                after the index's own
+    """
+
+    filename = os.path.join(directory, MANIFEST)
+    if not os.path.isfile(filename):
+        return None
+
+    with open(filename, "r") as manifest_file:
+        return json.load(manifest_file)
+
+
+def write_manifest(directory: str, manifest: dict):
+    """Write the features added to and removed from an index, see `read_manifest`."""
+
+    _write_json(os.path.join(directory, MANIFEST), manifest)
+
+
+def _write_json(filename: str, value: dict):
+    """Write JSON to a file by replacing it, so readers never see part of it."""
+
+    with open(filename + ".tmp", "w") as json_file:
+        json.dump(value, json_file)
+    os.replace(filename + ".tmp", filename)
+
+
+def symbol_bits(alphabet: str) -> int:
+    """Return the number of bits needed to pack each symbol of an alphabet."""
+
+    return max(1, (len(alphabet) - 1).bit_length())
+
+
+@functools.lru_cache(maxsize=8)
+def _symbol_table(alphabet: str) -> np.ndarray:
+    """Create a lookup table from byte to symbol index, len(alphabet) if invalid."""
+
+    table = np.full(256, len(alphabet), dtype=np.uint8)
+    for i, char in enumerate(alphabet):
+        table[ord(char.upper())] = i
+        table[ord(char.lower())] = i
+    return table
+
+
+def kmer_codes(
+    seq: str, word_size: int, alphabet: str, pattern: str = ""
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the integer code of every kmer in a sequence.
+
+    Args:
+        seq: The sequence to chop into kmers
+        word_size: The length of each kmer
+        alphabet: The alphabet to pack symbols with
+
+    Keyword Args:
+        pattern: A spaced seed as long as word_size. Only the symbols at its
+            1s are packed into a kmer's code and need to be in the alphabet
+
+    Returns:
+        A tuple with two arrays, one entry per kmer start index:
+            1. the bit-packed code of each kmer
+            2. whether the kmer is made only of symbols in the alphabet
+    """
+
+    bits = symbol_bits(alphabet)
+    cares = [j for j, care in enumerate(pattern or "1" * word_size) if care == "1"]
+    if bits * len(cares) > 64:
+        raise ValueError(f"{len(cares)}-mers over {alphabet} don't fit in 64 bits")
+
+    symbols = _symbol_table(alphabet)[
+        np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+    ]
+
+    count = len(symbols) - word_size + 1
+    if count < 1:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+
+    codes = np.zeros(count, dtype=np.uint64)
+    shift = np.uint64(bits)
+    for j in cares:
+        codes = (codes << shift) | symbols[j : j + count].astype(np.uint64)
+
+    if len(cares) == word_size:
+        invalid = np.concatenate(([0], np.cumsum(symbols >= len(alphabet))))
+        valid = invalid[word_size:] == invalid[:count]
+    else:
+        valid = np.ones(count, dtype=bool)
+        for j in cares:
+            valid &= symbols[j : j + count] < len(alphabet)
+
+    return codes, valid
+
+
+def minimizers(codes: np.ndarray, valid: np.ndarray, window: int) -> np.ndarray:
+    """Find the minimizers of a sequence's kmers.
+
+    A window's minimizer is the valid kmer in it with the smallest hashed code,
+    the leftmost if there's a tie. Codes are hashed so minimizers aren't
+    biased towards low-complexity kmers like AAAAAAAAAAA.
+
+    Args:
+        codes: The code of each kmer in the sequence, from `kmer_codes`
+        valid: Whether each kmer is valid, from `kmer_codes`
+        window: The number of consecutive kmers in each window. Sequences
+            with fewer kmers are one window
+
+    Returns:
+        The sorted start indexes of the kmers that are a window's minimizer.
+        Every valid kmer if window is 1
+    """
+
+    if window <= 1 or not valid.any():
+        return np.flatnonzero(valid)
+
+    hashes = codes * np.uint64(0x9E3779B97F4A7C15)
+    hashes ^= hashes >> np.uint64(29)
+    hashes[~valid] = np.iinfo(np.uint64).max
+
+    window = min(window, len(hashes))
+    windows = np.lib.stride_tricks.as_strided(  # a read-only view, no copies
+        hashes,
+        shape=(len(hashes) - window + 1, window),
+        strides=(hashes.strides[0], hashes.strides[0]),
+        writeable=False,
+    )
+    picks = np.unique(np.arange(len(windows)) + np.argmin(windows, axis=1))
+    return picks[valid[picks]]
+
+
+def _seed(index: Union[KmerIndex, LayeredIndex]) -> Tuple[int, str, str, int]:
+    """The kmers of an index: word size, alphabet, seed pattern and window."""
+
+    return index.word_size, index.alphabet, index.pattern, index.window
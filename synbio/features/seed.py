@@ -1,26 +1,56 @@
-"""Create a kmer map for each DNA and protein sequence."""
+"""Create a kmer index for each DNA and protein sequence.
+
+`seed()` builds the indexes from scratch. `add_features()` and
+`remove_features()` update a built index in place instead: only the added
+features are indexed, into a small segment beside the index, and removed
+features are only listed, so small edits take milliseconds. Every
+UPDATES_BEFORE_COMPACTION updates, the segments and removals are compacted
+back into the index.
+"""
 
-from collections import defaultdict
 from hashlib import sha1
+import os
 import pickle
-from typing import Dict, List, Set, Tuple
+import shutil
+from typing import Dict, Iterable, List, Optional, Set
 
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 
 from .config import (
     DNA_DB,
+    DNA_MINIMIZER_WINDOW,
+    DNA_SEED_PATTERN,
     DNA_WORD_SIZE,
     DNA_ID_MAP_PICKLE,
-    DNA_KMER_MAP_PICKLE,
+    DNA_INDEX,
     PROTEIN_DB,
     PROTEIN_WORD_SIZE,
     PROTEIN_ID_MAP_PICKLE,
-    PROTEIN_KMER_MAP_PICKLE,
+    PROTEIN_INDEX,
+    UPDATES_BEFORE_COMPACTION,
+)
+from .database import FEATURE_DATABASE
+from .index import (
+    DNA_ALPHABET,
+    HEADER,
+    MANIFEST,
+    PROTEIN_ALPHABET,
+    KmerIndex,
+    read_header,
+    read_manifest,
+    write_manifest,
 )
 
+SEGMENT_PREFIX = "segment-"
+
 
-def seed():
+def seed(
+    directory: str = "",
+    processes: Optional[int] = None,
+    pattern: str = DNA_SEED_PATTERN,
+    window: int = DNA_MINIMIZER_WINDOW,
+):
     """Create kmer maps from ID to feature (SeqRecord) and kmers to feature IDs.
 
     This does two things:
@@ -28,16 +58,48 @@ def seed():
             in a map from random unique IDs for each feature
             to the feature (SeqRecord). dna_id_map, protein_id_map.
             Saves this map to "dna.id.pickle", and protein
-        2. Chop each feature into kmers and store in a map
-            where each key is the kmer (str) and the value
-            is a list of feature ids for features that have
-            that kmer (which is what the feature adds its ID to).
-            Saves this kmer map to "dna.kmermap.pickle", and protein
-        
+        2. Chop each feature into kmers and store them in a KmerIndex:
+            sorted, bit-packed kmers with the index and offset of
+            each feature that has that kmer. Saves the index to the
+            "dna.index" directory, and protein. The index is opened
+            with mmap during annotation
+
     This is SUPER loosely based on BLAST's initial word search approach.
+
+    Keyword Args:
+        directory: A directory of a private feature library to seed instead of
+            the bundled database. Its "dna.db" and "protein.db", either of
+            which may be missing, are indexed into "dna.index" and
+            "protein.index" there, without id map pickles. Annotate with it
+            through `FeatureDatabase.from_directory(directory)`
+        processes: The number of processes to build each index over,
+            os.cpu_count() if None
+        pattern: A spaced seed for the DNA index's kmers, like
+            "111010010100110111", with a "1" for each bp compared. DNA kmers
+            are as long as the pattern. Contiguous DNA_WORD_SIZE kmers if empty
+        window: Index only the minimizer of each window of this many
+            consecutive DNA kmers, for a smaller index. Every kmer if 1
     """
 
-    dna_id_map = _id_map(DNA_DB, DNA_WORD_SIZE)
+    dna_word_size = len(pattern) or DNA_WORD_SIZE
+    dna_seeds = {"pattern": pattern, "window": window}
+
+    if directory:
+        for db, index_dir, word_size, alphabet, seeds in [
+            (DNA_DB, DNA_INDEX, dna_word_size, DNA_ALPHABET, dna_seeds),
+            (PROTEIN_DB, PROTEIN_INDEX, PROTEIN_WORD_SIZE, PROTEIN_ALPHABET, {}),
+        ]:
+            db = os.path.join(directory, os.path.basename(db))
+            if os.path.isfile(db):
+                index_dir = os.path.join(directory, os.path.basename(index_dir))
+                id_map = _id_map(db, word_size)
+                KmerIndex.build(id_map, word_size, alphabet, processes, **seeds).save(
+                    index_dir
+                )
+                _clear_updates(index_dir)
+        return
+
+    dna_id_map = _id_map(DNA_DB, dna_word_size)
     protein_id_map = _id_map(PROTEIN_DB, PROTEIN_WORD_SIZE)
 
     with open(DNA_ID_MAP_PICKLE, "wb") as id_map_file:
@@ -45,22 +107,187 @@ def seed():
     with open(PROTEIN_ID_MAP_PICKLE, "wb") as id_map_file:
         pickle.dump(protein_id_map, id_map_file)
 
-    dna_kmer_map = _kmer_map(dna_id_map, DNA_WORD_SIZE)
-    protein_kmer_map = _kmer_map(protein_id_map, PROTEIN_WORD_SIZE)
+    dna_index = KmerIndex.build(
+        dna_id_map, dna_word_size, DNA_ALPHABET, processes, **dna_seeds
+    )
+    protein_index = KmerIndex.build(
+        protein_id_map, PROTEIN_WORD_SIZE, PROTEIN_ALPHABET, processes
+    )
+
+    for index_dir, index in [(DNA_INDEX, dna_index), (PROTEIN_INDEX, protein_index)]:
+        index.save(index_dir)
+        _clear_updates(index_dir)
+        _release(index_dir)
+
 
-    with open(DNA_KMER_MAP_PICKLE, "wb") as kmer_map_file:
-        pickle.dump(dna_kmer_map, kmer_map_file)
-    with open(PROTEIN_KMER_MAP_PICKLE, "wb") as kmer_map_file:
-        pickle.dump(protein_kmer_map, kmer_map_file)
+def add_features(
+    records: Iterable[SeqRecord],
+    protein: bool = False,
+    index_dir: str = "",
+    compact_after: int = UPDATES_BEFORE_COMPACTION,
+) -> List[str]:
+    """Add features to a feature index without rebuilding it.
+
+    Each feature's ID is a hash of its sequence, as in `seed()`. Features
+    shorter than the index's word size, or already in the index, are skipped.
+    The features are kept in the index directory until the index is rebuilt
+    with `seed()`, which only reads the feature databases.
+
+    If the index is missing but its id map pickle isn't, as in an installed
+    package, the index is first built from the id map. Otherwise a new index
+    is started, except for the bundled indexes, which are never replaced by
+    one of only the added features.
+
+    Args:
+        records: The features to add. Each's name, description and "type"
+            annotation are kept
+
+    Keyword Args:
+        protein: Whether to add to the protein, rather than DNA, index
+        index_dir: The index directory, the bundled DNA or protein index if empty
+        compact_after: Compact the index after this many updates
+
+    Returns:
+        The IDs of the features added
+
+    Raises:
+        FileNotFoundError: If the bundled index and its id map pickle are missing
+    """
+
+    index_dir = index_dir or (PROTEIN_INDEX if protein else DNA_INDEX)
+    word_size = PROTEIN_WORD_SIZE if protein else DNA_WORD_SIZE
+    alphabet = PROTEIN_ALPHABET if protein else DNA_ALPHABET
+
+    if not _seed_missing(index_dir, protein) and _bundled(index_dir):
+        raise FileNotFoundError(f"no index or id map pickle to add to: {index_dir}")
+
+    header: Optional[dict] = None
+    live: Set[str] = set()
+    if os.path.isfile(os.path.join(index_dir, HEADER)):
+        header = read_header(index_dir)
+        word_size, alphabet = header["word_size"], header["alphabet"]
+        manifest = _manifest(index_dir, header)
+        ids = _ids(index_dir, header, manifest)
+        removed = set(manifest["removed"])
+        live = {fid for i, fid in enumerate(ids) if i not in removed}
+
+    id_map: Dict[str, SeqRecord] = {}
+    for record in records:
+        seq = str(record.seq).upper()
+        fid = str(sha1(seq.encode()).hexdigest())[:8]
+        if len(seq) < word_size or fid in live or fid in id_map:
+            continue
+
+        id_map[fid] = SeqRecord(
+            Seq(seq),
+            id=fid,
+            name=record.name,
+            description=record.description,
+            annotations={"type": record.annotations.get("type", "misc_feature")},
+        )
+
+    if not id_map:
+        return []
+
+    seeds = {}
+    if header is not None:
+        seeds = {
+            "pattern": header.get("pattern", ""),
+            "window": header.get("window", 1),
+        }
+    index = KmerIndex.build(id_map, word_size, alphabet, **seeds)
+    if header is None:
+        index.save(index_dir)
+    else:
+        manifest["generation"] += 1
+        segment = SEGMENT_PREFIX + str(manifest["generation"])
+        index.save(os.path.join(index_dir, segment))
+        manifest["segments"].append(segment)
+        _update(index_dir, manifest, compact_after)
+
+    _release(index_dir)
+    return list(id_map)
+
+
+def remove_features(
+    ids: Iterable[str],
+    protein: bool = False,
+    index_dir: str = "",
+    compact_after: int = UPDATES_BEFORE_COMPACTION,
+) -> int:
+    """Remove features from a feature index without rebuilding it.
+
+    Args:
+        ids: The IDs of the features to remove
+
+    Keyword Args:
+        protein: Whether to remove from the protein, rather than DNA, index
+        index_dir: The index directory, the bundled DNA or protein index if empty
+        compact_after: Compact the index after this many updates
+
+    Returns:
+        The number of features removed
+    """
+
+    index_dir = index_dir or (PROTEIN_INDEX if protein else DNA_INDEX)
+    if not _seed_missing(index_dir, protein):
+        return 0
+
+    header = read_header(index_dir)
+    manifest = _manifest(index_dir, header)
+    removed = set(manifest["removed"])
+    ids = set(ids)
+
+    to_remove = [
+        i
+        for i, fid in enumerate(_ids(index_dir, header, manifest))
+        if fid in ids and i not in removed
+    ]
+    if not to_remove:
+        return 0
+
+    manifest["generation"] += 1
+    manifest["removed"] = sorted(removed.union(to_remove))
+    _update(index_dir, manifest, compact_after)
+
+    _release(index_dir)
+    return len(to_remove)
+
+
+def compact(index_dir: str):
+    """Merge the features added to and removed from an index into its arrays.
+
+    Until then, each process that opens the index merges them in memory.
+
+    Args:
+        index_dir: The index directory
+    """
+
+    manifest = read_manifest(index_dir)
+    if manifest is not None and (manifest["segments"] or manifest["removed"]):
+        index = KmerIndex.load(index_dir, mmap=False)
+        index.save(index_dir)  # the manifest no longer applies to this generation
+        write_manifest(
+            index_dir,
+            {
+                "base": index.generation,
+                "generation": index.generation,
+                "segments": [],
+                "removed": [],
+            },
+        )
+
+    _clear_updates(index_dir, keep_manifest=True)
+    _release(index_dir)
 
 
 def _id_map(filename: str, word_size: int) -> Dict[str, SeqRecord]:
     """Read in the database and create a map from unique ID to SeqRecord
-    
+
     Args:
         filename: DNA or protein database filename
         word_size: Minumum length word size for a feature
-    
+
     Returns:
         A map from unique ID (random) to the SeqRecord with a sequence
     """
@@ -105,29 +332,100 @@ def _id_map(filename: str, word_size: int) -> Dict[str, SeqRecord]:
     return id_map
 
 
-def _kmer_map(
-    id_map: Dict[str, SeqRecord], word_size: int
-) -> Dict[str, List[Tuple[str, int]]]:
-    """Create a map from kmer to the id of the matched feature
-    and the index of the match within the matched feature.
+def _seed_missing(index_dir: str, protein: bool) -> bool:
+    """Build a missing index from the id map pickle beside it, as `seed()` does.
 
     Args:
-        id_map: Map from SeqRecord ID to SeqRecord from _id_map
-        word_size: The length of each kmer word
-    
+        index_dir: The index directory
+        protein: Whether it's a protein, rather than DNA, index
+
     Returns:
-        A map from kmer to a list of tuples with:
-            1. the ID of the feature
-            2. the 0-based index of feature's start index
+        Whether there's an index in the directory now
     """
 
-    kmer_map: Dict[str, List[Tuple[str, int]]] = defaultdict(list)
+    if os.path.isfile(os.path.join(index_dir, HEADER)):
+        return True
+
+    id_map_pickle = os.path.join(
+        os.path.dirname(os.path.abspath(index_dir)),
+        os.path.basename(PROTEIN_ID_MAP_PICKLE if protein else DNA_ID_MAP_PICKLE),
+    )
+    if not os.path.isfile(id_map_pickle):
+        return False
+
+    with open(id_map_pickle, "rb") as id_map_file:
+        id_map = pickle.load(id_map_file)
+    if protein:
+        index = KmerIndex.build(id_map, PROTEIN_WORD_SIZE, PROTEIN_ALPHABET, 1)
+    else:
+        index = KmerIndex.build(
+            id_map,
+            len(DNA_SEED_PATTERN) or DNA_WORD_SIZE,
+            DNA_ALPHABET,
+            1,
+            pattern=DNA_SEED_PATTERN,
+            window=DNA_MINIMIZER_WINDOW,
+        )
+    index.save(index_dir)
+    _clear_updates(index_dir)
+    return True
+
+
+def _bundled(index_dir: str) -> bool:
+    """Return whether an index directory is one of the bundled indexes."""
+
+    bundled = [os.path.abspath(DNA_INDEX), os.path.abspath(PROTEIN_INDEX)]
+    return os.path.abspath(index_dir) in bundled
+
+
+def _manifest(index_dir: str, header: dict) -> dict:
+    """Read an index's manifest of updates, empty if it's missing or stale."""
+
+    generation = header.get("generation", 0)
+    manifest = read_manifest(index_dir)
+    if manifest is None or manifest["base"] != generation:
+        manifest = {
+            "base": generation,
+            "generation": generation,
+            "segments": [],
+            "removed": [],
+        }
+    return manifest
+
+
+def _ids(index_dir: str, header: dict, manifest: dict) -> List[str]:
+    """List the IDs of an index's features, then of those in each segment."""
+
+    ids = list(header["ids"])
+    for segment in manifest["segments"]:
+        ids.extend(read_header(os.path.join(index_dir, segment))["ids"])
+    return ids
+
+
+def _update(index_dir: str, manifest: dict, compact_after: int):
+    """Write the manifest of an index's updates, compacting if there are many."""
+
+    write_manifest(index_dir, manifest)
+    if manifest["generation"] - manifest["base"] >= compact_after:
+        compact(index_dir)
+
+
+def _clear_updates(index_dir: str, keep_manifest: bool = False):
+    """Delete the segments, and manifest, of an index's updates."""
+
+    manifest = read_manifest(index_dir)
+    if not keep_manifest and manifest is not None:
+        os.remove(os.path.join(index_dir, MANIFEST))
+
+    in_use = set(manifest["segments"]) if keep_manifest and manifest else set()
+    for name in os.listdir(index_dir):
+        if name.startswith(SEGMENT_PREFIX) and name not in in_use:
+            shutil.rmtree(os.path.join(index_dir, name))
 
-    for fid, feature in id_map.items():
-        seq = str(feature.seq)
-        for i in range(len(seq) - word_size + 1):
-            sub_seq = seq[i : i + word_size]
 
-            kmer_map[sub_seq].append((fid, i))
+def _release(index_dir: str):
+    """Reload the bundled feature database on next use, if it uses the index."""
 
-    return kmer_map
+    index_dirs = [FEATURE_DATABASE.dna_paths[0], FEATURE_DATABASE.protein_paths[0]]
+    if os.path.abspath(index_dir) in map(os.path.abspath, index_dirs):
+        FEATURE_DATABASE.release()
@@ -6,15 +6,16 @@ import sys
 from Bio.Seq import Seq
 import dgparse  # https://github.com/DeskGen/dgparse
 
-from .config import FEATURE_DIR
-
-
 # TODO: add dgparse and fuzzywuzzy to the environment
 
 if sys.version_info[0] > 2:
     raise RuntimeError("dgparse requires Python 2.")
 
 
+# run as a script by Python 2, which can't import synbio.features.config
+FEATURE_DIR = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "..", "..", "data", "features"
+)
 SNAPGENEDIR = os.path.join(FEATURE_DIR, "snapgene")
 DNA_FILE = os.path.join(SNAPGENEDIR, "dna.db")
 PROTEIN_FILE = os.path.join(SNAPGENEDIR, "protein.db")
@@ -0,0 +1,276 @@
+"""An indexed store of parsed iGEM parts and their features.
+
+Clustering needs every part parsed from the iGEM XML dump, but only looks up
+a few at a time. A PartStore keeps them in SQLite, one row per part and one
+per feature, so parts are read by ID (and features by their index on a part)
+without loading the rest into memory. Rows hold plain strings and integers
+rather than pickled SeqRecords, so a store outlives Biopython upgrades. A
+store also keeps a digest of the file its parts were parsed from, so it can
+be rebuilt when that file changes.
+"""
+
+import os
+import sqlite3
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from Bio.Alphabet.IUPAC import IUPACUnambiguousDNA
+from Bio.Seq import Seq
+from Bio.SeqFeature import FeatureLocation, SeqFeature
+from Bio.SeqRecord import SeqRecord
+
+ANNOTATIONS = ["short_desc", "description", "categories", "nickname", "type"]
+"""The annotations of a part that are stored, each in its own column."""
+
+BATCH_SIZE = 1000
+"""The number of parts inserted per statement when adding parts."""
+
+
+class PartStore:
+    """A SQLite store of iGEM parts as SeqRecords, with their features.
+
+    Parts keep the order they're first added in. Adding a part with the ID
+    of one in the store replaces it (and its features) in place, as a dict
+    would.
+
+    Args:
+        path: The path to the SQLite database, created if it doesn't exist
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid = 0
+
+    def add(self, records: Iterable[SeqRecord]):
+        """Add parts to the store, a batch at a time.
+
+        Args:
+            records: The SeqRecords of parts, with their features
+        """
+
+        batch: List[SeqRecord] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == BATCH_SIZE:
+                self._insert(batch)
+                batch = []
+        if batch:
+            self._insert(batch)
+
+    def get(self, part_id: str) -> SeqRecord:
+        """Get a part by its ID.
+
+        Args:
+            part_id: The part's ID, ex "BBa_J23104"
+
+        Raises:
+            KeyError: If there's no part with the ID
+
+        Returns:
+            The part's SeqRecord, with its features
+        """
+
+        row = (
+            self._connect()
+            .execute(
+                f"SELECT id, seq, {', '.join(ANNOTATIONS)} FROM parts WHERE id = ?",
+                (part_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(part_id)
+
+        features = self._connect().execute(
+            "SELECT id, start, end, strand, type FROM features "
+            "WHERE part_id = ? ORDER BY idx",
+            (part_id,),
+        )
+        return _record(row, [_feature(f) for f in features])
+
+    def feature(self, part_id: str, index: int) -> SeqFeature:
+        """Get one feature of a part by its index in the part's features.
+
+        Args:
+            part_id: The part's ID
+            index: The index of the feature in the part's SeqRecord.features
+
+        Raises:
+            KeyError: If the part has no feature at the index
+
+        Returns:
+            The feature
+        """
+
+        row = (
+            self._connect()
+            .execute(
+                "SELECT id, start, end, strand, type FROM features "
+                "WHERE part_id = ? AND idx = ?",
+                (part_id, index),
+            )
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError((part_id, index))
+        return _feature(row)
+
+    @property
+    def source(self) -> Optional[str]:
+        """A digest of the file the parts were parsed from, None if unknown."""
+
+        row = (
+            self._connect()
+            .execute("SELECT value FROM meta WHERE key = 'source'")
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    @source.setter
+    def source(self, digest: str):
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)",
+                (digest,),
+            )
+
+    def ids(self) -> Iterator[str]:
+        """Iterate over the IDs of the parts in the store, in order."""
+
+        for (part_id,) in self._connect().execute(
+            "SELECT id FROM parts ORDER BY rowid"
+        ):
+            yield part_id
+
+    def close(self):
+        """Close the connection to the SQLite database, if open."""
+
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __iter__(self) -> Iterator[SeqRecord]:
+        """Iterate over the parts in the store, in order, a batch at a time."""
+
+        last = 0
+        while True:
+            rows = (
+                self._connect()
+                .execute(
+                    f"SELECT rowid, id, seq, {', '.join(ANNOTATIONS)} FROM parts "
+                    "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, BATCH_SIZE),
+                )
+                .fetchall()
+            )
+            if not rows:
+                return
+            last = rows[-1][0]
+
+            part_ids = [row[1] for row in rows]
+            features: dict = {part_id: [] for part_id in part_ids}
+            for part_id, *feature in self._connect().execute(
+                "SELECT part_id, id, start, end, strand, type FROM features "
+                f"WHERE part_id IN ({', '.join('?' * len(part_ids))}) "
+                "ORDER BY part_id, idx",
+                part_ids,
+            ):
+                features[part_id].append(_feature(feature))
+
+            for row in rows:
+                yield _record(row[1:], features[row[1]])
+
+    def __contains__(self, part_id: object) -> bool:
+        row = (
+            self._connect()
+            .execute("SELECT 1 FROM parts WHERE id = ?", (part_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM parts").fetchone()[0]
+
+    def _insert(self, records: List[SeqRecord]):
+        """Insert or replace a batch of parts and their features."""
+
+        with self._connect() as db:
+            db.executemany(
+                f"INSERT INTO parts (id, seq, {', '.join(ANNOTATIONS)}) "
+                f"VALUES ({', '.join('?' * (len(ANNOTATIONS) + 2))}) "
+                "ON CONFLICT (id) DO UPDATE SET seq = excluded.seq, "
+                + ", ".join(f"{a} = excluded.{a}" for a in ANNOTATIONS),
+                [
+                    (r.id, str(r.seq), *(r.annotations.get(a, "") for a in ANNOTATIONS))
+                    for r in records
+                ],
+            )
+            db.executemany(
+                "DELETE FROM features WHERE part_id = ?", [(r.id,) for r in records]
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO features "
+                "(part_id, idx, id, start, end, strand, type) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        r.id,
+                        i,
+                        f.id,
+                        int(f.location.start),
+                        int(f.location.end),
+                        f.location.strand,
+                        f.type,
+                    )
+                    for r in records
+                    for i, f in enumerate(r.features)
+                ],
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connect to the SQLite database, once per process."""
+
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parts (id TEXT PRIMARY KEY, seq TEXT, "
+                + ", ".join(f"{a} TEXT" for a in ANNOTATIONS)
+                + ")"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS features (part_id TEXT, idx INTEGER, "
+                "id TEXT, start INTEGER, end INTEGER, strand INTEGER, type TEXT, "
+                "PRIMARY KEY (part_id, idx))"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+
+def _record(row: Tuple, features: List[SeqFeature]) -> SeqRecord:
+    """Create a part's SeqRecord from its row in the parts table."""
+
+    part_id, seq, *annotations = row
+    return SeqRecord(
+        Seq(seq, IUPACUnambiguousDNA()),
+        id=part_id,
+        dbxrefs=[part_id],
+        annotations=dict(zip(ANNOTATIONS, annotations)),
+        features=features,
+    )
+
+
+def _feature(row: Tuple) -> SeqFeature:
+    """Create a part's SeqFeature from its row in the features table."""
+
+    feature_id, start, end, strand, feature_type = row
+    return SeqFeature(
+        id=feature_id,
+        location=FeatureLocation(start, end, strand),
+        type=feature_type,
+        strand=strand,
+    )
@@ -0,0 +1,113 @@
+"""Translate DNA in all six reading frames at once.
+
+Annotation searches for protein features in each of the three forward and
+three reverse reading frames of a query. Rather than slicing and translating
+each frame with Bio.Seq, every codon in the sequence is packed into a 6-bit
+code (two bits per base) with NumPy and translated with a lookup table.
+Codons with ambiguous bases fall back to Bio.Seq so translations match it.
+"""
+
+import functools
+from itertools import product
+from typing import Tuple
+
+import numpy as np
+from Bio.Data.CodonTable import standard_dna_table
+from Bio.Seq import Seq
+
+from .index import DNA_ALPHABET, _symbol_table
+
+FRAME_CACHE_SIZE = 16
+"""The number of sequences whose six frames are kept for reuse."""
+
+Frames = Tuple[str, str, str, str, str, str]
+
+
+def translate_frames(seq: str, cache: bool = True) -> Frames:
+    """Translate a DNA sequence in all six reading frames.
+
+    The translations are the same as `str(Seq(frame).translate())`,
+    where each frame is trimmed to a multiple of three bp, with stop codons
+    as "*".
+
+    Args:
+        seq: The DNA sequence to translate
+
+    Keyword Args:
+        cache: Whether to reuse the translations of a sequence
+            that was recently translated
+
+    Returns:
+        The translations of the three forward frames, starting at the
+        first, second and third bp of the sequence, then the three reverse
+        frames, starting at the first, second and third bp of its reverse
+        complement
+    """
+
+    if cache:
+        return _translate_frames_cached(seq)
+    return _translate_frames(seq)
+
+
+def _translate_frames(seq: str) -> Frames:
+    """Translate a DNA sequence in all six reading frames, without caching."""
+
+    reverse = str(Seq(seq).reverse_complement())
+    forward_frames = _translate_strand(seq)
+    reverse_frames = _translate_strand(reverse)
+    return forward_frames + reverse_frames  # type: ignore
+
+
+_translate_frames_cached = functools.lru_cache(maxsize=FRAME_CACHE_SIZE)(
+    _translate_frames
+)
+
+
+def _translate_strand(seq: str) -> Tuple[str, str, str]:
+    """Translate the three forward frames of a DNA sequence.
+
+    Args:
+        seq: The DNA sequence to translate
+
+    Returns:
+        The translations of the frames starting at the first, second and third bp
+    """
+
+    symbols = _symbol_table(DNA_ALPHABET)[
+        np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)
+    ].astype(np.int64)
+    if len(symbols) < 3:
+        return ("", "", "")
+
+    # the code of the codon starting at every bp, 64 if it has an ambiguous base
+    codons = (symbols[:-2] << 4) | (symbols[1:-1] << 2) | symbols[2:]
+    ambiguous = (symbols[:-2] > 3) | (symbols[1:-1] > 3) | (symbols[2:] > 3)
+    codons[ambiguous] = 64
+
+    amino_acids = _codon_table()[codons]
+    for i in np.flatnonzero(ambiguous):
+        amino_acids[i] = ord(_translate_codon(seq[i : i + 3]))
+
+    frames = [amino_acids[i::3][: (len(seq) - i) // 3] for i in range(3)]
+    return tuple(f.tobytes().decode("ascii") for f in frames)  # type: ignore
+
+
+@functools.lru_cache(maxsize=1)
+def _codon_table() -> np.ndarray:
+    """Create a lookup table from codon code to amino acid byte."""
+
+    table = np.zeros(65, dtype=np.uint8)
+    for i, codon in enumerate(product(DNA_ALPHABET, repeat=3)):
+        codon_str = "".join(codon)
+        if codon_str in standard_dna_table.stop_codons:
+            table[i] = ord("*")
+        else:
+            table[i] = ord(standard_dna_table.forward_table[codon_str])
+    return table
+
+
+@functools.lru_cache(maxsize=1024)
+def _translate_codon(codon: str) -> str:
+    """Translate a codon with ambiguous bases with Bio.Seq."""
+
+    return str(Seq(codon).translate())
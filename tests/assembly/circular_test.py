@@ -0,0 +1,63 @@
+"""Test the search of circular sequences."""
+
+import random
+import unittest
+from unittest.mock import patch
+
+from Bio.Seq import reverse_complement
+
+from synbio.assembly.circular import CircularSeqs, canonical_rotation, least_rotation
+
+
+class TestCircular(unittest.TestCase):
+    """Find sequences within circular sequences, on either strand."""
+
+    def test_least_rotation(self):
+        """Find the rotation of a string that sorts first."""
+
+        rng = random.Random(0)
+        seqs = ["", "A", "AAAA", "ACAC", "CAAAC", "AACAA", "GATTACA"]
+        seqs += ["".join(rng.choice("AC") for _ in range(n)) for n in range(1, 60)]
+        seqs += ["".join(rng.choice("ACGT") for _ in range(500))]
+
+        for seq in seqs:
+            rotations = [seq[i:] + seq[:i] for i in range(len(seq))]
+            self.assertEqual(min(rotations, default=""), least_rotation(seq), seq)
+
+        self.assertEqual(
+            canonical_rotation("GATTACA"),
+            canonical_rotation(reverse_complement("ACAGATT")),
+        )
+
+    def test_contains(self):
+        """Match `query in seq + seq` for any added seq or its reverse complement."""
+
+        rng = random.Random(0)
+        base = "".join(rng.choice("ACGT") for _ in range(300))
+        seqs = [base[i:] + base[:i] for i in (0, 50)]  # rotations
+        seqs += [base[20:200], base[100:] + "GGGG" + base[:100]]
+        seqs += ["".join(rng.choice("ACGT") for _ in range(120))]
+
+        doubled = [s + s for s in seqs] + [reverse_complement(s + s) for s in seqs]
+
+        queries = [base, reverse_complement(base), base[:10], "ACGT" * 10]
+        for _ in range(300):
+            source = rng.choice(doubled + [base + "T" + base])
+            start = rng.randrange(len(source))
+            query = source[start : rng.randint(start + 1, len(source))]
+            if rng.random() < 0.2:
+                middle = len(query) // 2
+                query = query[:middle] + "A" + query[middle + 1 :]
+            queries.append(query)
+
+        # scanned, indexed after some queries, and indexed from the first one
+        for index_after in [10**9, 32, 0]:
+            with patch("synbio.assembly.circular.INDEX_AFTER", index_after):
+                circles = CircularSeqs()
+                for seq in seqs:
+                    circles.add(seq.lower())
+
+                for query in queries:
+                    self.assertEqual(
+                        any(query in d for d in doubled), query in circles, query
+                    )
@@ -1,15 +1,22 @@
 """Test Standard Restriction Digest Cloning."""
 
+import copy
 import os
+import tempfile
 import unittest
+from unittest.mock import patch
 
 from Bio import SeqIO
 from Bio.Restriction import AatII, BsaI, BpiI, BamHI, NotI, PciI
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
 
+from synbio.assembly import DigestCache
+from synbio.designs import CombinatorialBins
 from synbio.assembly.clone import (
     goldengate,
+    clone_bins,
+    clone_many_combinatorial,
     clone_combinatorial,
     _catalyze,
     _has_features,
@@ -59,6 +66,98 @@ class TestClone(unittest.TestCase):
 
         self.assertTrue(results)
 
+        shorter = clone_combinatorial(
+            [self.AB, self.BC, self.CD, self.DE, self.AE],
+            [BsaI, BpiI],
+            ["KanR"],
+            max_count=4,
+            linear=False,
+        )
+        self.assertFalse(shorter)
+
+    def test_clone_bins(self):
+        """Find the plasmids of a record from each bin without making record sets."""
+
+        design = CombinatorialBins(
+            [
+                [self.AB, read("J23100_AB.gb")],
+                [self.BC, read("B0033m_BC.gb")],
+                [self.CD],
+                [self.DE],
+                [self.AE, read("DVA_AE.gb"), self.BC],  # BC in two bins
+            ]
+        )
+
+        for include in [None, ["KanR"]]:
+            expected = clone_many_combinatorial(
+                design, [BsaI, BpiI], include=include, linear=False
+            )
+            self.assertTrue(expected)
+            if include is None:  # and records that form many plasmids
+                self.assertTrue(any(len(p) > 1 for p, _ in expected))
+            self.assertEqual(
+                results(expected),
+                results(goldengate(design, include=include, linear=False)),
+            )
+
+            # one plasmid at a time, not grouped by records
+            found = list(
+                clone_bins(design.bins, [BsaI, BpiI], include=include, linear=False)
+            )
+            self.assertTrue(all(len(plasmids) == 1 for plasmids, _ in found))
+            self.assertEqual(
+                sorted(str(p.seq) for plasmids, _ in expected for p in plasmids),
+                sorted(str(p.seq) for plasmids, _ in found for p in plasmids),
+            )
+
+        self.assertEqual(
+            results(
+                clone_many_combinatorial(
+                    design, [BsaI, BpiI], min_count=5, linear=False
+                )
+            ),
+            results(goldengate(design, min_count=5, linear=False)),
+        )
+
+    def test_clone_bins_religation(self):
+        """Skip plasmids in every record of a bin, as in every record set."""
+
+        record_set = [self.AB, self.BC, self.CD, self.DE, self.AE]
+        ((plasmid,), _), *_ = clone_combinatorial(
+            record_set, [BsaI, BpiI], include=["KanR"], linear=False
+        )
+
+        # a bin of the plasmid, already cloned, under two names. Every record
+        # set has one, so none forms the plasmid again, but neither is the
+        # only record of its bin or one the plasmid is from
+        products = [
+            SeqRecord(plasmid.seq, id="product1"),
+            SeqRecord(plasmid.seq, id="product2"),
+        ]
+        design = CombinatorialBins([[r] for r in record_set] + [products])
+
+        expected = clone_many_combinatorial(
+            design, [BsaI, BpiI], include=["KanR"], linear=False
+        )
+        found = goldengate(design, include=["KanR"], linear=False)
+
+        self.assertEqual(results(expected), results(found))
+        self.assertNotIn(
+            sorted(r.id for r in record_set),
+            [sorted(f.id for f in fragments) for _, fragments in found],
+        )
+
+        # with one product, it's a record of every record set
+        design = CombinatorialBins([[r] for r in record_set] + [products[:1]])
+        self.assertEqual(
+            results(
+                clone_many_combinatorial(
+                    design, [BsaI, BpiI], include=["KanR"], linear=False
+                )
+            ),
+            results(goldengate(design, include=["KanR"], linear=False)),
+        )
+
     def test_catalyze1(self):
         """Catalyze a sequence with BsaI/BpiI."""
 
@@ -154,6 +253,62 @@ class TestClone(unittest.TestCase):
             self.assertEqual(str(record.seq), expected[i][1].upper())
             self.assertEqual(right, expected[i][2])
 
+    def test_catalyze_cache(self):
+        """Digest a record once per enzymes and topology, then return copies."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "digests.db")
+            cache = DigestCache(size=4, path=path)
+            with patch("synbio.assembly.clone.CATALYZE_CACHE", cache):
+                digest = _catalyze(self.AE, [BsaI, BpiI], linear=False)
+                cached = _catalyze(self.AE, [BpiI, BsaI], linear=False)
+                _catalyze(self.AE, [BsaI], linear=False)
+                _catalyze(self.AE, [BsaI, BpiI], linear=True)
+
+                self.assertEqual((1, 3), (cache.hits, cache.misses))
+                self.assertEqual(
+                    [(left, str(f.seq), f.id, right) for left, f, right in digest],
+                    [(left, str(f.seq), f.id, right) for left, f, right in cached],
+                )
+                self.assertIsNot(digest[0][1], cached[0][1])
+
+                # the same id and sequence without features isn't a hit
+                bare = copy.deepcopy(self.AE)
+                bare.features = []
+                bare_digest = _catalyze(bare, [BsaI, BpiI], linear=False)
+                self.assertEqual((1, 4), (cache.hits, cache.misses))
+                self.assertEqual(
+                    [0] * len(digest), [len(f.features) for _, f, _ in bare_digest]
+                )
+                self.assertTrue(any(f.features for _, f, _ in digest))
+
+            cache.close()
+            cache = DigestCache(size=0, path=path)  # a later run
+            with patch("synbio.assembly.clone.CATALYZE_CACHE", cache):
+                with patch("synbio.assembly.clone.RestrictionBatch") as batch:
+                    persisted = _catalyze(self.AE, [BsaI, BpiI], linear=False)
+                    batch.assert_not_called()
+            self.assertEqual(len(digest), len(persisted))
+            self.assertEqual(1, cache.hits)
+            cache.close()
+
+    def test_digest_cache_key(self):
+        """Key digests on the record's sequence, ids and feature locations."""
+
+        key = DigestCache.key(self.AE, [BsaI, BpiI], False)
+        self.assertEqual(
+            key, DigestCache.key(copy.deepcopy(self.AE), [BpiI, BsaI], False)
+        )
+        self.assertNotEqual(key, DigestCache.key(self.AE, [BsaI, BpiI], True))
+
+        moved = copy.deepcopy(self.AE)
+        moved.features[0] = moved.features[0]._shift(1)
+        self.assertNotEqual(key, DigestCache.key(moved, [BsaI, BpiI], False))
+
+        renamed = copy.deepcopy(self.AE)
+        renamed.id = "renamed"
+        self.assertNotEqual(key, DigestCache.key(renamed, [BsaI, BpiI], False))
+
     def test_has_features(self):
         """Find a KanR include feature in a DVK sequence."""
 
@@ -193,6 +348,18 @@ class TestClone(unittest.TestCase):
         self.assertEqual("123", _hash_fragments([r2, r3, r1]))
 
 
+def results(plasmids_and_fragments):
+    """The fragments, in order, and the plasmids' ids and seqs of each assembly."""
+
+    return sorted(
+        (
+            [f.id for f in fragments],
+            [(p.id, str(p.seq), p.description) for p in plasmids],
+        )
+        for plasmids, fragments in plasmids_and_fragments
+    )
+
+
 def read(filename):
     """Read in a single Genbank file from the test directory."""
 
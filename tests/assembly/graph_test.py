@@ -0,0 +1,76 @@
+"""Test the graph of fragments by overhang."""
+
+from itertools import product
+import unittest
+from unittest.mock import patch
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from networkx.algorithms.cycles import simple_cycles
+
+from synbio.assembly.graph import OverhangGraph
+
+
+class TestOverhangGraph(unittest.TestCase):
+    """Find cycles of overhangs and the fragments that fill them."""
+
+    def setUp(self):
+        """Create a graph with a 3 fragment and a 2 fragment cycle."""
+
+        self.graph = OverhangGraph()
+        for left, name, right in [
+            ("A", "a1", "B"),
+            ("B", "b1", "C"),
+            ("A", "a2", "B"),
+            ("C", "c1", "A"),
+            ("C", "c2", "B"),
+            ("B", "b2", "C"),
+            ("D", "d1", "A"),
+        ]:
+            self.graph.add(left, SeqRecord(Seq("ATGC"), id=name), right)
+
+    def test_cycles(self):
+        """Find cycles with between min_count and max_count overhangs."""
+
+        cycles = {tuple(sorted(c)) for c in self.graph.cycles()}
+        self.assertEqual({("A", "B", "C"), ("B", "C")}, cycles)
+        self.assertEqual([["A", "B", "C"], ["B", "C"]], list(self.graph.cycles()))
+
+        self.assertEqual([3], [len(c) for c in self.graph.cycles(min_count=3)])
+        self.assertEqual([2], [len(c) for c in self.graph.cycles(max_count=2)])
+        self.assertEqual([], list(self.graph.cycles(min_count=3, max_count=2)))
+
+    def test_cycles_unbounded(self):
+        """Filter cycles by length if simple_cycles() has no length_bound."""
+
+        def unbounded(graph):  # networkx < 3.1
+            return simple_cycles(graph)
+
+        with patch("synbio.assembly.graph.simple_cycles", unbounded):
+            self.assertEqual([2], [len(c) for c in self.graph.cycles(max_count=2)])
+            self.assertEqual(2, len(list(self.graph.cycles())))
+
+    def test_assemblies(self):
+        """Combine the fragments of each cycle's bins, the last bin fastest."""
+
+        cycle = next(self.graph.cycles(min_count=3))
+        cycle = cycle[cycle.index("A") :] + cycle[: cycle.index("A")]
+        self.assertEqual(
+            [["a1", "a2"], ["b1", "b2"], ["c1"]],
+            [[f.id for f in b] for b in self.graph.bins(cycle)],
+        )
+
+        cycle = next(self.graph.cycles(min_count=3))  # from any overhang
+        assemblies = [[f.id for f in a] for a in self.graph.assemblies(min_count=3)]
+        self.assertEqual(4, len(assemblies))
+        self.assertEqual(
+            [[f.id for f in a] for a in product(*self.graph.bins(cycle))],
+            assemblies,
+        )
+        self.assertEqual(
+            {("b1", "c2"), ("b2", "c2")},
+            {
+                tuple(sorted(f.id for f in a))
+                for a in self.graph.assemblies(max_count=2)
+            },
+        )
@@ -56,6 +56,42 @@ class TestDesign(unittest.TestCase):
         self.assertEqual(self.seq_list(expected), self.seq_list(list(bins)))
         self.assertEqual("combinatorial_bins", bins.__name__)
 
+    def test_combinatorial_bins_index(self):
+        """Count, index and shard combinations without iterating over them."""
+
+        bins = CombinatorialBins(
+            [[self.r1, self.r2], [self.r3], [self.r4, self.r5, self.r1]]
+        )
+        combinations = list(bins)
+
+        self.assertEqual(6, bins.combination_count())
+        self.assertEqual(0, CombinatorialBins().combination_count())
+        self.assertEqual([], list(CombinatorialBins()))
+
+        self.assertEqual(
+            self.seq_list(combinations),
+            self.seq_list([bins.combination(i) for i in range(6)]),
+        )
+        self.assertEqual(
+            self.seq_list(combinations[-1:]), self.seq_list([bins.combination(-1)])
+        )
+        with self.assertRaises(IndexError):
+            bins.combination(6)
+
+        for n in [1, 4, 6, 7]:
+            shards = [list(bins.shard(k, n)) for k in range(n)]
+            self.assertEqual(
+                self.seq_list(combinations),
+                self.seq_list([c for shard in shards for c in shard]),
+            )
+        with self.assertRaises(ValueError):
+            bins.shard(2, 2)
+
+        self.assertEqual(
+            [str(r.seq) for r in [self.r1, self.r3, self.r4, self.r5]],  # r2 is r5
+            [str(r.seq) for r in bins.get_all_records()],
+        )
+
     def test_get_all_records(self):
         """Get all unique records out of a design."""
 
@@ -1,20 +1,36 @@
 """Test SeqRecord annotation."""
 
+from collections import defaultdict
+import os
+import tempfile
+from typing import Dict, List
 import unittest
 
+from Bio import SeqIO
 from Bio.SeqFeature import SeqFeature, FeatureLocation
 from Bio.SeqRecord import SeqRecord
 
 from synbio.features.annotate import (
+    _chain_hits,
     _cull,
     _filter_hits,
     _get_features,
+    _get_hit_arrays,
     _get_hits,
     _get_matches,
     _reduce_hits,
     annotate,
+    annotate_file,
+    annotate_many,
     Hit,
+    main,
 )
+from synbio.features.database import FEATURE_DATABASE, FeatureDatabase
+from synbio.features.index import DNA_ALPHABET, KmerIndex
+from synbio.features.seed import seed
+
+DIR_NAME = os.path.abspath(os.path.dirname(__file__))
+TEST_DIR = os.path.join(DIR_NAME, "..", "..", "data")
 
 
 class TestAnnotate(unittest.TestCase):
@@ -31,6 +47,91 @@ class TestAnnotate(unittest.TestCase):
         self.assertEqual(0, len(record.features))
         self.assertTrue(len(annotated_record.features) > 1)
 
+    def test_annotate_many(self):
+        """Annotate records over a process pool, in input order."""
+
+        seq = "ttgacagctagctcagtcctaggtataatgctagctactagagaaagaggagaaatactagatggcttcctccgaagacgttatcaaagagttcatgcgtttcaaagttcgtatggaaggttccgttaacggtcacgagttcgaaatcgaaggtgaaggtgaaggtcgtccgtacgaaggtacccagaccgctaaactgaaagttaccaaaggtggtccgctgccgttcgcttgggacatcctgtccccgcagttccagtacggttccaaagcttacgttaaacacccggctgacatcccggactacctgaaactgtccttcccggaaggtttcaaatgggaacgtgttatgaacttcgaagacggtggtgttgttaccgttacccaggactcctccctgcaagacggtgagttcatctacaaagttaaactgcgtggtaccaacttcccgtccgacggtccggttatgcagaaaaaaaccatgggttgggaagcttccaccgaacgtatgtacccggaagacggtgctctgaaaggtgaaatcaaaatgcgtctgaaactgaaagacggtggtcactacgacgctgaagttaaaaccacctacatggctaaaaaaccggttcagctgccgggtgcttacaaaaccgacatcaaactggacatcacctcccacaacgaagactacaccatcgttgaacagtacgaacgtgctgaaggtcgtcactccaccggtgcttaataacgctgatagtgctagtgtagatcgctactagagccaggcatcaaataaaacgaaaggctcagtcgaaagactgggcctttcgttttatctgttgtttgtcggtgaacgctctctactagagtcacactggctcaccttcgggtgggcctttctgcgtttata"
+        records = [SeqRecord(seq[:700]), SeqRecord(seq), SeqRecord(seq[300:])]
+
+        annotated = list(annotate_many(records, processes=2, chunksize=1))
+
+        self.assertEqual(3, len(annotated))
+        for record, annotated_record in zip(records, annotated):
+            expected = annotate(record)
+            self.assertEqual(str(record.seq).upper(), str(annotated_record.seq))
+            self.assertEqual(
+                [(f.id, f.location.start) for f in expected.features],
+                [(f.id, f.location.start) for f in annotated_record.features],
+            )
+
+    def test_annotate_databases(self):
+        """Annotate with a private feature library layered over the bundled one."""
+
+        part = "GTCCAGTAGCATTGCGCTGGATCCATACGTCAAGTGCATCAGCGGATTGCGTAAC"
+        record = SeqIO.read(os.path.join(TEST_DIR, "gibson", "pDusk.fa"), "fasta")
+        record = record[:2000] + part + record[2000:]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "dna.db"), "w") as db:
+                db.write(f">ourPart|misc_feature|our lab's part\n{part}\n")
+            seed(tmp)
+            ours = FeatureDatabase.from_directory(tmp)
+
+            bundled = annotate(record)
+            layered = annotate(record, databases=[FEATURE_DATABASE, ours])
+            many = next(annotate_many([record], processes=2, databases=[ours]))
+
+        ours_features = [f for f in layered.features if f.id == "ourPart"]
+        self.assertNotIn("ourPart", [f.id for f in bundled.features])
+        self.assertEqual(
+            sorted(f.id for f in bundled.features),
+            sorted(f.id for f in layered.features if f.id != "ourPart"),
+        )
+        self.assertEqual(1, len(ours_features))
+        self.assertEqual(2000, ours_features[0].location.start)
+        self.assertEqual(2000 + len(part), ours_features[0].location.end)
+        self.assertEqual(["ourPart"], [f.id for f in many.features])
+
+    def test_annotate_file(self):
+        """Annotate each record in a FASTA file and write them to GenBank."""
+
+        record = SeqIO.read(os.path.join(TEST_DIR, "gibson", "pDusk.fa"), "fasta")
+        records = [record[:3000], record, record[2000:]]
+        for i, r in enumerate(records):
+            r.id = f"r{i}"
+
+        progress: List[int] = []
+        with tempfile.TemporaryDirectory() as tmp:
+            in_path = os.path.join(tmp, "in.fasta")
+            out_path = os.path.join(tmp, "out.gb")
+            SeqIO.write(records, in_path, "fasta")
+
+            count = annotate_file(
+                in_path, out_path, progress=lambda n, bp, s: progress.append(n)
+            )
+            written = list(SeqIO.parse(out_path, "genbank"))
+
+            main([in_path, out_path, "--quiet", "--processes", "2"])
+            written_pool = list(SeqIO.parse(out_path, "genbank"))
+
+        self.assertEqual(3, count)
+        self.assertEqual([1, 2, 3], progress)
+        for r, w, w_pool in zip(records, written, written_pool):
+            expected = [
+                (f.location.start, f.location.end, f.qualifiers.get("label"))
+                for f in annotate(r).features
+            ]
+            self.assertTrue(expected)
+            self.assertEqual(r.id, w.id)
+            for out in (w, w_pool):
+                self.assertEqual(
+                    expected,
+                    [
+                        (f.location.start, f.location.end, f.qualifiers.get("label"))
+                        for f in out.features
+                    ],
+                )
+
     def test_get_features_dna(self):
         """Get a list of DNA features for a SeqRecord."""
 
@@ -81,6 +182,32 @@ class TestAnnotate(unittest.TestCase):
         self.assertEqual(feature2.location.end, 46)
         self.assertEqual(feature2.location.strand, -1)
 
+    def test_get_features_gapped(self):
+        """Get DNA features with indels relative to the query when gapped."""
+
+        feature = "TCCTCCCGGCAGCAAAAAAGGGCTCAAGACCCGTTTAGAGGCCCCAAGG"
+        subject_map = {
+            "s1": SeqRecord(
+                feature, id="s1", name="mock1", annotations={"type": "promoter"}
+            )
+        }
+        index = KmerIndex.build(subject_map, 9, DNA_ALPHABET)
+        # two bp deleted from and one inserted into the feature
+        query = "GGATATAGT" + feature[:20] + feature[22:35] + "T" + feature[35:]
+        seq = query + "ATGCTAGTTATTGCTCAGCGGTGGCAGCAGCCAACTCAGCTTCCTTTCGG"
+
+        ungapped = _get_features(seq, index, subject_map, 0.9, True, False)
+        gapped = _get_features(seq, index, subject_map, 0.9, True, False, True)
+
+        self.assertEqual([], ungapped)
+        self.assertEqual(1, len(gapped))
+        self.assertEqual(9, gapped[0].location.start)
+        self.assertEqual(len(query), gapped[0].location.end)
+        self.assertEqual(93.9, gapped[0].qualifiers["identity"])
+        self.assertEqual(3, gapped[0].qualifiers["gaps"])
+        self.assertEqual("promoter", gapped[0].qualifiers["type"])
+        self.assertNotIn("gaps", subject_map["s1"].annotations)
+
     def test_get_features_protein(self):
         """Get a list of protein features for a SeqRecord."""
 
@@ -129,6 +256,25 @@ class TestAnnotate(unittest.TestCase):
 
         self.assertEqual(2, len(hits))
 
+    def test_get_hit_arrays(self):
+        """Get kmer hits, as arrays, against a query sequence."""
+
+        seq = "ATGATACAGATACGAAAGTATGGAT"
+        rid = "asdf"
+        id_map = {rid: SeqRecord("ATGGAT", id=rid)}
+        kmers = {"ATG": [(rid, 0)], "GAT": [(rid, 3)], "TGG": [(rid, 1)]}
+        index = KmerIndex.from_kmer_map(kmers, id_map, DNA_ALPHABET)
+
+        for circular in [True, False]:
+            hits = _get_hits(seq, kmers, id_map, circular)
+            hit_arrays = _get_hit_arrays(seq, index, circular)
+
+            self.assertEqual(
+                [(h.query_loc, h.subject_loc) for h in hits],
+                list(zip(hit_arrays.query_locs, hit_arrays.subject_locs)),
+            )
+            self.assertTrue(all(s == 0 for s in hit_arrays.subjects))
+
     def test_filter_hits(self):
         """Filter out hits that don't show up enough."""
 
@@ -181,6 +327,55 @@ class TestAnnotate(unittest.TestCase):
         self.assertEqual(match.subject_start, 1)
         self.assertEqual(match.subject_end, 12)
 
+    def test_chain_hits(self):
+        """Chain hits by diagonal and extend them like the reference implementation."""
+
+        query = "TCTCATGTGATATCGGATCTCATGTGATATCACTCAGGTGATAT"
+        subject1 = SeqRecord("ACTCATGTGATAT", id="s1", name="feature1")
+        subject2 = SeqRecord("GATCTCATGTG", id="s2", name="feature2")
+        subject_map = {"s1": subject1, "s2": subject2}
+        kmer_map = {
+            "TCATG": [("s1", 2), ("s2", 4)],
+            "CATGT": [("s1", 3), ("s2", 5)],
+            "TGATA": [("s1", 7)],
+            "GATCT": [("s2", 0)],
+        }
+        index = KmerIndex.from_kmer_map(kmer_map, subject_map, DNA_ALPHABET)
+
+        for identity in [0.7, 0.9, 0.95]:
+            hits = _get_hits(query, kmer_map, subject_map, True)
+            expected = _get_matches(
+                query, _reduce_hits(_filter_hits(query, hits)), identity
+            )
+
+            matches = _chain_hits(
+                query, _get_hit_arrays(query, index, True), index, subject_map, identity
+            )
+
+            self.assertTrue(expected)
+            self.assertEqual(
+                [
+                    (
+                        m.subject.id,
+                        m.query_start,
+                        m.query_end,
+                        m.subject_start,
+                        m.subject_end,
+                    )
+                    for m in expected
+                ],
+                [
+                    (
+                        m.subject.id,
+                        m.query_start,
+                        m.query_end,
+                        m.subject_start,
+                        m.subject_end,
+                    )
+                    for m in matches
+                ],
+            )
+
     def test_cull(self):
         """Remove features that have high overlap with one another."""
 
@@ -196,3 +391,66 @@ class TestAnnotate(unittest.TestCase):
         self.assertEqual(2, len(features))
         self.assertTrue(all(f.id in ("1", "3") for f in features))
 
+    def test_cull_reference(self):
+        """Cull features like the per-bp reference implementation."""
+
+        features = []
+        for filename in ["cloning/pdusk.gb", "cloning/pdsred2.gb", "gibson/pDusk.fa"]:
+            fmt = "fasta" if filename.endswith(".fa") else "genbank"
+            record = SeqIO.read(os.path.join(TEST_DIR, filename), fmt)
+            seq = str(record.seq)
+            features.append((seq, annotate(SeqRecord(seq), cull=False).features))
+
+        # features that share IDs and cross the 1-index
+        seq = "ATGATAGACAGATAGAGATAGATGGGGAGA"
+        features.append(
+            (
+                seq,
+                [
+                    SeqFeature(FeatureLocation(-4, 6, strand=-1), id="1"),
+                    SeqFeature(FeatureLocation(24, 29, strand=1), id="2"),
+                    SeqFeature(FeatureLocation(2, 9, strand=1), id="3"),
+                    SeqFeature(FeatureLocation(5, 12, strand=1), id="3"),
+                    SeqFeature(FeatureLocation(4, 10, strand=1), id="4"),
+                ],
+            )
+        )
+
+        for seq, seq_features in features:
+            for identity in [0.5, 0.8, 0.95, 1.0]:
+                self.assertEqual(
+                    _cull_reference(seq, seq_features, identity),
+                    _cull(seq, seq_features, identity),
+                )
+
+
+def _cull_reference(
+    seq: str, features: List[SeqFeature], identity: float
+) -> List[SeqFeature]:
+    """The per-bp implementation of _cull, before it swept over feature ranges."""
+
+    features = sorted(features, key=len, reverse=True)
+
+    hits: List[List[str]] = []
+    for _ in range(len(seq)):
+        hits.append([])
+
+    features_unculled: List[SeqFeature] = []
+    for feature in features:
+        overlaps: Dict[str, int] = defaultdict(int)
+        for i in range(int(feature.location.start), int(feature.location.end) + 1):
+            for overlap in hits[i]:
+                overlaps[overlap] += 1
+            hits[i].append(feature.id)
+
+        cull = False
+        overlap_threshold = identity * len(feature)
+        for overlap, count in overlaps.items():
+            if count >= overlap_threshold:
+                cull = True
+                break
+
+        if not cull:
+            features_unculled.append(feature)
+
+    return features_unculled
@@ -0,0 +1,120 @@
+"""Test the phased build of the feature databases."""
+
+import functools
+import os
+import tempfile
+import unittest
+
+from synbio.features.build import Phase, build
+
+
+def _copy(in_path: str, out_path: str):
+    """A phase that copies a file, a record per line."""
+
+    with open(in_path) as in_file, open(out_path, "w") as out_file:
+        out_file.write(in_file.read())
+
+
+def _count(path: str):
+    """Count the lines of a file."""
+
+    with open(path) as opened:
+        return {"lines": len(opened.readlines())}
+
+
+def _fail():
+    """A phase that fails."""
+
+    raise ValueError("bad input")
+
+
+class TestBuild(unittest.TestCase):
+    """Run phases, skipping those whose inputs are unchanged."""
+
+    def setUp(self):
+        """Create a two phase build: in.txt -> mid.txt -> out.txt."""
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths = {
+            n: os.path.join(self.tmp.name, n + ".txt") for n in ["in", "mid", "out"]
+        }
+        self.state = os.path.join(self.tmp.name, "state.json")
+        self.write("in", "a\nb\n")
+
+        self.phases = [
+            Phase(
+                name,
+                [self.paths[source]],
+                [self.paths[target]],
+                functools.partial(_copy, self.paths[source], self.paths[target]),
+                functools.partial(_count, self.paths[target]),
+            )
+            for name, source, target in [
+                ("first", "in", "mid"),
+                ("second", "mid", "out"),
+            ]
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name: str, content: str):
+        """Write the content of one of the build's files."""
+
+        with open(self.paths[name], "w") as opened:
+            opened.write(content)
+
+    def skipped(self, phases=None):
+        """Run the build and return whether each phase was skipped."""
+
+        report = build(phases or self.phases, self.state, quiet=True)
+        return [p["skipped"] for p in report["phases"]]
+
+    def test_report(self):
+        """Report each phase's time, memory and records."""
+
+        report = build(self.phases, self.state, quiet=True)
+
+        self.assertEqual(["first", "second"], [p["name"] for p in report["phases"]])
+        for phase in report["phases"]:
+            self.assertFalse(phase["skipped"])
+            self.assertGreaterEqual(phase["wall_seconds"], 0)
+            self.assertGreaterEqual(phase["cpu_seconds"], 0)
+            self.assertGreater(phase["peak_rss_mb"], 0)
+            self.assertEqual({"lines": 2}, phase["records"])
+        self.assertGreaterEqual(report["wall_seconds"], 0)
+
+        report = build(self.phases, self.state, quiet=True)
+        self.assertIsNone(report["phases"][0]["cpu_seconds"])
+        self.assertEqual({"lines": 2}, report["phases"][1]["records"])
+
+    def test_skip(self):
+        """Skip phases whose inputs' content and outputs are unchanged."""
+
+        self.assertEqual([False, False], self.skipped())
+        self.assertEqual([True, True], self.skipped())
+
+        self.write("in", "a\nb\n")  # rewritten, but the same
+        self.assertEqual([True, True], self.skipped())
+
+        self.write("out", "changed\n")
+        self.assertEqual([True, False], self.skipped())
+
+        self.write("in", "a\nb\nc\n")
+        self.assertEqual([False, False], self.skipped())
+
+        os.remove(self.paths["mid"])
+        self.assertEqual([False, True], self.skipped())  # the same mid.txt again
+
+        report = build(self.phases, self.state, force=True, quiet=True)
+        self.assertEqual([False, False], [p["skipped"] for p in report["phases"]])
+
+    def test_failure(self):
+        """Raise on a failed phase, keeping the state of the phases before it."""
+
+        failing = [self.phases[0], self.phases[1]._replace(run=_fail)]
+        with self.assertRaises(RuntimeError) as raised:
+            build(failing, self.state, quiet=True)
+        self.assertIn("ValueError: bad input", str(raised.exception))
+
+        self.assertEqual([True, False], self.skipped())
@@ -0,0 +1,88 @@
+"""Test memoization of annotation results."""
+
+import os
+import tempfile
+import unittest
+
+from Bio.SeqFeature import SeqFeature, FeatureLocation
+from Bio.SeqRecord import SeqRecord
+
+from synbio.features import AnnotationCache, annotate, annotate_many
+
+
+class TestAnnotationCache(unittest.TestCase):
+    """Cache features by sequence, settings and database version."""
+
+    def setUp(self):
+        self.features = [SeqFeature(FeatureLocation(1, 10, strand=1), id="1")]
+
+    def test_key(self):
+        """Key on the sequence, any case, and annotation settings."""
+
+        key = AnnotationCache.key("ATGC", 0.95, True, True, False, "v1")
+
+        self.assertEqual(
+            key, AnnotationCache.key("atgc", 0.95, True, True, False, "v1")
+        )
+        self.assertNotEqual(
+            key, AnnotationCache.key("ATGC", 0.9, True, True, False, "v1")
+        )
+        self.assertNotEqual(
+            key, AnnotationCache.key("ATGC", 0.95, True, True, False, "v2")
+        )
+
+    def test_lru(self):
+        """Drop the least recently used features over the size limit."""
+
+        cache = AnnotationCache(size=2)
+        cache.put("a", self.features)
+        cache.put("b", self.features)
+        cache.get("a")
+        cache.put("c", self.features)
+
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual("1", cache.get("a")[0].id)
+        self.assertIsNot(cache.get("a")[0], cache.get("a")[0])
+        self.assertEqual((4, 1), (cache.hits, cache.misses))
+
+    def test_sqlite(self):
+        """Keep features in SQLite between caches."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "annotations.db")
+
+            cache = AnnotationCache(size=0, path=path)
+            cache.put("a", self.features)
+            cache.close()
+
+            cache = AnnotationCache(path=path)
+            self.assertEqual(10, cache.get("a")[0].location.end)
+            self.assertEqual(1, cache.hits)
+            cache.clear()
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+
+    def test_annotate(self):
+        """Annotate a sequence once, then return its cached features."""
+
+        seq = "ttgacagctagctcagtcctaggtataatgctagctactagagaaagaggagaaatactagatggcttcctccgaagacgttatcaaagagttcatgcgtttcaaagttcgtatggaaggttccgttaacggtcacgagttcgaaatcgaaggtgaaggtgaaggtcgtccgtacgaaggtacccagaccgctaaactgaaagttaccaaaggtggtccgctgccgttcgcttgggacatcctgtccccgcagttccagtacggttccaaagcttacgttaaacacccggctgacatcccggactacctgaaactgtccttcccggaaggtttcaaatgggaacgtgttatgaacttcgaagacggtggtgttgttaccgttacccaggactcctccctgcaagacggtgagttcatctacaaagttaaactgcgtggtaccaacttcccgtccgacggtccggttatgcagaaaaaaaccatgggttgggaagcttccaccgaacgtatgtacccggaagacggtgctctgaaaggtgaaatcaaaatgcgtctgaaactgaaagacggtggtcactacgacgctgaagttaaaaccacctacatggctaaaaaaccggttcagctgccgggtgcttacaaaaccgacatcaaactggacatcacctcccacaacgaagactacaccatcgttgaacagtacgaacgtgctgaaggtcgtcactccaccggtgcttaataacgctgatagtgctagtgtagatcgctactagagccaggcatcaaataaaacgaaaggctcagtcgaaagactgggcctttcgttttatctgttgtttgtcggtgaacgctctctactagagtcacactggctcaccttcgggtgggcctttctgcgtttata"
+        cache = AnnotationCache()
+
+        expected = annotate(SeqRecord(seq), cache=cache)
+        cached = annotate(SeqRecord(seq, id="other"), cache=cache)
+        many = list(
+            annotate_many(
+                [SeqRecord(seq), SeqRecord(seq[:600])], processes=2, cache=cache
+            )
+        )
+
+        locations = [(f.id, f.location.start) for f in expected.features]
+        self.assertTrue(locations)
+        self.assertEqual(locations, [(f.id, f.location.start) for f in cached.features])
+        self.assertEqual("other", cached.id)
+        self.assertEqual(
+            locations, [(f.id, f.location.start) for f in many[0].features]
+        )
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+        self.assertEqual(2, len(cache))
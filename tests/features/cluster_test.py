@@ -1,11 +1,26 @@
 """Test clustering functions."""
 
+import os
+import pickle
+import tempfile
 import unittest
+from unittest.mock import patch
 
 from Bio.Seq import Seq
 from Bio.SeqRecord import SeqRecord
+from fuzzywuzzy import fuzz
 
-from synbio.features.cluster import _parse_row, _consensus_name
+from synbio.features.cluster import (
+    _byte_ranges,
+    _consensus_name,
+    _consensus_record,
+    _consensus_records,
+    _iter_igem_records,
+    _parse_igem_data,
+    _parse_row,
+    _parts_current,
+    _token_set_sums,
+)
 
 
 class TestCluster(unittest.TestCase):
@@ -80,6 +95,95 @@ margin-bottom: 5px;
             len(record.features), 3
         )  # only three are greater than the default word size
 
+    def test_iter_igem_records(self):
+        """Stream records from an iGEM XML dump in chunks and byte ranges."""
+
+        rows = []
+        for i in range(12):
+            rows.append(f"""<row>
+                <field name="part_name">BBa_K{i:04d}</field>
+                <field name="short_desc">part {i} \u00e9</field>
+                <field name="description" xsi:nil="true" />
+                <field name="part_type">{"Coding" if i % 2 else "Terminator"}</field>
+                <field name="nickname">{"" if i % 3 else f"nick{i}"}</field>
+                <field name="categories">//cds</field>
+                <field name="sequence">{"atgc" * (i + 5) if i != 4 else ""}</field>
+                <field name="seq_edit_cache">&lt;script&gt; var seqFeatures = new Array( ['cds',1,{i + 15},'F{i}', 0]); var subParts = null;
+                &lt;/script&gt;</field>
+                </row>
+                """)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "igem.xml")
+            with open(path, "w") as dump:
+                dump.write("<database>\n" + "".join(rows) + "</database>\n")
+
+            expected = [_parse_row(row) for row in "".join(rows).split("<row>")]
+            expected = [(r.id, str(r.seq), r.annotations) for r in expected if r]
+            self.assertEqual(11, len(expected))
+            self.assertEqual("part 0 \u00e9", expected[0][2]["short_desc"])
+
+            for kwargs in [
+                {},
+                {"chunk_size": 7},
+                {"chunk_size": 64, "processes": 2, "range_size": 500},
+            ]:
+                records = list(_iter_igem_records(path, **kwargs))
+                self.assertEqual(
+                    expected, [(r.id, str(r.seq), r.annotations) for r in records]
+                )
+                self.assertEqual(["F1"], [f.id for f in records[1].features])
+
+            ranges = _byte_ranges(path, 500)
+            self.assertGreater(len(ranges), 2)
+            self.assertEqual(0, ranges[0][0])
+            self.assertEqual(os.path.getsize(path), ranges[-1][1])
+            with open(path, "rb") as dump:
+                for start, _ in ranges[1:]:
+                    dump.seek(start)
+                    self.assertEqual(b"<row>", dump.read(5))
+
+    def test_parse_igem_data(self):
+        """Rebuild the parts store from a changed XML, not an older igem.pickle."""
+
+        def dump(path: str, seq: str):
+            with open(path, "w") as xml:
+                xml.write(
+                    "<database>\n<row>\n"
+                    '<field name="part_name">BBa_J23104</field>\n'
+                    '<field name="short_desc">promoter</field>\n'
+                    '<field name="part_type">Regulatory</field>\n'
+                    f'<field name="sequence">{seq}</field>\n'
+                    "</row>\n</database>\n"
+                )
+
+        with tempfile.TemporaryDirectory() as tmp:
+            igem = os.path.join(tmp, "igem.xml")
+            parts_path = os.path.join(tmp, "parts.sqlite")
+            pickled = os.path.join(tmp, "igem.pickle")
+            with patch.multiple(
+                "synbio.features.cluster",
+                IGEM=igem,
+                PARTS=parts_path,
+                ID_TO_RECORD=pickled,
+            ):
+                dump(igem, "ttgacagct")
+                self.assertFalse(_parts_current())
+                parts = _parse_igem_data()
+                self.assertTrue(_parts_current())
+                self.assertEqual("ttgacagct", str(parts.get("BBa_J23104").seq))
+                parts.close()
+
+                with open(pickled, "wb") as record_file:
+                    pickle.dump({"BBa_J23104": parts.get("BBa_J23104")}, record_file)
+                os.utime(pickled, (0, 0))
+                dump(igem, "ttgacagctagc")
+                self.assertFalse(_parts_current())
+                parts = _parse_igem_data()
+                self.assertTrue(_parts_current())
+                self.assertEqual("ttgacagctagc", str(parts.get("BBa_J23104").seq))
+                parts.close()
+
     def test_consensus_name(self):
         """Find a consensus name for a list of SeqRecords."""
 
@@ -118,3 +222,79 @@ margin-bottom: 5px;
 
         self.assertEqual("FRT", feature_name)
 
+    def test_token_set_sums(self):
+        """Sum token set ratios like a full matrix of fuzz.token_set_ratio."""
+
+        entries = sorted(
+            [
+                "FRT",
+                "FRT",
+                "[FRT]",
+                "FRT site with spacing",
+                "{FRT} recombination site for flp recombinase in BBb",
+                "Site for recombination by flp recombinase",
+                "BBa_J61020",
+                "BBa_J72001",
+                "Later",
+                "dioxygenase x",
+                "his tag",
+                "--",
+            ]
+        )
+
+        expected = []
+        for i, entry in enumerate(entries):
+            ratios = [
+                fuzz.token_set_ratio(*sorted([entry, other], key=entries.index))
+                for j, other in enumerate(entries)
+                if j != i
+            ]
+            expected.append(100.0 + sum(ratios))
+
+        self.assertEqual(expected, _token_set_sums(entries))
+
+    def test_consensus_records(self):
+        """Create consensus records over many processes, in order."""
+
+        clusters = [
+            [
+                SeqRecord(
+                    Seq("ATGCATGCATGCATGC"),
+                    id=f"BBa_{j}{i:03d}",
+                    dbxrefs=[f"BBa_{j}{i:03d}"],
+                    annotations={
+                        "short_desc": f"part{i} site",
+                        "description": "",
+                        "categories": "//cds",
+                        "nickname": "",
+                        "type": "CDS",
+                    },
+                )
+                for j in "KJE"[: 1 + i % 3]
+            ]
+            for i in range(7)
+        ]
+
+        records = [_consensus_record(c) for c in clusters]
+        self.assertEqual("part1 site", records[1].name)
+        self.assertEqual(["BBa_J001", "BBa_K001"], records[1].dbxrefs)
+        self.assertIsNone(records[0])  # from one source
+
+        progress = []
+        parallel = _consensus_records(
+            clusters, processes=2, progress=lambda *args: progress.append(args[:2])
+        )
+        self.assertEqual(
+            [
+                (r.id, r.name, str(r.seq), r.annotations, r.dbxrefs)
+                for r in records
+                if r
+            ],
+            [
+                (r.id, r.name, str(r.seq), r.annotations, r.dbxrefs)
+                for r in parallel
+                if r
+            ],
+        )
+        self.assertEqual([r is None for r in records], [r is None for r in parallel])
+        self.assertEqual((7, 7), progress[-1])
@@ -0,0 +1,133 @@
+"""Test lazy loading of the feature database."""
+
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from synbio.features.database import FeatureDatabase
+from synbio.features.index import DNA_ALPHABET, PROTEIN_ALPHABET, KmerIndex
+
+
+class TestFeatureDatabase(unittest.TestCase):
+    """Load a FeatureDatabase on first use."""
+
+    def setUp(self):
+        """Save a small DNA and protein index to a temporary directory."""
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dna_index = os.path.join(self.tmp.name, "dna.index")
+        self.protein_index = os.path.join(self.tmp.name, "protein.index")
+
+        dna = SeqRecord(Seq("TCCTCCCGGCAGCAAAAAAGGG"), id="d1", name="dna")
+        protein = SeqRecord(Seq("SSSRQQKT"), id="p1", name="protein")
+        KmerIndex.build({"d1": dna}, 5, DNA_ALPHABET).save(self.dna_index)
+        KmerIndex.build({"p1": protein}, 3, PROTEIN_ALPHABET).save(self.protein_index)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def database(self) -> FeatureDatabase:
+        """Create a FeatureDatabase over the temporary indexes."""
+
+        missing = os.path.join(self.tmp.name, "missing.pickle")
+        return FeatureDatabase(
+            dna_index=self.dna_index,
+            protein_index=self.protein_index,
+            dna_kmer_map_pickle=missing,
+            dna_id_map_pickle=missing,
+            protein_kmer_map_pickle=missing,
+            protein_id_map_pickle=missing,
+        )
+
+    def test_lazy(self):
+        """Load on first access, release, and load again."""
+
+        database = self.database()
+
+        self.assertFalse(database.loaded)
+        self.assertIsNone(database.load_time)
+
+        kmer_map, id_map = database.dna
+
+        self.assertTrue(database.loaded)
+        self.assertGreaterEqual(database.load_time, 0.0)
+        self.assertIsInstance(kmer_map, KmerIndex)
+        self.assertEqual("dna", id_map["d1"].name)
+        self.assertEqual("protein", database.protein[1]["p1"].name)
+
+        database.release()
+
+        self.assertFalse(database.loaded)
+        self.assertIsNone(database.load_time)
+        self.assertEqual("dna", database.preload().dna[1]["d1"].name)
+
+    def test_version(self):
+        """Change the version when the features change."""
+
+        version = self.database().version
+
+        self.assertEqual(version, self.database().version)
+
+        dna = SeqRecord(Seq("TCCTCCCGGCAGCAAAAAAGGC"), id="d1", name="dna")
+        KmerIndex.build({"d1": dna}, 5, DNA_ALPHABET).save(self.dna_index)
+
+        self.assertNotEqual(version, self.database().version)
+
+    def test_threads(self):
+        """Load once when many threads annotate at the same time."""
+
+        database = self.database()
+        kmer_maps = []
+
+        def load():
+            kmer_maps.append(database.dna[0])
+
+        threads = [threading.Thread(target=load) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(8, len(kmer_maps))
+        self.assertTrue(all(k is kmer_maps[0] for k in kmer_maps))
+
+    def test_from_directory(self):
+        """Open a private feature library's indexes, and send it to workers."""
+
+        database = FeatureDatabase.from_directory(self.tmp.name)
+
+        self.assertEqual("dna", database.dna[1]["d1"].name)
+        self.assertEqual(self.dna_index, database.dna_paths[0])
+
+        copy = pickle.loads(pickle.dumps(database))
+        self.assertFalse(copy.loaded)
+        self.assertEqual(database.version, copy.version)
+
+    def test_id_map_pickle(self):
+        """Index the pickled id maps in memory if there's no index."""
+
+        dna = SeqRecord(Seq("TCCTCCCGGCAGCAAAAAAGGG"), id="d1", name="dna")
+        id_map_pickle = os.path.join(self.tmp.name, "dna.id.pickle")
+        with open(id_map_pickle, "wb") as id_map_file:
+            pickle.dump({"d1": dna}, id_map_file)
+
+        missing = os.path.join(self.tmp.name, "missing")
+        database = FeatureDatabase(
+            dna_index=missing,
+            protein_index=missing,
+            dna_kmer_map_pickle=missing,
+            dna_id_map_pickle=id_map_pickle,
+            protein_kmer_map_pickle=missing,
+            protein_id_map_pickle=missing,
+        )
+
+        kmer_map, id_map = database.dna
+        self.assertIsInstance(kmer_map, KmerIndex)
+        self.assertEqual("dna", id_map["d1"].name)
+        self.assertEqual([("d1", 0)], kmer_map["TCCTCCCGGCA"])
+        self.assertEqual((None, {}), database.protein)
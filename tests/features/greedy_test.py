@@ -0,0 +1,96 @@
+"""Test greedy clustering, the fallback for cd-hit."""
+
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from synbio.features import greedy
+from synbio.features.greedy import Clusterer, cluster_fasta, edit_distance
+
+
+class TestGreedy(unittest.TestCase):
+    """Cluster sequences like cd-hit-est."""
+
+    def setUp(self):
+        """Create a family of variants of a sequence and an unrelated one."""
+
+        rng = random.Random(0)
+        seq = "".join(rng.choice("ACGT") for _ in range(200))
+        snps = seq[:50] + ("A" if seq[50] != "A" else "C") + seq[51:]
+        indel = seq[:100] + seq[101:]
+        reverse = seq[:190].translate(greedy.COMPLEMENT)[::-1]
+
+        self.seqs = {
+            "short": seq[:100],  # too short to join a 200bp representative
+            "seq": seq,
+            "snps": snps.lower(),
+            "other": "".join(rng.choice("ACGT") for _ in range(150)),
+            "indel": indel,
+            "reverse": reverse,
+        }
+
+    def test_edit_distance(self):
+        """Count the fewest edits to align a query within a subject."""
+
+        self.assertEqual(0, edit_distance("GATT", "CCGATTCC"))
+        self.assertEqual(1, edit_distance("GATT", "CCGACTCC"))
+        self.assertEqual(1, edit_distance("GATTACA", "GATACA"))
+        self.assertEqual(3, edit_distance("GATTACA", "TTAC"))
+        self.assertEqual(0, edit_distance("", "ACGT"))
+
+    def test_cluster(self):
+        """Cluster variants with the longest, on both strands, and not the rest."""
+
+        names = list(self.seqs)
+        clusterer = Clusterer(list(self.seqs.values()), 0.95, 11, 0.9).cluster()
+        reps = {names[i] for i in clusterer.reps}
+
+        self.assertEqual({"seq", "other", "short"}, reps)
+        rep = clusterer.reps.index(names.index("seq"))
+        for name, identity, strand in [
+            ("snps", 0.995, "+"),
+            ("indel", 198 / 199, "+"),
+            ("reverse", 1.0, "-"),
+        ]:
+            self.assertEqual(
+                (rep, identity, strand), clusterer.matches[names.index(name)], name
+            )
+
+    def test_cluster_fasta(self):
+        """Write cd-hit's files, the same with many processes."""
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fasta = os.path.join(tmp, "dna.fa")
+            with open(fasta, "w") as fasta_file:
+                for name, seq in self.seqs.items():
+                    fasta_file.write(f">{name}\n{seq}\n")
+
+            out = os.path.join(tmp, "dna")
+            self.assertEqual(3, cluster_fasta(fasta, out, 0.95, 11, 0.9, best=True))
+            with open(out + ".clstr") as clstr_file:
+                clstr = clstr_file.read()
+            with open(out) as out_file:
+                self.assertEqual(
+                    [">short", ">seq", ">other"],
+                    [line.strip() for line in out_file if line.startswith(">")],
+                )
+
+            self.assertEqual(
+                ">Cluster 0\n"
+                "0\t200nt, >seq... *\n"
+                "1\t200nt, >snps... at +/99.50%\n"
+                "2\t199nt, >indel... at +/99.50%\n"
+                "3\t190nt, >reverse... at -/100.00%\n"
+                ">Cluster 1\n"
+                "0\t150nt, >other... *\n"
+                ">Cluster 2\n"
+                "0\t100nt, >short... *\n",
+                clstr,
+            )
+
+            with patch.object(greedy, "BATCH_SIZE", 2):
+                cluster_fasta(fasta, out, 0.95, 11, 0.9, best=True, processes=2)
+            with open(out + ".clstr") as clstr_file:
+                self.assertEqual(clstr, clstr_file.read())
@@ -0,0 +1,210 @@
+"""Test the memory-mapped kmer index."""
+
+import os
+import tempfile
+import unittest
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+import numpy as np
+
+from synbio.features.index import (
+    DNA_ALPHABET,
+    PROTEIN_ALPHABET,
+    KmerIndex,
+    LayeredIndex,
+    kmer_codes,
+    load_kmer_map,
+    minimizers,
+)
+
+
+class TestKmerIndex(unittest.TestCase):
+    """Build, save and query a KmerIndex."""
+
+    def setUp(self):
+        """Create a small map of features."""
+
+        self.id_map = {
+            "s1": SeqRecord(
+                Seq("TCCTCCCGGCAGCAAAAAAGGG"),
+                id="s1",
+                name="mock1",
+                annotations={"type": "promoter"},
+            ),
+            "s2": SeqRecord(
+                Seq("TAAACGGGTCTTGAGGNGGTTTCCTCCC"),
+                id="s2",
+                name="mock2",
+                annotations={"type": "terminator"},
+            ),
+        }
+
+    def test_kmer_codes(self):
+        """Bit-pack every kmer in a sequence."""
+
+        codes, valid = kmer_codes("ACGTNA", 3, DNA_ALPHABET)
+
+        self.assertEqual([0b000110, 0b011011], list(codes[:2]))
+        self.assertEqual([True, True, False, False], list(valid))
+
+    def test_build(self):
+        """Match the legacy kmer map: kmer to a list of (feature id, offset)."""
+
+        index = KmerIndex.build(self.id_map, 5, DNA_ALPHABET)
+
+        expected = {}
+        for fid, record in self.id_map.items():
+            seq = str(record.seq)
+            for i in range(len(seq) - 5 + 1):
+                if "N" not in seq[i : i + 5]:
+                    expected.setdefault(seq[i : i + 5], []).append((fid, i))
+
+        self.assertEqual(expected, dict(index.items()))
+        self.assertEqual([("s1", 0), ("s2", 21)], index["TCCTC"])
+        self.assertNotIn("GAGGN", index)
+        self.assertNotIn("AAAAAA", index)
+
+    def test_from_kmer_map(self):
+        """Convert a legacy kmer map to a KmerIndex with the same postings."""
+
+        kmer_map = {"TCCTC": [("s1", 0), ("s2", 21)], "GAGGN": [("s2", 13)]}
+
+        index = KmerIndex.from_kmer_map(kmer_map, self.id_map, DNA_ALPHABET)
+
+        self.assertEqual({"TCCTC": [("s1", 0), ("s2", 21)]}, dict(index.items()))
+        self.assertEqual([28], list(index.lengths[1:]))
+
+    def test_save_load(self):
+        """Save an index and memory-map it back in."""
+
+        index = KmerIndex.build(self.id_map, 3, PROTEIN_ALPHABET)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index_dir = os.path.join(tmp, "protein.index")
+            index.save(index_dir)
+
+            loaded = load_kmer_map(index_dir, os.path.join(tmp, "missing.pickle"))
+
+            self.assertIsInstance(loaded, KmerIndex)
+            self.assertIsInstance(loaded.codes, np.memmap)
+            self.assertEqual(dict(index.items()), dict(loaded.items()))
+            self.assertEqual(str(self.id_map["s2"].seq), str(loaded.record(1).seq))
+            self.assertEqual("mock2", loaded.record(1).name)
+            self.assertEqual("terminator", loaded.record(1).annotations["type"])
+
+            self.assertIsNone(load_kmer_map(tmp, os.path.join(tmp, "missing.pickle")))
+
+    def test_merge_remove(self):
+        """Add and remove features as if the index were built without them."""
+
+        s1 = {"s1": self.id_map["s1"]}
+        s2 = {"s2": self.id_map["s2"]}
+
+        merged = KmerIndex.build(s1, 5, DNA_ALPHABET).merge(
+            KmerIndex.build(s2, 5, DNA_ALPHABET)
+        )
+        expected = KmerIndex.build(self.id_map, 5, DNA_ALPHABET)
+
+        self.assertEqual(dict(expected.items()), dict(merged.items()))
+        self.assertEqual(["mock1", "mock2"], merged.names)
+        self.assertEqual(str(self.id_map["s2"].seq), merged.seq(1))
+
+        removed = merged.remove([0])
+
+        self.assertEqual(
+            dict(KmerIndex.build(s2, 5, DNA_ALPHABET).items()), dict(removed.items())
+        )
+        self.assertEqual(["s2"], removed.ids)
+        self.assertEqual([28], list(removed.lengths))
+
+    def test_layered(self):
+        """Look up kmers in several indexes as if they were one."""
+
+        s1 = {"s1": self.id_map["s1"]}
+        s2 = {"s2": self.id_map["s2"]}
+        merged = KmerIndex.build(self.id_map, 5, DNA_ALPHABET)
+        layered = LayeredIndex(
+            [KmerIndex.build(s1, 5, DNA_ALPHABET), KmerIndex.build(s2, 5, DNA_ALPHABET)]
+        )
+
+        codes, _ = kmer_codes("AAATCCTCCCGGGTCTT", 5, DNA_ALPHABET)
+        for expected, actual in zip(merged.lookup(codes), layered.lookup(codes)):
+            self.assertEqual(list(expected), list(actual))
+        self.assertEqual(list(merged.lengths), list(layered.lengths))
+        self.assertEqual(list(merged.kmer_counts), list(layered.kmer_counts))
+        self.assertEqual(str(self.id_map["s2"].seq), layered.seq(1))
+
+        # a feature in a later layer hides the same feature in earlier ones
+        overridden = LayeredIndex([merged, KmerIndex.build(s1, 5, DNA_ALPHABET)])
+        _, features, _ = overridden.lookup(codes)
+        self.assertNotIn(0, list(features))
+        self.assertIn(2, list(features))
+
+    def test_build_processes(self):
+        """Build the same index from shards over many processes."""
+
+        id_map = dict(self.id_map)
+        for i in range(6):
+            seq = "ACGTTGCA"[i:] + "TCCTCCCGGCAGCAAAAAAGGG" * (i + 1)
+            id_map[f"r{i}"] = SeqRecord(Seq(seq), id=f"r{i}")
+
+        expected = KmerIndex.build(id_map, 5, DNA_ALPHABET)
+
+        for processes in [2, 3]:
+            index = KmerIndex.build(id_map, 5, DNA_ALPHABET, processes=processes)
+            for name in ["codes", "starts", "features", "locs", "seqs", "seq_starts"]:
+                self.assertEqual(
+                    list(getattr(expected, name)), list(getattr(index, name)), name
+                )
+            self.assertEqual(expected.ids, index.ids)
+
+        empty = KmerIndex.build({}, 5, DNA_ALPHABET, processes=2)
+        self.assertEqual(0, len(empty))
+
+    def test_minimizers(self):
+        """Pick one valid kmer per window, and every kmer of short sequences."""
+
+        codes, valid = kmer_codes("TCCTCCCGGCAGCAAAAAAGGGNTAAACGGG", 5, DNA_ALPHABET)
+        locs = minimizers(codes, valid, 4)
+
+        self.assertEqual(sorted(set(locs)), list(locs))
+        self.assertTrue(valid[locs].all())
+        for start in range(len(codes) - 3):
+            window = range(start, start + 4)
+            if valid[start : start + 4].any():
+                self.assertTrue(any(loc in window for loc in locs))
+        self.assertEqual(1, len(minimizers(codes[:3], valid[:3], 4)))
+
+    def test_spaced_seed(self):
+        """Match kmers past a mismatch at a spaced seed's 0s."""
+
+        pattern = "11011"
+        codes, valid = kmer_codes("ACGTA", 5, DNA_ALPHABET, pattern)
+        mismatch, _ = kmer_codes("ACTTA", 5, DNA_ALPHABET, pattern)
+
+        self.assertEqual(list(codes), list(mismatch))
+        self.assertNotEqual(
+            list(kmer_codes("ACGTA", 5, DNA_ALPHABET)[0]),
+            list(kmer_codes("ACTTA", 5, DNA_ALPHABET)[0]),
+        )
+
+        index = KmerIndex.build(self.id_map, 5, DNA_ALPHABET, pattern=pattern, window=3)
+        self.assertEqual(2, index.header["version"])
+        self.assertEqual(4, index.weight)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index.save(tmp)
+            loaded = KmerIndex.load(tmp)
+
+        self.assertEqual((pattern, 3), (loaded.pattern, loaded.window))
+        self.assertEqual(list(index.codes), list(loaded.codes))
+        self.assertEqual("AC", index.decode(int(codes[0]))[:2])
+        self.assertEqual("N", index.decode(int(codes[0]))[2])
+
+        dense = KmerIndex.build(self.id_map, 5, DNA_ALPHABET)
+        self.assertEqual(1, dense.header["version"])
+        with self.assertRaises(ValueError):
+            dense.merge(index)
+        with self.assertRaises(ValueError):
+            KmerIndex.build(self.id_map, 5, DNA_ALPHABET, pattern="0111")
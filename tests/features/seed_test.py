@@ -0,0 +1,114 @@
+"""Test incremental updates to a feature index."""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from synbio.features.index import DNA_ALPHABET, KmerIndex, read_manifest
+from synbio.features.seed import add_features, compact, remove_features
+
+
+class TestUpdateFeatures(unittest.TestCase):
+    """Add features to and remove features from a saved index."""
+
+    def setUp(self):
+        """Save a DNA index of one feature to a temporary directory."""
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index_dir = os.path.join(self.tmp.name, "dna.index")
+
+        self.base = SeqRecord(Seq("TCCTCCCGGCAGCAAAAAAGGG"), id="b1", name="base")
+        KmerIndex.build({"b1": self.base}, 11, DNA_ALPHABET).save(self.index_dir)
+
+        self.records = [
+            SeqRecord(
+                Seq("taaacgggtcttgaggggttttttgctgaaaggaggaact"),
+                name="terminator",
+                annotations={"type": "terminator"},
+            ),
+            SeqRecord(Seq("ACGT"), name="short"),
+        ]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_remove(self):
+        """Index added features and drop removed ones, then compact them."""
+
+        added = add_features(self.records, index_dir=self.index_dir)
+
+        self.assertEqual(1, len(added))
+        self.assertEqual([], add_features(self.records, index_dir=self.index_dir))
+
+        index = KmerIndex.load(self.index_dir)
+        self.assertEqual(["b1"] + added, index.ids)
+        self.assertEqual("terminator", index.record(1).annotations["type"])
+        self.assertEqual("TAAACGGGTCTTGAGG", index.seq(1)[:16])
+        self.assertEqual([("b1", 0)], index["TCCTCCCGGCA"])
+        self.assertEqual([(added[0], 0)], index["TAAACGGGTCT"])
+        self.assertEqual(1, index.generation)
+
+        self.assertEqual(
+            1, remove_features(["b1", "missing"], index_dir=self.index_dir)
+        )
+        self.assertEqual(0, remove_features(["b1"], index_dir=self.index_dir))
+
+        index = KmerIndex.load(self.index_dir)
+        self.assertEqual(added, index.ids)
+        self.assertNotIn("TCCTCCCGGCA", index)
+        self.assertEqual([(added[0], 0)], index["TAAACGGGTCT"])
+
+        compact(self.index_dir)
+
+        compacted = KmerIndex.load(self.index_dir)
+        self.assertEqual(dict(index.items()), dict(compacted.items()))
+        self.assertEqual(2, compacted.generation)
+        self.assertEqual([], read_manifest(self.index_dir)["segments"])
+        self.assertEqual(
+            ["codes.npy", "features.npy", "header.json", "locs.npy"],
+            sorted(os.listdir(self.index_dir))[:4],
+        )
+
+    def test_compact_after(self):
+        """Compact an index after enough updates."""
+
+        add_features(self.records, index_dir=self.index_dir, compact_after=2)
+        self.assertEqual(1, len(read_manifest(self.index_dir)["segments"]))
+
+        remove_features(["b1"], index_dir=self.index_dir, compact_after=2)
+        manifest = read_manifest(self.index_dir)
+
+        self.assertEqual(([], []), (manifest["segments"], manifest["removed"]))
+        self.assertEqual(1, len(KmerIndex.load(self.index_dir).ids))
+
+    def test_add_missing_index(self):
+        """Build a missing index from its id map pickle before adding to it."""
+
+        shutil.rmtree(self.index_dir)
+        with open(os.path.join(self.tmp.name, "dna.id.pickle"), "wb") as id_map_file:
+            pickle.dump({"b1": self.base}, id_map_file)
+
+        added = add_features(self.records, index_dir=self.index_dir)
+
+        index = KmerIndex.load(self.index_dir)
+        self.assertEqual(["b1"] + added, index.ids)
+        self.assertEqual(1, len(read_manifest(self.index_dir)["segments"]))
+        self.assertEqual([("b1", 0)], index["TCCTCCCGGCA"])
+
+        # the bundled index isn't replaced by one of only the added features
+        os.remove(os.path.join(self.tmp.name, "dna.id.pickle"))
+        shutil.rmtree(self.index_dir)
+        with patch("synbio.features.seed.DNA_INDEX", self.index_dir):
+            with self.assertRaises(FileNotFoundError):
+                add_features(self.records)
+        self.assertFalse(os.path.exists(self.index_dir))
+
+        # a private library's index is started with them
+        self.assertEqual(added, add_features(self.records, index_dir=self.index_dir))
+        self.assertEqual(added, KmerIndex.load(self.index_dir).ids)
@@ -0,0 +1,115 @@
+"""Test the SQLite store of iGEM parts."""
+
+import os
+import tempfile
+import unittest
+
+from Bio.Seq import Seq
+from Bio.SeqFeature import FeatureLocation, SeqFeature
+from Bio.SeqRecord import SeqRecord
+
+from synbio.features.store import PartStore
+
+
+def part(part_id: str, seq: str, features=(), nickname="") -> SeqRecord:
+    """Create a part's SeqRecord like the iGEM XML parser does."""
+
+    return SeqRecord(
+        Seq(seq),
+        id=part_id,
+        dbxrefs=[part_id],
+        annotations={
+            "short_desc": f"{part_id} part",
+            "description": "",
+            "categories": "//cds",
+            "nickname": nickname,
+            "type": "CDS",
+        },
+        features=[
+            SeqFeature(
+                id=name,
+                location=FeatureLocation(start, end, strand),
+                type="CDS",
+                strand=strand,
+            )
+            for name, start, end, strand in features
+        ],
+    )
+
+
+class TestPartStore(unittest.TestCase):
+    """Store parts and look them up by ID and feature index."""
+
+    def setUp(self):
+        """Create a temporary directory for the store."""
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "parts.sqlite")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get(self):
+        """Get the parts and features that were added, after reopening."""
+
+        parts = PartStore(self.path)
+        parts.add(
+            [
+                part(
+                    "BBa_1", "ATGCATGCATGCATGC", [("F1", 0, 12, 1), ("F2", 2, 14, -1)]
+                ),
+                part("BBa_2", "GGGGCCCCAAAATTTT"),
+            ]
+        )
+        parts.close()
+
+        parts = PartStore(self.path)
+        record = parts.get("BBa_1")
+
+        self.assertEqual(2, len(parts))
+        self.assertIn("BBa_2", parts)
+        self.assertNotIn("BBa_3", parts)
+        self.assertEqual("ATGCATGCATGCATGC", str(record.seq))
+        self.assertEqual(["BBa_1"], record.dbxrefs)
+        self.assertEqual("BBa_1 part", record.annotations["short_desc"])
+        self.assertEqual(["F1", "F2"], [f.id for f in record.features])
+        self.assertEqual("ATGCATGCATGC", str(record.features[0].extract(record.seq)))
+
+        feature = parts.feature("BBa_1", 1)
+        self.assertEqual(("F2", 2, 14, -1), (feature.id, *_bounds(feature)))
+        self.assertEqual([], parts.get("BBa_2").features)
+
+        with self.assertRaises(KeyError):
+            parts.get("BBa_3")
+        with self.assertRaises(KeyError):
+            parts.feature("BBa_1", 2)
+
+    def test_replace(self):
+        """Replace parts added again in place, and iterate in order."""
+
+        parts = PartStore(self.path)
+        parts.add(part(f"BBa_{i}", "ATGC" * (i + 4)) for i in range(5))
+        parts.add([part("BBa_1", "ATGCATGCATGCATGC", [("F1", 0, 12, 1)], "new")])
+
+        self.assertEqual([f"BBa_{i}" for i in range(5)], list(parts.ids()))
+        self.assertEqual(list(parts.ids()), [r.id for r in parts])
+        self.assertEqual("new", parts.get("BBa_1").annotations["nickname"])
+        self.assertEqual(["F1"], [f.id for r in parts for f in r.features])
+
+    def test_source(self):
+        """Keep a digest of the file the parts were parsed from."""
+
+        parts = PartStore(self.path)
+        self.assertIsNone(parts.source)
+        parts.source = "abc"
+        parts.source = "def"
+        parts.close()
+
+        self.assertEqual("def", PartStore(self.path).source)
+
+
+def _bounds(feature: SeqFeature):
+    """The start, end and strand of a feature."""
+
+    location = feature.location
+    return int(location.start), int(location.end), location.strand
@@ -0,0 +1,40 @@
+"""Test six-frame translation."""
+
+import unittest
+
+from Bio.Seq import Seq
+
+from synbio.features import translate_frames
+
+
+class TestTranslateFrames(unittest.TestCase):
+    """Translate DNA in all six reading frames."""
+
+    def test_translate_frames(self):
+        """Translate each frame like Bio.Seq, including ambiguous bases."""
+
+        seq = "ATGGCTTCCTCCGAAGACGTTATCNAAGAGTTCATGCGTRTCAAAGTTCGTATGtaatga"
+        reverse = str(Seq(seq).reverse_complement())
+
+        expected = []
+        for strand in [seq, reverse]:
+            for i in range(3):
+                frame = strand[i:]
+                expected.append(str(Seq(frame[: len(frame) // 3 * 3]).translate()))
+
+        self.assertEqual(tuple(expected), translate_frames(seq, cache=False))
+        self.assertEqual("MASSEDVI", translate_frames(seq)[0][:8])
+
+    def test_short(self):
+        """Translate sequences shorter than a codon to empty frames."""
+
+        self.assertEqual(("",) * 6, translate_frames("AT"))
+        self.assertEqual(("M", "", "", "H", "", ""), translate_frames("ATG"))
+
+    def test_cache(self):
+        """Reuse the translations of a sequence when it's translated again."""
+
+        seq = "ATGGCTTCCTCCGAAGACGTTATCAAAGAGTTCATG"
+
+        self.assertIs(translate_frames(seq), translate_frames(seq))
+        self.assertIsNot(translate_frames(seq, cache=False), translate_frames(seq))